@@ -80,8 +80,7 @@ class IntroductionFormBase(forms.ModelForm):
     def save(self, commit=True):
         instance = super().save(commit=False)
         if commit:
-            instance.introduction.content = self.cleaned_data["introduction_text"]
-            instance.introduction.save()
+            instance.introduction.update_content(self.cleaned_data["introduction_text"])
         return instance
 
 
@@ -372,7 +371,9 @@ class WorkForm(forms.ModelForm):
             instance.save_without_historical_record()
             # introduction will have been created at this point
             if not instance.introduction:
-                instance.introduction = TextObjectField().objects.create(content="")
+                instance.introduction = TextObjectField.objects.create(
+                    content="", owner=instance
+                )
                 instance.save()
             instance.introduction.content = self.cleaned_data["introduction_text"]
             instance.introduction.save_without_historical_record()
@@ -678,8 +679,7 @@ class CommentaryFormBase(forms.ModelForm):
         instance = super().save(commit=False)
         if commit:
             # commentary will have been created at this point via post_save
-            instance.commentary.content = self.cleaned_data["commentary_text"]
-            instance.commentary.save()
+            instance.commentary.update_content(self.cleaned_data["commentary_text"])
         return instance
 
 
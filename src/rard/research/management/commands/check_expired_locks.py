@@ -1,19 +1,32 @@
+import time
+
 from django.core.management.base import BaseCommand, CommandError
-from django.utils import timezone
 
 from rard.utils.basemodel import ObjectLock
 
 
 class Command(BaseCommand):
-    help = "Checks for locks that have expired"
+    help = "Removes locks that have expired"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running, checking for expired locks every --interval seconds",
+        )
+        parser.add_argument("--interval", type=int, default=60)
 
     def handle(self, *args, **options):
-        try:
-            stale = ObjectLock.objects.filter(
-                locked_until__isnull=False, locked_until__lt=timezone.now()
-            )
-            for lock in stale:
-                # the following will send appropriate emails
-                lock.content_object.unlock()
-        except Exception as err:
-            raise CommandError(str(err))
+        while True:
+            try:
+                # users who requested the items are emailed a digest
+                count = ObjectLock.sweep_expired()
+                if count:
+                    self.stdout.write("Removed %d expired locks" % count)
+            except Exception as err:
+                if not options["loop"]:
+                    raise CommandError(str(err))
+                self.stderr.write(str(err))
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
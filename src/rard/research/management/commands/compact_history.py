@@ -0,0 +1,160 @@
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from rard.research.models import HistoricalRecordLog
+from rard.research.models.history import compactable_history_ids
+
+
+class Command(BaseCommand):
+    help = (
+        "Removes historical records that are no longer needed, according to "
+        "the retention policy given by the options"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--collapse-system",
+            action="store_true",
+            help="Keep only the last of each run of records not made by a user",
+        )
+        parser.add_argument(
+            "--keep",
+            type=int,
+            default=None,
+            help="Keep only this many of the latest records of each object",
+        )
+        parser.add_argument(
+            "--include-user-edits",
+            action="store_true",
+            help="Allow records made by users to be removed by --keep",
+        )
+        parser.add_argument(
+            "--model",
+            action="append",
+            dest="models",
+            help="Only compact the history of this model (can be repeated)",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be removed without removing anything",
+        )
+
+    def get_historical_models(self, model_names):
+        models = []
+        for model in apps.get_app_config("research").get_models():
+            history = getattr(model, "history", None)
+            if history is None or not hasattr(history, "model"):
+                continue
+            if model_names and model._meta.model_name not in model_names:
+                continue
+            models.append(history.model)
+        return models
+
+    def estimate_row_size(self, historical_model):
+        # the average size of a row including its indexes, where the
+        # database can tell us
+        if connection.vendor != "postgresql":
+            return None
+        count = historical_model.objects.count()
+        if not count:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_total_relation_size(%s)", [historical_model._meta.db_table]
+            )
+            return cursor.fetchone()[0] / count
+
+    def delete_batch(self, historical_model, content_type, history_ids):
+        """Removes the records and their logs, returning the pks of the
+        objects they were records of"""
+        pk_name = historical_model.instance_type._meta.pk.attname
+        with transaction.atomic():
+            object_ids = set(
+                historical_model.objects.filter(history_id__in=history_ids).values_list(
+                    pk_name, flat=True
+                )
+            )
+            historical_model.objects.filter(history_id__in=history_ids).delete()
+            HistoricalRecordLog.objects.filter(
+                content_type=content_type, object_id__in=history_ids
+            ).delete()
+        return object_ids
+
+    def store_diffs(self, historical_model, content_type, object_ids):
+        # the diffs of the records that remain may now be against a
+        # different previous record
+        pk_name = historical_model.instance_type._meta.pk.attname
+        HistoricalRecordLog.objects.filter(
+            content_type=content_type,
+            object_id__in=historical_model.objects.filter(
+                **{"%s__in" % pk_name: object_ids}
+            ).values("history_id"),
+        ).update(diff=None)
+        return HistoricalRecordLog.store_diffs(historical_model)
+
+    def handle(self, *args, **options):
+        if not options["collapse_system"] and options["keep"] is None:
+            raise CommandError("Give --collapse-system and/or --keep")
+        if options["keep"] is not None and options["keep"] < 1:
+            raise CommandError("--keep must be at least 1")
+        model_names = [name.lower() for name in options["models"] or []]
+        batch_size = options["batch_size"]
+
+        total_rows = total_bytes = 0
+        for historical_model in self.get_historical_models(model_names):
+            content_type = ContentType.objects.get_for_model(historical_model)
+            row_size = self.estimate_row_size(historical_model)
+            ids = compactable_history_ids(
+                historical_model,
+                collapse_system=options["collapse_system"],
+                keep=options["keep"],
+                keep_user_edits=not options["include_user_edits"],
+            )
+            # the ids are worked out before anything is deleted so that the
+            # policy applies to the history as it was
+            ids = list(ids)
+            if not options["dry_run"]:
+                object_ids = set()
+                for start in range(0, len(ids), batch_size):
+                    batch = ids[start : start + batch_size]
+                    object_ids |= self.delete_batch(
+                        historical_model, content_type, batch
+                    )
+                    self.stdout.write(
+                        "%s: removed %d of %d"
+                        % (historical_model.__name__, start + len(batch), len(ids))
+                    )
+                if object_ids:
+                    self.stdout.write(
+                        "%s: stored %d diffs"
+                        % (
+                            historical_model.__name__,
+                            self.store_diffs(
+                                historical_model, content_type, object_ids
+                            ),
+                        )
+                    )
+
+            total_rows += len(ids)
+            if row_size is not None:
+                total_bytes += row_size * len(ids)
+            self.stdout.write(
+                "%s: %s %d records"
+                % (
+                    historical_model.__name__,
+                    "would remove" if options["dry_run"] else "removed",
+                    len(ids),
+                )
+            )
+
+        summary = "%s %d historical records" % (
+            "Would remove" if options["dry_run"] else "Removed",
+            total_rows,
+        )
+        if total_bytes:
+            summary += ", about %.1f MB" % (total_bytes / 1024 / 1024)
+        self.stdout.write(summary)
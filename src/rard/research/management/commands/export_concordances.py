@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rard.research.models import Antiquarian, Edition
+from rard.utils.concordance_export import (
+    EXPORT_CONTENT_TYPES,
+    concordance_rows,
+    export_lines,
+    get_export_queryset,
+)
+
+
+class Command(BaseCommand):
+    help = "Exports the concordances of an edition and/or antiquarian"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--edition", type=int, help="The pk of the edition")
+        parser.add_argument("--antiquarian", type=int, help="The pk of the antiquarian")
+        parser.add_argument(
+            "--format", choices=sorted(EXPORT_CONTENT_TYPES), default="csv"
+        )
+        parser.add_argument(
+            "--output", help="The file to write to, by default standard output"
+        )
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            edition = antiquarian = None
+            if options["edition"]:
+                edition = Edition.objects.get(pk=options["edition"])
+            if options["antiquarian"]:
+                antiquarian = Antiquarian.objects.get(pk=options["antiquarian"])
+        except (Edition.DoesNotExist, Antiquarian.DoesNotExist) as err:
+            raise CommandError(str(err))
+        if not (edition or antiquarian):
+            raise CommandError("Give --edition and/or --antiquarian")
+
+        rows = concordance_rows(
+            get_export_queryset(edition, antiquarian),
+            chunk_size=options["chunk_size"],
+        )
+        lines = export_lines(rows, options["format"])
+        if not options["output"]:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+        with open(options["output"], "w", newline="", encoding="utf-8") as output:
+            output.writelines(lines)
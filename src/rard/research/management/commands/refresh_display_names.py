@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from rard.research.models import Fragment, Testimonium
+
+
+class Command(BaseCommand):
+    help = "Recalculates the stored display names of fragments and testimonia"
+
+    def handle(self, *args, **options):
+        try:
+            for model in (Fragment, Testimonium):
+                count = model.refresh_display_names()
+                self.stdout.write(
+                    "Updated %d %s" % (count, model._meta.verbose_name_plural)
+                )
+        except Exception as err:
+            raise CommandError(str(err))
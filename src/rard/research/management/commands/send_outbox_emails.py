@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from rard.utils.basemodel import OutboxEmail
+
+
+class Command(BaseCommand):
+    help = "Sends the emails waiting in the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="The number of emails to send over each connection",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep running, checking the outbox every --interval seconds",
+        )
+        parser.add_argument("--interval", type=int, default=30)
+
+    def send_all(self, batch_size):
+        total = 0
+        while True:
+            sent = OutboxEmail.send_pending(batch_size=batch_size)
+            total += sent
+            if sent < batch_size:
+                return total
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                sent = self.send_all(options["batch_size"])
+                if sent:
+                    self.stdout.write("Sent %d emails" % sent)
+            except Exception as err:
+                if not options["loop"]:
+                    raise CommandError(str(err))
+                # keep going, the emails will be tried again next time
+                self.stderr.write(str(err))
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
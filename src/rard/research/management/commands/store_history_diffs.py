@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from rard.research.management.commands.compact_history import (
+    Command as CompactHistoryCommand,
+)
+from rard.research.models import HistoricalRecordLog
+
+
+class Command(BaseCommand):
+    help = (
+        "Works out and stores the diffs of historical records whose logs "
+        "don't have one, e.g. those written before diffs were stored"
+    )
+
+    def handle(self, *args, **options):
+        for historical_model in CompactHistoryCommand().get_historical_models([]):
+            count = HistoricalRecordLog.store_diffs(historical_model)
+            self.stdout.write(
+                "%s: stored %d diffs" % (historical_model.__name__, count)
+            )
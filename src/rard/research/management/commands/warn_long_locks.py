@@ -1,7 +1,4 @@
-from datetime import timedelta
-
 from django.core.management.base import BaseCommand, CommandError
-from django.utils import timezone
 
 from rard.utils.basemodel import ObjectLock
 
@@ -9,16 +6,18 @@ from rard.utils.basemodel import ObjectLock
 class Command(BaseCommand):
     help = "Checks for indefinite locks that have been held for a long time"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=5,
+            help="Warn about locks held for longer than this many days",
+        )
+
     def handle(self, *args, **options):
-        warn_after_days = 5
-        limit = timezone.now() - timedelta(days=warn_after_days)
         try:
-            indefinite = ObjectLock.objects.filter(
-                locked_until__isnull=True, locked_at__lt=limit
-            )
-            for lock in indefinite:
-                # send appropriate email
-                lock.content_object.send_long_lock_email()
-
+            # each user gets one email listing all their long-held locks
+            count = ObjectLock.warn_long_locks(options["days"])
+            self.stdout.write("Warned %d users" % count)
         except Exception as err:
             raise CommandError(str(err))
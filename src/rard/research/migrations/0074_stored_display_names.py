@@ -0,0 +1,33 @@
+# Generated by Django 3.2 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("research", "0073_new_concordance_model_etc"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fragment",
+            name="display_name",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.AddField(
+            model_name="fragment",
+            name="short_display_name",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.AddField(
+            model_name="testimonium",
+            name="display_name",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.AddField(
+            model_name="testimonium",
+            name="short_display_name",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 3.2 on 2026-10-19 11:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+# the models with text object fields, and the names of those fields
+TEXT_OBJECT_FIELD_OWNERS = [
+    ("antiquarian", "introduction"),
+    ("work", "introduction"),
+    ("book", "introduction"),
+    ("fragment", "commentary"),
+    ("anonymousfragment", "commentary"),
+    ("testimonium", "commentary"),
+]
+
+
+def set_owners(apps, schema_editor):
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    TextObjectField = apps.get_model("research", "TextObjectField")
+    for model_name, field_name in TEXT_OBJECT_FIELD_OWNERS:
+        model = apps.get_model("research", model_name)
+        content_type, _ = ContentType.objects.get_or_create(
+            app_label="research", model=model_name
+        )
+        owners = model._base_manager.filter(**{field_name: OuterRef("pk")})
+        TextObjectField.objects.filter(
+            pk__in=model._base_manager.values(field_name)
+        ).update(
+            owner_content_type=content_type,
+            owner_id=Subquery(owners.values("pk")[:1]),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("research", "0074_stored_display_names"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="textobjectfield",
+            name="owner_content_type",
+            field=models.ForeignKey(
+                blank=True,
+                default=None,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="contenttypes.contenttype",
+            ),
+        ),
+        migrations.AddField(
+            model_name="textobjectfield",
+            name="owner_id",
+            field=models.PositiveIntegerField(blank=True, default=None, null=True),
+        ),
+        migrations.RunPython(set_owners, migrations.RunPython.noop),
+    ]
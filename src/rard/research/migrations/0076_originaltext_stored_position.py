@@ -0,0 +1,72 @@
+# Generated by Django 3.2 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+def reference_list(references):
+    if len(references) > 1:
+        return " | ".join(
+            f"{reference.editor} {reference.reference_position}"
+            for reference in references
+        )
+    elif references:
+        return references[0].reference_position
+    return ""
+
+
+def set_positions_and_references(apps, schema_editor):
+    OriginalText = apps.get_model("research", "OriginalText")
+    Reference = apps.get_model("research", "Reference")
+
+    references = {}
+    for reference in Reference.objects.order_by("pk"):
+        references.setdefault(reference.original_text_id, []).append(reference)
+
+    siblings = {}
+    for text in OriginalText.objects.order_by("citing_work", "reference_order", "pk"):
+        siblings.setdefault((text.content_type_id, text.object_id), []).append(text)
+
+    texts = []
+    for sibling_texts in siblings.values():
+        for index, text in enumerate(sibling_texts):
+            text.owner_index = index
+            text.owner_ordinal = (
+                chr(ord("a") + index) if len(sibling_texts) > 1 else ""
+            )
+            text.references_display = reference_list(references.get(text.pk, []))
+            texts.append(text)
+    OriginalText.objects.bulk_update(
+        texts,
+        ["owner_index", "owner_ordinal", "references_display"],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("research", "0075_textobjectfield_owner"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="originaltext",
+            name="owner_index",
+            field=models.PositiveIntegerField(
+                blank=True, default=None, editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="originaltext",
+            name="owner_ordinal",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=8
+            ),
+        ),
+        migrations.AddField(
+            model_name="originaltext",
+            name="references_display",
+            field=models.TextField(blank=True, default="", editable=False),
+        ),
+        migrations.RunPython(set_positions_and_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2 on 2026-10-19 13:00
+
+from django.db import migrations, models
+
+
+def remove_duplicate_locks(apps, schema_editor):
+    # keep the earliest lock on each object
+    ObjectLock = apps.get_model("research", "ObjectLock")
+    seen = set()
+    duplicates = []
+    for pk, content_type_id, object_id in ObjectLock.objects.order_by(
+        "pk"
+    ).values_list("pk", "content_type_id", "object_id"):
+        if (content_type_id, object_id) in seen:
+            duplicates.append(pk)
+        seen.add((content_type_id, object_id))
+    ObjectLock.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("research", "0076_originaltext_stored_position"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_locks, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="objectlock",
+            constraint=models.UniqueConstraint(
+                fields=("content_type", "object_id"), name="unique_object_lock"
+            ),
+        ),
+    ]
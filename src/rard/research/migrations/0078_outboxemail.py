@@ -0,0 +1,65 @@
+# Generated by Django 3.2 on 2026-10-19 14:00
+
+import django.utils.timezone
+import model_utils.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("research", "0077_objectlock_unique_object_lock"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxEmail",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="created",
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="modified",
+                    ),
+                ),
+                ("subject", models.CharField(max_length=256)),
+                ("message", models.TextField(blank=True, default="")),
+                ("html_message", models.TextField(blank=True, default="")),
+                ("from_email", models.CharField(max_length=256)),
+                ("recipients", models.JSONField(default=list)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True, default="")),
+                (
+                    "send_after",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("sent_at", models.DateTimeField(default=None, null=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["sent_at", "send_after"],
+                        name="outbox_email_due_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2 on 2026-10-19 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("research", "0078_outboxemail"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="historicalrecordlog",
+            name="diff",
+            field=models.TextField(default=None, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="historicalrecordlog",
+            index=models.Index(
+                fields=["content_type", "object_id"], name="history_log_record_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2 on 2026-10-19 16:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("research", "0079_historicalrecordlog_diff"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="historicalrecordlog",
+            index=models.Index(
+                fields=["history_user", "history_date"], name="history_log_user_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="historicalrecordlog",
+            index=models.Index(
+                fields=["content_type", "history_date"], name="history_log_type_idx"
+            ),
+        ),
+    ]
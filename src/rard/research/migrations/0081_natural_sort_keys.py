@@ -0,0 +1,88 @@
+# Generated by Django 3.2 on 2026-10-19 17:00
+
+import re
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+def sort_key(value):
+    if value is None:
+        return None
+    return [int(number) for number in re.findall(r"\d+", value)]
+
+
+def set_sort_keys(apps, schema_editor):
+    OriginalText = apps.get_model("research", "OriginalText")
+    ConcordanceModel = apps.get_model("research", "ConcordanceModel")
+    PartIdentifier = apps.get_model("research", "PartIdentifier")
+
+    texts = list(OriginalText.objects.only("pk", "reference_order"))
+    for text in texts:
+        text.reference_sort_key = sort_key(text.reference_order)
+    OriginalText.objects.bulk_update(texts, ["reference_sort_key"], batch_size=500)
+
+    concordances = list(ConcordanceModel.objects.only("pk", "concordance_order"))
+    for concordance in concordances:
+        concordance.concordance_sort_key = sort_key(concordance.concordance_order)
+    ConcordanceModel.objects.bulk_update(
+        concordances, ["concordance_sort_key"], batch_size=500
+    )
+
+    PartIdentifier.objects.filter(value__regex=r"\[.*\]").update(is_template=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("research", "0080_historicalrecordlog_activity_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="originaltext",
+            name="reference_sort_key",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.PositiveIntegerField(),
+                blank=True,
+                editable=False,
+                null=True,
+                size=None,
+            ),
+        ),
+        migrations.AddField(
+            model_name="concordancemodel",
+            name="concordance_sort_key",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.PositiveBigIntegerField(),
+                blank=True,
+                editable=False,
+                null=True,
+                size=None,
+            ),
+        ),
+        migrations.AddField(
+            model_name="partidentifier",
+            name="is_template",
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(set_sort_keys, migrations.RunPython.noop),
+        migrations.AlterModelOptions(
+            name="originaltext",
+            options={"ordering": ("citing_work", "reference_sort_key")},
+        ),
+        migrations.AddIndex(
+            model_name="originaltext",
+            index=models.Index(
+                fields=["citing_work", "reference_sort_key"],
+                name="original_text_reference_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="concordancemodel",
+            index=models.Index(
+                fields=["identifier", "concordance_sort_key"],
+                name="concordance_sort_key_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 3.2 on 2026-10-19 20:10
+
+from django.db import migrations
+from django.db.models import Prefetch
+
+
+def one_indexed(order):
+    try:
+        return order + 1
+    except TypeError:
+        return "ERR"
+
+
+def link_name(link, stub):
+    # as WorkLinkBaseModel.get_display_name and get_work_display_name
+    name = "%s %s%s" % (
+        link.antiquarian.name if link.antiquarian else "Anonymous",
+        stub,
+        one_indexed(link.order),
+    )
+    if link.work and not link.work.unknown:
+        authors = ", ".join([a.name for a in link.work.antiquarian_set.all()])
+        work_name = "%s: %s %s%s" % (
+            authors or "Anonymous",
+            link.work.name,
+            stub,
+            one_indexed(link.work_order),
+        )
+        name = "%s [= %s]" % (work_name, name)
+    return name
+
+
+def render_names(obj, names):
+    # as HistoricalBaseModel._render_display_name
+    if not names:
+        unlinked = "Unlinked {}".format(obj.pk)
+        return unlinked, unlinked
+    display_name = names[0]
+    if len(names) > 1:
+        display_name = '%s <span class="also">(also = %s)</span>' % (
+            names[0],
+            ", ".join(names[1:]),
+        )
+    return display_name, names[0]
+
+
+def backfill(apps, model_name, link_model_name, stub):
+    model = apps.get_model("research", model_name)
+    link_model = apps.get_model("research", link_model_name)
+    # as DisplayNameModel.link_names_prefetch
+    links = Prefetch(
+        "antiquarian_%ss" % link_model_name.lower(),
+        queryset=link_model.objects.select_related("antiquarian", "work")
+        .prefetch_related("work__antiquarian_set")
+        .order_by("work", "antiquarian", "order"),
+        to_attr="link_names_links",
+    )
+    objects = list(model.objects.prefetch_related(links))
+    for obj in objects:
+        names = [link_name(link, stub) for link in obj.link_names_links]
+        obj.display_name, obj.short_display_name = render_names(obj, names)
+    model.objects.bulk_update(
+        objects, ["display_name", "short_display_name"], batch_size=500
+    )
+
+
+def backfill_display_names(apps, schema_editor):
+    backfill(apps, "Fragment", "FragmentLink", "F")
+    backfill(apps, "Testimonium", "TestimoniumLink", "T")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("research", "0081_natural_sort_keys"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_display_names, migrations.RunPython.noop),
+    ]
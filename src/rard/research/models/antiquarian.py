@@ -1,6 +1,5 @@
-import itertools
-
 from django.db import models
+from django.db.models import Case, F, IntegerField, OuterRef, Q, Subquery, When
 from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.urls import reverse
 from simple_history.models import HistoricalRecords
@@ -8,6 +7,7 @@ from simple_history.models import HistoricalRecords
 from rard.research.models.mixins import HistoryModelMixin, TextObjectFieldMixin
 from rard.utils.basemodel import BaseModel, DatedModel, LockableModel, OrderableModel
 from rard.utils.decorators import disable_for_loaddata
+from rard.utils.reorder import reindex_queue, reorder_queryset
 from rard.utils.shared_functions import collate_uw_links
 from rard.utils.text_processors import make_plain_text
 
@@ -30,6 +30,8 @@ class WorkLink(OrderableModel, models.Model):
     # # with respect to antiquarian
     # order = models.IntegerField(default=None, null=True)
 
+    tracked_fields = OrderableModel.tracked_fields + ("antiquarian_id", "work_id")
+
 
 @disable_for_loaddata
 def handle_deleted_work_link(sender, instance, **kwargs):
@@ -56,19 +58,21 @@ def handle_deleted_work_link(sender, instance, **kwargs):
         instance.antiquarian.appositumfragmentlinks.filter(
             work=work, exclusive=True
         ).delete()
+        instance.antiquarian.schedule_null_reindex(work)
 
-    instance.antiquarian.reindex_work_links()
-    instance.antiquarian.reindex_fragment_and_testimonium_links()
+    with reindex_queue.batch():
+        instance.antiquarian.reindex_work_links()
+        instance.antiquarian.schedule_reindex()
 
 
 @disable_for_loaddata
 def handle_reordered_works(sender, instance, created, **kwargs):
-    if not created:
+    if not created and instance.changed_fields():
         # Only handle modified links here.
         # If a new one created then this is handled in m2m_changed
         # which only works for add/remove links, not modified so we
         # need to handle modified here.
-        instance.antiquarian.reindex_fragment_and_testimonium_links()
+        instance.antiquarian.schedule_reindex()
 
 
 @disable_for_loaddata
@@ -81,23 +85,24 @@ def handle_changed_works(sender, instance, action, model, pk_set, **kwargs):
     from rard.research.models import Antiquarian, Work
 
     # find the antiquarian whose works have changed
-    if isinstance(instance, Antiquarian):
-        works = Work.objects.filter(pk__in=pk_set)
-
-        instance.reindex_work_links()
-        if adding:
-            for work in works:
-                instance.copy_links_for_work(work)
-        instance.reindex_fragment_and_testimonium_links()
-
-    elif model == Antiquarian:
-        # they are adding a one or more antiquarians to a work
-        # so iterate them all
-        for antiquarian in model.objects.filter(pk__in=pk_set):
-            antiquarian.reindex_work_links()
+    with reindex_queue.batch():
+        if isinstance(instance, Antiquarian):
+            works = Work.objects.filter(pk__in=pk_set)
+
+            instance.reindex_work_links()
             if adding:
-                antiquarian.copy_links_for_work(instance)
-            antiquarian.reindex_fragment_and_testimonium_links()
+                for work in works:
+                    instance.copy_links_for_work(work)
+            instance.schedule_reindex()
+
+        elif model == Antiquarian:
+            # they are adding a one or more antiquarians to a work
+            # so iterate them all
+            for antiquarian in model.objects.filter(pk__in=pk_set):
+                antiquarian.reindex_work_links()
+                if adding:
+                    antiquarian.copy_links_for_work(instance)
+                antiquarian.schedule_reindex()
 
 
 m2m_changed.connect(handle_changed_works, sender=WorkLink)
@@ -129,6 +134,8 @@ class Antiquarian(
 
     plain_introduction = models.TextField(blank=False, default="")
 
+    tracked_fields = ("name", "introduction_id")
+
     re_code = models.CharField(
         max_length=64, blank=False, unique=True, verbose_name="RE Number"
     )
@@ -175,7 +182,7 @@ class Antiquarian(
     def save(self, *args, **kwargs):
         if not self.order_name:
             self.order_name = self.name
-        if self.introduction:
+        if self.text_object_field_changed("introduction"):
             self.plain_introduction = make_plain_text(self.introduction.content)
         super().save(*args, **kwargs)
 
@@ -185,7 +192,7 @@ class Antiquarian(
         from django.db import transaction
 
         # single db update
-        with transaction.atomic():
+        with transaction.atomic(), reindex_queue.batch():
             links = WorkLink.objects.filter(antiquarian=self).order_by(
                 "work__unknown", models.F(("order")).asc(nulls_first=False)
             )
@@ -194,32 +201,90 @@ class Antiquarian(
                     link.order = count
                     link.save()
 
+    def schedule_reindex(self):
+        """Request reindex_fragment_and_testimonium_links, coalesced with
+        any other requests in the current batch of changes"""
+        reindex_queue.schedule(
+            "antiquarian", self.pk, self.reindex_fragment_and_testimonium_links
+        )
+
     @classmethod
-    def reindex_null_fragment_and_testimonium_links(cls):
-        # any links that have no antiquarian attached, reorder them
+    def schedule_null_reindex(cls, work, since=0):
+        """Request reindex_null_fragment_and_testimonium_links for the links
+        to the work from work order `since` on, coalesced with any other
+        requests for the work in the current batch of changes"""
+        reindex_queue.schedule_items(
+            "unattached",
+            getattr(work, "pk", work),
+            lambda starts: cls.reindex_null_fragment_and_testimonium_links(
+                work, since=min(starts)
+            ),
+            [since],
+        )
+
+    @classmethod
+    def reindex_null_fragment_and_testimonium_links(cls, work, since=0):
+        # any links that have no antiquarian attached, reorder them. They are
+        # numbered across the whole collection, but only those sorted
+        # alongside the links to this work from work order `since` on can
+        # have changed position, plus those after them if the number of
+        # links to this work has changed
         from rard.research.models.base import (
             AppositumFragmentLink,
             FragmentLink,
             TestimoniumLink,
         )
 
-        to_reorder = [
-            FragmentLink.objects.filter(antiquarian=None)
-            .order_by("work__worklink__order", "work_order")
-            .distinct(),
-            TestimoniumLink.objects.filter(antiquarian=None)
-            .order_by("work__worklink__order", "work_order")
-            .distinct(),
-            AppositumFragmentLink.objects.filter(antiquarian=None)
-            .order_by("work__worklink__order", "work_order")
-            .distinct(),
-        ]
-
-        for qs in to_reorder:
-            for count, link in enumerate(qs):
-                if link.order != count:
-                    link.order = count
-                    link.save()
+        # links with no antiquarian have no worklink of their own so use
+        # the first worklink of the work, if it has one
+        worklink_order = Subquery(
+            WorkLink.objects.filter(work=OuterRef("work"))
+            .order_by("order")
+            .values("order")[:1]
+        )
+        work_position = (
+            WorkLink.objects.filter(work=work)
+            .order_by("order")
+            .values_list("order", flat=True)
+            .first()
+        )
+        for link_model in (FragmentLink, TestimoniumLink, AppositumFragmentLink):
+            links = link_model.objects.filter(antiquarian=None).annotate(
+                worklink_order=worklink_order
+            )
+            # links to works with no worklinks are sorted last
+            if work_position is None:
+                earlier = Q(worklink_order__isnull=False)
+                alongside = Q(worklink_order__isnull=True)
+                after = links.none()
+            else:
+                earlier = Q(worklink_order__lt=work_position)
+                alongside = Q(worklink_order=work_position)
+                after = links.filter(
+                    Q(worklink_order__gt=work_position) | Q(worklink_order__isnull=True)
+                )
+            before = links.filter(earlier | alongside & Q(work_order__lt=since))
+            changed = links.filter(alongside, work_order__gte=since)
+
+            start = before.count()
+            reorder_queryset(changed, "order", ["work_order"], start=start)
+            link_model.schedule_display_names_for(changed)
+
+            # the links after are already in order between themselves so
+            # only need renumbering if they no longer follow on
+            start += changed.count()
+            first_after = (
+                after.order_by(
+                    F("worklink_order").asc(nulls_last=True), "work_order", "order"
+                )
+                .values_list("order", flat=True)
+                .first()
+            )
+            if first_after is not None and first_after != start:
+                reorder_queryset(
+                    after, "order", [worklink_order, "work_order"], start=start
+                )
+                link_model.schedule_display_names_for(after)
 
     def copy_links_for_work(self, work):
         # copy links from one work to another
@@ -232,27 +297,42 @@ class Antiquarian(
             TestimoniumLink,
         )
 
-        with transaction.atomic():
+        with transaction.atomic(), reindex_queue.batch():
+            # copy the links that other antiquarians have to this work
+            # unless we already have them, creating them all at once.
+            # Fragment links are done first as they bring their apposita
+            # links with them
             to_ensure = [
-                FragmentLink.objects.filter(work=work).exclude(antiquarian=self),
-                TestimoniumLink.objects.filter(work=work).exclude(antiquarian=self),
-                AppositumFragmentLink.objects.filter(
-                    work=work, exclusive=False
-                ).exclude(antiquarian=self),
+                FragmentLink.objects.filter(work=work),
+                TestimoniumLink.objects.filter(work=work),
+                AppositumFragmentLink.objects.filter(work=work, exclusive=False),
             ]
             for qs in to_ensure:
-                for link in qs:
-                    data = {
-                        "order": link.order,
-                        "antiquarian": self,
-                        "work": link.work,
-                        "book": link.book,
-                        "definite_antiquarian": link.definite_antiquarian,
-                        "definite_work": link.definite_work,
-                        "definite_book": link.definite_book,
-                        link.linked_field: getattr(link, link.linked_field),
-                    }
-                    link.__class__.objects.get_or_create(**data)
+                link_model = qs.model
+                linked_field = link_model._meta.get_field(link_model.linked_field)
+                existing = set(
+                    qs.filter(antiquarian=self).values_list(
+                        "book", linked_field.attname
+                    )
+                )
+                new_links = []
+                for link in qs.exclude(antiquarian=self):
+                    key = (link.book_id, getattr(link, linked_field.attname))
+                    if key in existing:
+                        continue
+                    existing.add(key)
+                    new_links.append(
+                        link_model(
+                            antiquarian=self,
+                            work=work,
+                            book_id=link.book_id,
+                            definite_antiquarian=link.definite_antiquarian,
+                            definite_work=link.definite_work,
+                            definite_book=link.definite_book,
+                            **{linked_field.attname: key[1]},
+                        )
+                    )
+                link_model.bulk_create_links(new_links)
 
             # remove unlinked
             stale = [
@@ -270,7 +350,7 @@ class Antiquarian(
 
         from django.db import transaction
 
-        with transaction.atomic():
+        with transaction.atomic(), reindex_queue.batch():
             # for any works that were linked to this antiquarian but still have
             # other authors, we need to delete our links to those works
             deleteable = [
@@ -312,49 +392,55 @@ class Antiquarian(
                     work__isnull=False, exclusive=False, work__antiquarian__isnull=True
                 ).exclude(work__in=self.works.all()),
             ]
+            nulled_works = set()
             for qs in nullable:
                 # set the antiquarian to None for these links
                 # i.e. we preserve links from objects to the work
                 # even if there is now no antiquarian for that work
+                nulled_works.update(qs.values_list("work", flat=True))
                 qs.update(antiquarian=None)
 
-            to_reorder = [
-                self.fragmentlinks.all()
-                .order_by(
-                    "work__worklink__order",
-                    "work_order",
-                )
-                .distinct(),
-                # We want testimonium links without works to be ordered first
-                # but for some reason adding "-work__isnull" to the order_by
-                # breaks the rest of the ordering. Using itertools chain as
-                # a workaround does the job.
-                itertools.chain(
-                    self.testimoniumlinks.all().filter(work__isnull=True).distinct(),
-                    self.testimoniumlinks.all()
-                    .filter(work__isnull=False)
-                    .order_by(
-                        "-work__unknown",
-                        "work__worklink__order",
-                        "work_order",
-                    )
-                    .distinct(),
-                ),
-                self.appositumfragmentlinks.all()
-                .order_by(
-                    "work__worklink__order",
+            # order according to our own worklinks, in a single update
+            # per link type
+            worklink_order = Subquery(
+                WorkLink.objects.filter(antiquarian=self, work=OuterRef("work")).values(
+                    "order"
+                )[:1]
+            )
+            reorder_queryset(
+                self.fragmentlinks.all(), "order", [worklink_order, "work_order"]
+            )
+            # We want testimonium links without works to be ordered first,
+            # keeping their existing order among themselves
+            without_work = When(work__isnull=True, then=0)
+            reorder_queryset(
+                self.testimoniumlinks.all(),
+                "order",
+                [
+                    Case(without_work, default=1, output_field=IntegerField()),
+                    Case(When(work__isnull=True, then=F("order"))),
+                    F("work__unknown").desc(),
+                    worklink_order,
                     "work_order",
-                )
-                .distinct(),
-            ]
+                ],
+            )
+            reorder_queryset(
+                self.appositumfragmentlinks.all(),
+                "order",
+                [worklink_order, "work_order"],
+            )
 
-            for qs in to_reorder:
-                for count, link in enumerate(qs):
-                    if link.order != count:
-                        link.order = count
-                        link.save()
+            # the unattached links of those works need to be reordered
+            for work in nulled_works:
+                self.schedule_null_reindex(work)
 
-            self.reindex_null_fragment_and_testimonium_links()
+            self.schedule_display_names()
+
+    def schedule_display_names(self):
+        """Request a refresh of the stored display names of everything
+        linked to this antiquarian"""
+        for links in (self.fragmentlinks.all(), self.testimoniumlinks.all()):
+            links.model.schedule_display_names_for(links)
 
     def refresh_bibliography_items_from_mentions(self):
         """Antiquarian bibliography should be derived from bibliography
@@ -443,9 +529,17 @@ def remove_stale_antiquarian_links(sender, instance, **kwargs):
     qs.delete()
 
 
+@disable_for_loaddata
+def handle_saved_antiquarian(sender, instance, created, **kwargs):
+    # the antiquarian's name is part of the display names of its material
+    if not created and "name" in instance.changed_fields():
+        instance.schedule_display_names()
+
+
 pre_delete.connect(remove_stale_antiquarian_links, sender=Antiquarian)
 
 post_save.connect(create_unknown_work, sender=Antiquarian)
+post_save.connect(handle_saved_antiquarian, sender=Antiquarian)
 
 
 Antiquarian.init_text_object_fields()
@@ -469,3 +563,69 @@ class AntiquarianConcordance(HistoryModelMixin, BaseModel):
 
     def __str__(self):
         return "%s:%s" % (self.source, self.identifier)
+
+
+class AntiquarianPage:
+    """The works and linked material shown on an antiquarian's page. These
+    are loaded in bulk so that the page can be rendered in a fixed number
+    of queries, however much material is linked to the antiquarian.
+
+    `works` lists (work, testimonium links, fragment links, appositum
+    links) for each of the antiquarian's works in order, and
+    `unknown_work_testimonium_links` are the testimonia shown above them"""
+
+    def __init__(self, antiquarian):
+        from rard.research.models.base import (
+            AppositumFragmentLink,
+            FragmentLink,
+            TestimoniumLink,
+        )
+
+        self.antiquarian = antiquarian
+
+        works = list(antiquarian.ordered_works.select_related("introduction"))
+        testimonium_links = self.get_links_by_work(TestimoniumLink)
+        fragment_links = self.get_links_by_work(FragmentLink)
+        appositum_links = self.get_links_by_work(
+            AppositumFragmentLink, select_related=["link_object"]
+        )
+
+        self.works = [
+            (
+                work,
+                testimonium_links.get(work.pk, []),
+                fragment_links.get(work.pk, []),
+                appositum_links.get(work.pk, []),
+            )
+            for work in works
+        ]
+        unknown_work = next((work for work in works if work.unknown), None)
+        self.unknown_work_testimonium_links = testimonium_links.get(
+            unknown_work.pk if unknown_work else None, []
+        )
+
+    def get_links_by_work(self, link_model, select_related=()):
+        # the links of the antiquarian with everything needed to show
+        # them, as lists in work order keyed by work pk
+        linked_field = link_model.linked_field
+        linked_model = link_model._meta.get_field(linked_field).related_model
+        prefetches = [
+            "work__antiquarian_set",
+            "%s__original_texts__citing_work__author" % linked_field,
+        ]
+        if hasattr(linked_model, "LINK_TYPE"):
+            prefetches.extend(
+                linked_model.link_names_prefetch(prefix="%s__" % linked_field)
+            )
+        links = (
+            link_model.objects.filter(antiquarian=self.antiquarian)
+            .select_related(
+                "work", "book", "antiquarian", linked_field, *select_related
+            )
+            .prefetch_related(*prefetches)
+            .order_by("work_order", "pk")
+        )
+        links_by_work = {}
+        for link in links:
+            links_by_work.setdefault(link.work_id, []).append(link)
+        return links_by_work
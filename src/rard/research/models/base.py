@@ -1,3 +1,5 @@
+from functools import partial
+
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models, transaction
 from django.db.models.signals import m2m_changed, post_delete, post_save
@@ -7,6 +9,7 @@ from rard.research.models import Antiquarian
 from rard.research.models.mixins import TextObjectFieldMixin
 from rard.utils.basemodel import BaseModel, LockableModel
 from rard.utils.decorators import disable_for_loaddata
+from rard.utils.reorder import reindex_queue, reorder_queryset
 
 
 class LinkBaseModel(BaseModel):
@@ -110,6 +113,52 @@ class WorkLinkBaseModel(LinkBaseModel):
         except TypeError:
             return "ERR"
 
+    def set_default_work_and_book(self):
+        # links to no work are attached to the unknown work of their
+        # antiquarian, and links to no book to the unknown book of the work
+        if self.work_id is None:
+            if self.antiquarian_id is not None:
+                self.work = self.antiquarian.unknown_work
+                if self.book_id is None:
+                    self.book = self.work.unknown_book
+        elif self.book_id is None:
+            self.book = self.work.unknown_book
+
+    @classmethod
+    def bulk_create_links(cls, links):
+        """Create several new links in one query, with the same outcome as
+        creating each in turn but without the per-link signal handling.
+        Defaults are applied as for a single link, the apposita links of
+        new fragment links are created, and each book, work and antiquarian
+        involved is reindexed once afterwards."""
+        if not links:
+            return []
+        with transaction.atomic(), reindex_queue.batch():
+            for link in links:
+                link.set_default_work_and_book()
+            links = cls.objects.bulk_create(links)
+            if cls is FragmentLink:
+                AppositumFragmentLink.bulk_ensure_apposita_links(links)
+            cls.schedule_reindex_for_links(links)
+        return links
+
+    @staticmethod
+    def schedule_reindex_for_links(links):
+        from rard.research.models import Book, Work
+
+        book_pks = {link.book_id for link in links if link.book_id}
+        work_pks = {link.work_id for link in links if link.work_id}
+        antiquarian_pks = {link.antiquarian_id for link in links if link.antiquarian_id}
+        # new links go at the end of their books
+        for book in Book.objects.filter(pk__in=book_pks):
+            book.schedule_reindex()
+        for work in Work.objects.filter(pk__in=work_pks):
+            work.schedule_reindex()
+        for antiquarian in Antiquarian.objects.filter(pk__in=antiquarian_pks):
+            antiquarian.schedule_reindex()
+        for work_pk in {link.work_id for link in links if not link.antiquarian_id}:
+            Antiquarian.schedule_null_reindex(work_pk)
+
     def related_work_queryset(self):
         try:
             return self.__class__.objects.filter(work=self.work).order_by(
@@ -145,12 +194,13 @@ class WorkLinkBaseModel(LinkBaseModel):
             replacement.order_in_book,
             self.order_in_book,
         )
-        self.save()
-        replacement.save()
-        if self.work:
-            self.reindex_work_by_book()
-        if self.antiquarian:
-            self.antiquarian.reindex_fragment_and_testimonium_links()
+        with reindex_queue.batch():
+            self.save()
+            replacement.save()
+            if self.work:
+                self.reindex_work_by_book()
+            if self.antiquarian:
+                self.antiquarian.schedule_reindex()
 
     def move_to_by_book(self, pos):
         # move to a particular index in the set
@@ -174,16 +224,15 @@ class WorkLinkBaseModel(LinkBaseModel):
                 .filter(order_in_book__lte=pos)
             )
             reindex_start_pos = 0
-        with transaction.atomic():
+        with transaction.atomic(), reindex_queue.batch():
             for count, obj in enumerate(to_reorder):
                 obj.order_in_book = count + reindex_start_pos
                 obj.save()
             self.order_in_book = pos
             self.save()
 
-        self.reindex_work_by_book()
-        self.antiquarian.reindex_fragment_and_testimonium_links()
-        Antiquarian.reindex_null_fragment_and_testimonium_links()
+            self.reindex_work_by_book()
+            self.antiquarian.schedule_reindex()
 
     def move_to_by_work(self, pos):
         # move to a particular index in the set
@@ -209,14 +258,15 @@ class WorkLinkBaseModel(LinkBaseModel):
             )
             reindex_start_pos = 0
 
-        with transaction.atomic():
+        with transaction.atomic(), reindex_queue.batch():
             for count, obj in enumerate(to_reorder):
                 obj.work_order = count + reindex_start_pos
                 obj.save()
             self.work_order = pos
             self.save()
-        self.antiquarian.reindex_fragment_and_testimonium_links()
-        Antiquarian.reindex_null_fragment_and_testimonium_links()
+            self.antiquarian.schedule_reindex()
+            # links before those moved past keep their place
+            Antiquarian.schedule_null_reindex(self.work, since=min(old_pos, pos))
 
     def up_by_book(self):
         previous = self.prev_by_book()
@@ -230,25 +280,44 @@ class WorkLinkBaseModel(LinkBaseModel):
 
     def reindex_work_by_book(self):
         """Update order of links with respect to work, taking into account book__order and order_in_book"""
-        from django.db import transaction
-
-        with transaction.atomic():
-            to_reorder = (
-                self.__class__.objects.filter(work=self.work)
-                .order_by("book__order", "order_in_book")
-                .distinct()
+        with reindex_queue.batch():
+            # the linked object's names change whenever its links do
+            self.schedule_display_names(
+                [getattr(self, self._meta.get_field(self.linked_field).attname)]
+            )
+            reindex_queue.schedule(
+                "work",
+                (self.__class__.__name__, getattr(self.work, "pk", None)),
+                partial(self.__class__.reorder_work, self.work),
             )
-
-            for count, link in enumerate(to_reorder):
-                if link.work_order != count:
-                    link.work_order = count
-                    link.save()
             # request that the antiquarian involved reindex their fragment links
             if self.antiquarian:
-                self.antiquarian.reindex_fragment_and_testimonium_links()
-        # also check order of unattached links it
-        # works for null antiquarian also
-        Antiquarian.reindex_null_fragment_and_testimonium_links()
+                self.antiquarian.schedule_reindex()
+            # also check order of unattached links to this work
+            Antiquarian.schedule_null_reindex(self.work)
+
+    @classmethod
+    def reorder_work(cls, work):
+        links = cls.objects.filter(work=work)
+        reorder_queryset(links, "work_order", ["book__order", "order_in_book"])
+        cls.schedule_display_names_for(links)
+
+    @classmethod
+    def schedule_display_names(cls, pks):
+        """Request a refresh of the stored display names of the objects with
+        the given pks, where the linked model stores them"""
+        linked_model = cls._meta.get_field(cls.linked_field).related_model
+        if issubclass(linked_model, DisplayNameModel):
+            linked_model.schedule_display_names(pks)
+
+    @classmethod
+    def schedule_display_names_for(cls, links):
+        # refresh the display names of everything linked by these links
+        linked_model = cls._meta.get_field(cls.linked_field).related_model
+        if issubclass(linked_model, DisplayNameModel):
+            linked_model.schedule_display_names(
+                links.values_list(cls.linked_field, flat=True)
+            )
 
     work = models.ForeignKey(
         "Work",
@@ -375,16 +444,55 @@ class AppositumFragmentLink(WorkLinkBaseModel):
         # instance is FragmentLink. When a linked fragment is
         # linked to something else then we need to reflect this
         # in the appositum links
-        with transaction.atomic():
-            for apposita in instance.fragment.apposita.all():
-                AppositumFragmentLink.objects.get_or_create(
-                    antiquarian=instance.antiquarian,
-                    work=instance.work,
-                    book=instance.book,
-                    linked_to=instance.fragment,
-                    anonymous_fragment=apposita,
-                    link_object=instance,
+        cls.bulk_ensure_apposita_links([instance])
+
+    @classmethod
+    def bulk_ensure_apposita_links(cls, fragment_links):
+        """Equivalent of ensure_apposita_links for several fragment links,
+        with the apposita and existing links fetched in single queries and
+        the missing links created together"""
+        from rard.research.models import Fragment
+
+        fragment_links = list(fragment_links)
+        apposita = {}
+        for (
+            fragment_pk,
+            anonymous_fragment_pk,
+        ) in Fragment.apposita.through.objects.filter(
+            fragment__in=[link.fragment_id for link in fragment_links]
+        ).values_list(
+            "fragment", "anonymousfragment"
+        ):
+            apposita.setdefault(fragment_pk, []).append(anonymous_fragment_pk)
+
+        key_fields = (
+            "link_object",
+            "anonymous_fragment",
+            "antiquarian",
+            "work",
+            "book",
+            "linked_to",
+        )
+        existing = set(
+            cls.objects.filter(link_object__in=fragment_links).values_list(*key_fields)
+        )
+        to_create = []
+        for link in fragment_links:
+            for anonymous_fragment_pk in apposita.get(link.fragment_id, []):
+                key = (
+                    link.pk,
+                    anonymous_fragment_pk,
+                    link.antiquarian_id,
+                    link.work_id,
+                    link.book_id,
+                    link.fragment_id,
                 )
+                if key not in existing:
+                    existing.add(key)
+                    to_create.append(
+                        cls(**{f"{f}_id": pk for f, pk in zip(key_fields, key)})
+                    )
+        cls.bulk_create_links(to_create)
 
 
 @disable_for_loaddata
@@ -394,7 +502,7 @@ def check_order_info(sender, instance, action, model, pk_set, **kwargs):
     if action not in ["post_add", "post_remove"]:
         return
 
-    with transaction.atomic():
+    with transaction.atomic(), reindex_queue.batch():
         # we might be handed the antiquarian or the fragment/testimonium
         # depending on which way round the change was made
         antiquarians = Antiquarian.objects.none()
@@ -403,31 +511,26 @@ def check_order_info(sender, instance, action, model, pk_set, **kwargs):
         elif isinstance(instance, Antiquarian):
             antiquarians = Antiquarian.objects.filter(pk=instance.pk)
 
+        # links added or removed here always have an antiquarian, so
+        # unattached links are unaffected
         for antiquarian in antiquarians.all():
-            antiquarian.reindex_fragment_and_testimonium_links()
-
-        Antiquarian.reindex_null_fragment_and_testimonium_links()
+            antiquarian.schedule_reindex()
 
 
 @disable_for_loaddata
 def handle_new_link(sender, instance, created, **kwargs):
-    if created:
+    if not created:
+        return
+    with reindex_queue.batch():
         if isinstance(instance, FragmentLink):
             AppositumFragmentLink.ensure_apposita_links(instance)
 
-        if instance.work is None:
-            if instance.antiquarian is not None:
-                instance.work = instance.antiquarian.unknown_work
-                if instance.book is None:
-                    instance.book = instance.antiquarian.unknown_work.unknown_book
-        else:
-            work = instance.work
-            if instance.book is None:
-                # Add to end of unknown book
-                instance.book = work.unknown_book
-                instance.order_in_book = instance.__class__.objects.filter(
-                    book=work.unknown_book
-                ).count()
+        if instance.work is not None and instance.book is None:
+            # Add to end of unknown book
+            instance.order_in_book = instance.__class__.objects.filter(
+                book=instance.work.unknown_book
+            ).count()
+        instance.set_default_work_and_book()
         instance.save()
         reindex_order_info(sender, instance, **kwargs)
 
@@ -478,6 +581,8 @@ class HistoricalBaseModel(TextObjectFieldMixin, LockableModel, BaseModel):
     # master index / order for the collection
     collection_id = models.PositiveIntegerField(default=None, null=True, blank=True)
 
+    tracked_fields = ("commentary_id",)
+
     # Below is an example of how collection_id might be set by calling this
     # method at the end of the project. Beware when using order_by that if you
     # use a related field e.g. original text name, then you will get duplicate
@@ -555,8 +660,9 @@ class HistoricalBaseModel(TextObjectFieldMixin, LockableModel, BaseModel):
 
     @property
     def mentioned_in_list(self):
-        mentions = [m.get_related_object() for m in self.mentioned_in.all()]
-        return mentions
+        from rard.research.models import TextObjectField
+
+        return TextObjectField.get_related_objects(self.mentioned_in.all())
 
     # Duplicates are only used on (Anon)Fragments but these fields also exist on testimonia
     # when duplicating, a new fragment is created
@@ -649,8 +755,31 @@ class HistoricalBaseModel(TextObjectFieldMixin, LockableModel, BaseModel):
         names = self.get_link_names(show_certainty=False)
         return self._render_display_name(names, add_also=False)
 
+    # ordering of the links used to build the display name
+    link_names_ordering = ("work", "antiquarian", "order")
+
+    @classmethod
+    def link_names_prefetch(cls, prefix=""):
+        """Prefetch the links needed by get_link_names so that display names
+        for a list of objects can be rendered without further queries. The
+        links are stored on the object as 'link_names_links'. The prefix is
+        the path to the objects when prefetching from a related model."""
+        link_model = cls.LINK_TYPE
+        return [
+            models.Prefetch(
+                "%santiquarian_%ss" % (prefix, link_model.__name__.lower()),
+                queryset=link_model.objects.select_related("antiquarian", "work")
+                .prefetch_related("work__antiquarian_set")
+                .order_by(*cls.link_names_ordering),
+                to_attr="link_names_links",
+            )
+        ]
+
     def get_link_names(self, show_certainty=True):
-        links = self.get_all_links().order_by("work", "antiquarian", "order")
+        try:
+            links = self.link_names_links
+        except AttributeError:
+            links = self.get_all_links().order_by(*self.link_names_ordering)
         names = []
         for link in links:
             if link.work and not link.work.unknown:
@@ -670,3 +799,98 @@ class HistoricalBaseModel(TextObjectFieldMixin, LockableModel, BaseModel):
         # option b currently default
         names = self.get_link_names(show_certainty=False)
         return self._render_display_name(names)
+
+
+class DisplayNameModel(models.Model):
+    """Stores the display names of a fragment or testimonium, which are built
+    from the order of its links, so that showing them does not need the links
+    to be queried each time. The names are refreshed in bulk at the end of
+    any reindex of the links, and are not written when the object is saved.
+
+    To be placed before HistoricalBaseModel in the bases of the model."""
+
+    # as the first base its Meta is the one inherited, so keep the ordering
+    class Meta(HistoricalBaseModel.Meta):
+        abstract = True
+
+    # the name with any other names as "(also = ...)"
+    display_name = models.TextField(blank=True, default="", editable=False)
+    # the primary name only
+    short_display_name = models.TextField(blank=True, default="", editable=False)
+
+    # the stored names, which are not kept in the object's history
+    display_name_fields = ["display_name", "short_display_name"]
+
+    def get_display_name(self):
+        if self.display_name:
+            return mark_safe(self.display_name)
+        # not yet stored
+        return self.get_display_name_option_b()
+
+    def get_short_display_name(self):
+        if self.short_display_name:
+            return mark_safe(self.short_display_name)
+        return self.get_display_name_option_c()
+
+    def __str__(self):
+        return self.get_short_display_name()
+
+    def save(self, *args, **kwargs):
+        # the stored names are only written by refresh_display_names so that
+        # saving a copy of the object loaded before its links last changed
+        # does not put back the older names
+        adding = self._state.adding or self.pk is None
+        if not adding:
+            update_fields = kwargs.get("update_fields")
+            if update_fields is None:
+                deferred = self.get_deferred_fields()
+                update_fields = [
+                    field.name
+                    for field in self._meta.concrete_fields
+                    if not field.primary_key and field.attname not in deferred
+                ]
+            kwargs["update_fields"] = [
+                name for name in update_fields if name not in self.display_name_fields
+            ]
+        super().save(*args, **kwargs)
+        if adding:
+            # a new object has no links yet, but the name includes the pk
+            self.display_name = self._render_display_name([])
+            self.short_display_name = self._render_display_name([], add_also=False)
+            self.__class__.objects.filter(pk=self.pk).update(
+                display_name=self.display_name,
+                short_display_name=self.short_display_name,
+            )
+
+    @classmethod
+    def schedule_display_names(cls, pks):
+        """Request refresh_display_names for these objects, coalesced with
+        any other requests in the current batch of changes"""
+        reindex_queue.schedule_items(
+            "display_name", cls.__name__, cls.refresh_display_names, pks
+        )
+
+    @classmethod
+    def refresh_display_names(cls, pks=None):
+        """Recalculate the stored display names of the objects with the
+        given pks (or of all objects), writing only those that have changed.
+        Returns the number of objects updated."""
+        objects = cls.objects.prefetch_related(*cls.link_names_prefetch())
+        if pks is not None:
+            objects = objects.filter(pk__in=[pk for pk in pks if pk is not None])
+
+        changed = []
+        for obj in objects:
+            names = obj.get_link_names(show_certainty=False)
+            display_name = obj._render_display_name(names)
+            short_display_name = obj._render_display_name(names, add_also=False)
+            if (obj.display_name, obj.short_display_name) != (
+                display_name,
+                short_display_name,
+            ):
+                obj.display_name = display_name
+                obj.short_display_name = short_display_name
+                changed.append(obj)
+
+        cls.objects.bulk_update(changed, cls.display_name_fields, batch_size=500)
+        return len(changed)
@@ -55,7 +55,7 @@ class CitingAuthor(HistoryModelMixin, LockableModel, DatedModel, BaseModel):
 
         ordering = [
             "original_texts__citing_work",  # Group by work
-            "original_texts__reference_order",  # Then order by reference order
+            "original_texts__reference_sort_key",  # Then order by reference order
         ]
         testimonia = (
             Testimonium.objects.filter(original_texts__citing_work__author=self)
@@ -106,6 +106,10 @@ class CitingWork(HistoryModelMixin, LockableModel, DatedModel, BaseModel):
         tokens = [str(self.author) if self.author else _("Anonymous"), self.title]
         return ", ".join([t for t in tokens if t])
 
+    @classmethod
+    def prefetch_history_titles(cls, queryset):
+        return queryset.select_related("author")
+
     def fragments(self):
         from rard.research.models import Fragment
 
@@ -1,10 +1,15 @@
 import re
 
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.fields import ArrayField
 from django.db import models
-from django.db.models import Case, IntegerField, Value, When
+from django.db.models import Case, IntegerField, Q, When
 
 from rard.research.models.mixins import HistoryModelMixin
 from rard.utils.basemodel import BaseModel
+from rard.utils.text_processors import natural_sort_key
+
+TEMPLATE_PATTERN = re.compile(r"\[.*\]")
 
 
 class PartIdentifierManager(models.Manager):
@@ -12,12 +17,6 @@ class PartIdentifierManager(models.Manager):
         return (
             super()
             .get_queryset()
-            .annotate(
-                is_template=Case(
-                    When(value__regex=r".*\[.*\].*", then=Value(True)),
-                    default=Value(False),
-                )
-            )
             .order_by("-is_template", "edition__name", "display_order")
         )
 
@@ -26,7 +25,7 @@ class PartIdentifier(HistoryModelMixin, BaseModel):
     objects = PartIdentifierManager()
 
     def __str__(self):
-        if re.search(self.value, r".*\[.*\].*"):
+        if self.is_template:
             return f"format for {self.edition.name}: {self.value}"
         else:
             return f"{self.edition.name}: {self.value}"
@@ -37,6 +36,13 @@ class PartIdentifier(HistoryModelMixin, BaseModel):
         max_length=30, blank=True
     )  # Name for ordering purposes
 
+    # whether the value is the format of the edition's parts, e.g. [1-10]
+    is_template = models.BooleanField(default=False, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.is_template = bool(TEMPLATE_PATTERN.search(self.value))
+        super().save(*args, **kwargs)
+
 
 class Edition(HistoryModelMixin, BaseModel):
     def __str__(self, bib=False):
@@ -57,7 +63,49 @@ class Edition(HistoryModelMixin, BaseModel):
         )
 
 
+class ConcordanceModelQuerySet(models.QuerySet):
+    def linked_to(self, **link_filter):
+        """The concordances of the original texts whose fragments, testimonia
+        or anonymous fragments have links matching the filter, e.g.
+        antiquarian=antiquarian, worked out in the database"""
+        from rard.research.models.base import (
+            AppositumFragmentLink,
+            FragmentLink,
+            TestimoniumLink,
+        )
+
+        query = Q()
+        for link_model in (FragmentLink, TestimoniumLink, AppositumFragmentLink):
+            linked_field = link_model.linked_field
+            linked_model = link_model._meta.get_field(linked_field).related_model
+            query |= Q(
+                original_text__content_type=ContentType.objects.get_for_model(
+                    linked_model
+                ),
+                original_text__object_id__in=link_model.objects.filter(
+                    **link_filter
+                ).values(linked_field),
+            )
+        return self.filter(query).select_related("identifier__edition", "original_text")
+
+    def for_antiquarian(self, antiquarian):
+        return self.linked_to(antiquarian=antiquarian)
+
+    def for_work(self, work):
+        return self.linked_to(work=work)
+
+
 class ConcordanceModel(HistoryModelMixin, BaseModel):
+    objects = ConcordanceModelQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["identifier", "concordance_sort_key"],
+                name="concordance_sort_key_idx",
+            )
+        ]
+
     def __str__(self):
         if "none" in str(self.identifier):
             return (
@@ -88,6 +136,15 @@ class ConcordanceModel(HistoryModelMixin, BaseModel):
     reference = models.CharField(max_length=15, blank=True)
     concordance_order = models.CharField(max_length=15, blank=True)
 
+    # concordance_order as a list of integers, e.g. 130.3 is [130, 3]
+    concordance_sort_key = ArrayField(
+        models.PositiveBigIntegerField(), null=True, blank=True, editable=False
+    )
+
+    def save(self, *args, **kwargs):
+        self.concordance_sort_key = natural_sort_key(self.concordance_order)
+        super().save(*args, **kwargs)
+
     @property
     def antiquarians(self):
         links = self.original_text.owner.get_all_links()
@@ -118,4 +175,5 @@ class ConcordanceModel(HistoryModelMixin, BaseModel):
                 When(content_type="NA", then=4),
                 output_field=IntegerField(),
             ),
+            "concordance_sort_key",
         )
@@ -1,11 +1,13 @@
 from django.contrib.contenttypes.fields import GenericRelation
 from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery
 from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.urls import reverse
 from simple_history.models import HistoricalRecords
 
 from rard.research.models.base import (
     AppositumFragmentLink,
+    DisplayNameModel,
     FragmentLink,
     HistoricalBaseModel,
 )
@@ -13,6 +15,7 @@ from rard.research.models.mixins import HistoryModelMixin
 from rard.research.models.topic import Topic
 from rard.utils.basemodel import DatedModel, OrderableModel
 from rard.utils.decorators import disable_for_loaddata
+from rard.utils.reorder import reorder_queryset
 from rard.utils.shared_functions import organise_links
 from rard.utils.text_processors import make_plain_text
 
@@ -55,10 +58,11 @@ m2m_changed.connect(handle_changed_topics, sender=TopicLink)
 post_delete.connect(handle_deleted_topic_link, sender=TopicLink)
 
 
-class Fragment(HistoryModelMixin, HistoricalBaseModel, DatedModel):
+class Fragment(HistoryModelMixin, DisplayNameModel, HistoricalBaseModel, DatedModel):
     history = HistoricalRecords(
         excluded_fields=[
             "topics",
+            *DisplayNameModel.display_name_fields,
         ]
     )
 
@@ -66,6 +70,8 @@ class Fragment(HistoryModelMixin, HistoricalBaseModel, DatedModel):
         # what needs to be locked in order to change the object
         return self
 
+    LINK_TYPE = FragmentLink
+
     # fragments can also have topics
     topics = models.ManyToManyField("Topic", blank=True, through="TopicLink")
 
@@ -139,14 +145,11 @@ class Fragment(HistoryModelMixin, HistoricalBaseModel, DatedModel):
         return self.appositumfragmentlinks_to.order_by("work", "work_order")
 
     def save(self, *args, **kwargs):
-        if self.commentary:
+        if self.text_object_field_changed("commentary"):
             self.plain_commentary = make_plain_text(self.commentary.content)
 
         super().save(*args, **kwargs)
 
-    def __str__(self):
-        return self.get_display_name_option_c()
-
     @property
     def is_unlinked(self):
         if self.get_all_links():
@@ -174,6 +177,8 @@ class AnonymousTopicLink(OrderableModel):
     # apposita have order 0 so we start counting from 1
     order_index_start = 1
 
+    tracked_fields = ("order", "topic_id")
+
     def related_queryset(self):
         # ordering wrt topic so filter on that
         # also exclude apposita
@@ -202,6 +207,8 @@ class AnonymousFragment(
     def related_queryset(self):
         return self.__class__.objects.all()
 
+    tracked_fields = OrderableModel.tracked_fields + HistoricalBaseModel.tracked_fields
+
     # these can also have topics but ordering not yet clear
     topics = models.ManyToManyField("Topic", blank=True, through="AnonymousTopicLink")
 
@@ -248,7 +255,7 @@ class AnonymousFragment(
     def save(self, *args, **kwargs):
         if self.order is None:
             self.order = self.__class__.objects.count()
-        if self.commentary:
+        if self.text_object_field_changed("commentary"):
             self.plain_commentary = make_plain_text(self.commentary.content)
         super().save(*args, **kwargs)
 
@@ -265,26 +272,38 @@ class AnonymousFragment(
 
 
 @disable_for_loaddata
-def reindex_anonymous_fragments():
-    # where there has been a change, ensure the
-    # ordering of fragments is correct (zero-indexed)
-
-    # single db update
-    with transaction.atomic():
-        # Order by topics, then fragments' order within those topics
-        anon_fragments = AnonymousFragment.objects.order_by(
-            "topics__order", "anonymoustopiclink__order", "order"
-        )
-        # because we are ordering on an m2m field value we may have
-        # duplicates in there. We want to remove these dupes but keep
-        # the ordering of the list. Fast way is via a set of dict keys
-        # which preserve ordering
-        # NB list(set(items)) does not preserve ordering
-
-        ordered = list(dict.fromkeys(list(anon_fragments)))
-        for count, anon in enumerate(ordered):
-            anon.order = count
-            anon.save()
+def reindex_anonymous_fragments(topic_orders=None):
+    """Ensure the ordering of anonymous fragments is correct (zero-indexed).
+    Fragments are ordered by the first topic they belong to and then by
+    their order within that topic, in a single db update that only writes
+    the fragments whose position has changed.
+
+    If a (lowest, highest) range of topic positions is given, only the
+    fragments whose first topic is in that range are renumbered. Moving
+    topics or links within that range can only reorder those fragments
+    amongst themselves, so the others need not be considered."""
+    first_link = AnonymousTopicLink.objects.filter(fragment=OuterRef("pk")).order_by(
+        "topic__order", "order"
+    )
+    fragments = AnonymousFragment.objects.annotate(
+        first_topic_order=Subquery(first_link.values("topic__order")[:1]),
+        first_link_order=Subquery(first_link.values("order")[:1]),
+    )
+    start = 0
+    if topic_orders is not None:
+        lowest, highest = topic_orders
+        start = fragments.filter(first_topic_order__lt=lowest).count()
+        fragments = fragments.filter(first_topic_order__range=(lowest, highest))
+
+    reorder_queryset(
+        fragments,
+        "order",
+        [
+            F("first_topic_order").asc(nulls_last=True),
+            F("first_link_order").asc(nulls_last=True),
+        ],
+        start=start,
+    )
 
 
 @disable_for_loaddata
@@ -300,9 +319,9 @@ def handle_apposita_change(sender, instance, action, model, pk_set, **kwargs):
                 "Add apposita to fragments via fragment.apposita "
                 "not the reverse accessor"
             )
-        with transaction.atomic():
-            for link in instance.antiquarian_fragmentlinks.all():
-                AppositumFragmentLink.ensure_apposita_links(link)
+        AppositumFragmentLink.bulk_ensure_apposita_links(
+            instance.antiquarian_fragmentlinks.all()
+        )
 
 
 @disable_for_loaddata
@@ -321,6 +340,40 @@ def handle_changed_anon_topics(sender, instance, **kwargs):
     reindex_anonymous_fragments()
 
 
+@disable_for_loaddata
+def handle_saved_anon_topic_link(sender, instance, created, **kwargs):
+    changed = instance.changed_fields()
+    if not created and not changed:
+        # nothing affecting the order of anonymous fragments has changed
+        return
+    if created or "topic_id" in changed:
+        reindex_anonymous_fragments()
+    else:
+        # only the order within this topic has changed
+        topic_order = instance.topic.order
+        reindex_anonymous_fragments(topic_orders=(topic_order, topic_order))
+
+
+@disable_for_loaddata
+def handle_saved_topic(sender, instance, created, **kwargs):
+    # a new topic has no fragments yet, and saves that don't change the
+    # order of topics (e.g. renaming) don't affect the anonymous fragments
+    changed = instance.changed_fields()
+    if created or "order" not in changed:
+        return
+    old_order = changed["order"]
+    if old_order is None or instance.order is None:
+        reindex_anonymous_fragments()
+    else:
+        # only topics between the old and new positions have moved
+        reindex_anonymous_fragments(
+            topic_orders=(
+                min(old_order, instance.order),
+                max(old_order, instance.order),
+            )
+        )
+
+
 @disable_for_loaddata
 def reindex_anonymous_topic_links(topics=None):
     topics = topics or Topic.objects.all()
@@ -391,9 +444,9 @@ def handle_changed_anon_topic_links(sender, instance, action, model, pk_set, **k
 m2m_changed.connect(handle_changed_anon_topic_links, sender=AnonymousTopicLink)
 post_delete.connect(handle_changed_anon_topics, sender=AnonymousTopicLink)
 # When AnonymousTopicLink order changes, reindex anonymous fragments
-post_save.connect(handle_changed_anon_topics, sender=AnonymousTopicLink)
+post_save.connect(handle_saved_anon_topic_link, sender=AnonymousTopicLink)
 
-post_save.connect(handle_changed_anon_topics, sender=Topic)
+post_save.connect(handle_saved_topic, sender=Topic)
 
 m2m_changed.connect(handle_apposita_change, sender=Fragment.apposita.through)
 
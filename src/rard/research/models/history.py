@@ -1,15 +1,139 @@
+import difflib
+from itertools import groupby
+from operator import itemgetter
+
+import bs4
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models import Q
 from django.dispatch import receiver
+from django.utils.html import escape
 from simple_history.signals import post_create_historical_record
 
 from rard.users.models import User
 
 
+def text_words(value):
+    if not value:
+        return []
+    soup = bs4.BeautifulSoup(str(value), features="html.parser")
+    return soup.get_text(" ").split()
+
+
+def diff_words(old, new, context=8):
+    """Returns html showing the words removed from and added to a value,
+    which may be html itself. Long unchanged stretches are shortened to
+    `context` words either side of a change"""
+    old_words, new_words = text_words(old), text_words(new)
+    if old_words == new_words:
+        # e.g. only the formatting has changed
+        return "<em>No changes to the text</em>"
+    matcher = difflib.SequenceMatcher(None, old_words, new_words, autojunk=False)
+    opcodes = matcher.get_opcodes()
+    parts = []
+    for index, (tag, i1, i2, j1, j2) in enumerate(opcodes):
+        if tag == "equal":
+            words = old_words[i1:i2]
+            before = words[:context] if index > 0 else []
+            after = words[-context:] if index < len(opcodes) - 1 else []
+            if len(before) + len(after) < len(words):
+                words = before + ["…"] + after
+            parts.append(escape(" ".join(words)))
+            continue
+        if i2 > i1:
+            parts.append("<del>%s</del>" % escape(" ".join(old_words[i1:i2])))
+        if j2 > j1:
+            parts.append("<ins>%s</ins>" % escape(" ".join(new_words[j1:j2])))
+    return " ".join(parts)
+
+
+def render_history_diff(history_item):
+    """Returns html showing the changes made to each field in a historical
+    record compared with the previous one"""
+    model = history_item.instance_type
+    pk_name = model._meta.pk.attname
+    prev_record = (
+        history_item.__class__.objects.filter(
+            **{pk_name: getattr(history_item, pk_name)},
+            history_date__lt=history_item.history_date,
+        )
+        .order_by("history_date")
+        .last()
+    )
+    if not prev_record:
+        return ""
+    # the editable fields that are tracked, as diff_against compares. The
+    # records are compared directly rather than through their instances,
+    # which fail to build for models excluding reverse relations
+    tracked = {field.attname for field in history_item._meta.fields}
+    changes = []
+    for field in model._meta.fields:
+        if not field.editable or field.attname not in tracked:
+            continue
+        old = getattr(prev_record, field.attname)
+        new = getattr(history_item, field.attname)
+        if old != new:
+            changes.append(
+                "<em>Field: %s</em><br>%s" % (field.name, diff_words(old, new))
+            )
+    return "<hr>".join(changes)
+
+
+def compactable_history_ids(
+    historical_model, collapse_system=False, keep=None, keep_user_edits=True
+):
+    """Yields the ids of the historical records that can be removed under a
+    retention policy, reading the records in chunks. The policy is:
+    collapse_system: of a run of consecutive records made by the system
+        rather than a user, e.g. by reindexing, only the last is kept
+    keep: only the latest `keep` records of each object are kept
+    keep_user_edits: records made by users are always kept
+    The first and last records of each object, and deletions, are always
+    kept"""
+    pk_name = historical_model.instance_type._meta.pk.attname
+    records = (
+        historical_model.objects.order_by(pk_name, "history_date", "history_id")
+        .values_list(pk_name, "history_id", "history_user_id", "history_type")
+        .iterator(chunk_size=2000)
+    )
+    for _, object_records in groupby(records, key=itemgetter(0)):
+        object_records = list(object_records)
+        count = len(object_records)
+        for index, (_, history_id, user_id, history_type) in enumerate(
+            object_records[:-1]
+        ):
+            if index == 0 or history_type != "~":
+                continue
+            if user_id is not None and keep_user_edits:
+                continue
+            _, _, next_user_id, next_type = object_records[index + 1]
+            redundant = (
+                collapse_system
+                and user_id is None
+                and next_user_id is None
+                and next_type == "~"
+            )
+            expired = keep is not None and index < count - keep
+            if redundant or expired:
+                yield history_id
+
+
 class HistoricalRecordLog(models.Model):
     class Meta:
         ordering = ["history_date"]
+        indexes = [
+            models.Index(
+                fields=["content_type", "object_id"], name="history_log_record_idx"
+            ),
+            # for the activity feed
+            models.Index(
+                fields=["history_user", "history_date"], name="history_log_user_idx"
+            ),
+            models.Index(
+                fields=["content_type", "history_date"], name="history_log_type_idx"
+            ),
+        ]
 
     def get_sentinel_user():
         from allauth.utils import get_user_model
@@ -34,11 +158,163 @@ class HistoricalRecordLog(models.Model):
     )
     history_date = models.DateTimeField(editable=False)
 
+    # the rendered changes made in the historical record, worked out when
+    # the log is written. None if not worked out, e.g. for older logs
+    diff = models.TextField(null=True, default=None, editable=False)
+
+    @staticmethod
+    def antiquarian_query(antiquarian):
+        """Returns a filter for the logs of the historical records of an
+        antiquarian and the works, books, fragments and testimonia linked to
+        it, with their original texts and introductions or commentaries"""
+        from rard.research.models import (
+            Book,
+            Fragment,
+            OriginalText,
+            Testimonium,
+            TextObjectField,
+            Work,
+        )
+
+        objects = {
+            antiquarian.__class__: [antiquarian.pk],
+            Work: antiquarian.works.values("pk"),
+            Book: Book.objects.filter(work__antiquarian=antiquarian).values("pk"),
+            Fragment: antiquarian.fragments.values("pk"),
+            Testimonium: antiquarian.testimonia.values("pk"),
+        }
+        original_texts = Q()
+        text_object_fields = Q()
+        for model, pks in objects.items():
+            content_type = ContentType.objects.get_for_model(model)
+            original_texts |= Q(content_type=content_type, object_id__in=pks)
+            text_object_fields |= Q(owner_content_type=content_type, owner_id__in=pks)
+        objects[OriginalText] = OriginalText.objects.filter(original_texts).values("pk")
+        objects[TextObjectField] = TextObjectField.objects.filter(
+            text_object_fields
+        ).values("pk")
+
+        query = Q()
+        for model, pks in objects.items():
+            historical_model = model.history.model
+            query |= Q(
+                content_type=ContentType.objects.get_for_model(historical_model),
+                object_id__in=historical_model.objects.filter(
+                    **{"%s__in" % model._meta.pk.attname: pks}
+                ).values("history_id"),
+            )
+        return query
+
+    @classmethod
+    def activity(cls, user=None, antiquarian=None, before=None, limit=50):
+        """Returns the latest logs, optionally only those of a user or of an
+        antiquarian and its works etc. Pages are found by keyset rather than
+        offset: `before` is the (history_date, pk) of the last log of the
+        previous page. Each log is given the title and history url of the
+        object concerned, fetched in bulk"""
+        logs = cls.objects.order_by("-history_date", "-pk").select_related(
+            "history_user"
+        )
+        if user is not None:
+            logs = logs.filter(history_user=user)
+        if antiquarian is not None:
+            logs = logs.filter(cls.antiquarian_query(antiquarian))
+        if before is not None:
+            history_date, pk = before
+            logs = logs.filter(
+                Q(history_date__lt=history_date)
+                | Q(history_date=history_date, pk__lt=pk)
+            )
+        logs = list(logs[:limit])
+        cls.resolve_records(logs)
+        return logs
+
+    @staticmethod
+    def resolve_records(logs):
+        # one query for the historical records and one for the current
+        # objects of each model (plus any prefetches for their titles),
+        # rather than a generic lookup per log
+        ids_by_type = {}
+        for log in logs:
+            ids_by_type.setdefault(log.content_type_id, set()).add(log.object_id)
+        records = {}
+        objects = {}
+        for content_type_id, ids in ids_by_type.items():
+            historical_model = ContentType.objects.get_for_id(
+                content_type_id
+            ).model_class()
+            if historical_model is None:
+                continue
+            type_records = historical_model.objects.in_bulk(ids)
+            records[content_type_id] = type_records
+            model = historical_model.instance_type
+            pk_name = model._meta.pk.attname
+            # along with whatever each model needs for its title
+            objects[model] = model.prefetch_history_titles(
+                model._base_manager.all()
+            ).in_bulk({getattr(record, pk_name) for record in type_records.values()})
+
+        for log in logs:
+            log.record = records.get(log.content_type_id, {}).get(log.object_id)
+            log.object = log.title = log.url = None
+            if log.record is None:
+                continue
+            model = log.record.instance_type
+            log.object = objects[model].get(getattr(log.record, model._meta.pk.attname))
+            if log.object is not None:
+                log.title = log.object.get_history_title()
+                log.url = log.object.history_url()
+            else:
+                log.title = "%s %s (deleted)" % (
+                    model._meta.verbose_name.capitalize(),
+                    getattr(log.record, model._meta.pk.attname),
+                )
+
+    @classmethod
+    def get_diff(cls, history_item):
+        """Returns the rendered changes made in a historical record, as
+        stored in its log. Where none has been stored they are worked out
+        but not stored, so that showing them doesn't write anything"""
+        diff = (
+            cls.objects.filter(
+                content_type=ContentType.objects.get_for_model(history_item),
+                object_id=history_item.pk,
+            )
+            .values_list("diff", flat=True)
+            .first()
+        )
+        if diff is None:
+            diff = render_history_diff(history_item)
+        return diff
+
+    @classmethod
+    def store_diffs(cls, historical_model, batch_size=500):
+        """Works out and stores the diffs of the logs of a historical model
+        that don't have one. Returns the number stored"""
+        content_type = ContentType.objects.get_for_model(historical_model)
+        history_ids = list(
+            cls.objects.filter(content_type=content_type, diff__isnull=True)
+            .order_by("pk")
+            .values_list("object_id", flat=True)
+        )
+        count = 0
+        for start in range(0, len(history_ids), batch_size):
+            records = historical_model.objects.filter(
+                history_id__in=history_ids[start : start + batch_size]
+            )
+            for record in records:
+                count += cls.objects.filter(
+                    content_type=content_type, object_id=record.pk
+                ).update(diff=render_history_diff(record))
+        return count
+
 
 @receiver(post_create_historical_record)
 def post_create_historical_record_callback(sender, **kwargs):
+    history_instance = kwargs.get("history_instance")
     HistoricalRecordLog.objects.create(
-        history_record=kwargs.get("history_instance"),
+        history_record=history_instance,
+        diff=render_history_diff(history_instance),
         history_user=kwargs.get("history_user"),
         history_date=kwargs.get("history_date"),
     )
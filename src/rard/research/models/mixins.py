@@ -25,7 +25,9 @@ class TextObjectFieldMixin(object):
             from rard.research.models.text_object_field import TextObjectField
 
             for field in cls.get_text_object_fields():
-                setattr(instance, field.name, TextObjectField.objects.create())
+                setattr(
+                    instance, field.name, TextObjectField.objects.create(owner=instance)
+                )
             instance.save_without_historical_record()
 
     @classmethod
@@ -36,6 +38,36 @@ class TextObjectFieldMixin(object):
             if text_object:
                 text_object.delete()
 
+    def text_object_field_changed(self, name):
+        """Whether the content of the named text object field may have changed
+        since this object was loaded, so that anything derived from it needs
+        recalculating. The text object can only have been edited through this
+        object if it has been fetched, and its own content is tracked."""
+        field = self._meta.get_field(name)
+        if field.attname in self.changed_fields():
+            return getattr(self, name) is not None
+        if not field.is_cached(self):
+            return False
+        text_object = getattr(self, name)
+        return text_object is not None and "content" in text_object.changed_fields()
+
+    def update_plain_text(self, text_object):
+        """Update the plain text copy of one of our text object fields, used
+        for searching, with a single update of that column. Nothing else is
+        saved, so no history is recorded and no signals are sent."""
+        from rard.utils.text_processors import make_plain_text
+
+        for field in self.get_text_object_fields():
+            plain_field = "plain_%s" % field.name
+            if getattr(self, field.attname) == text_object.pk and hasattr(
+                self, plain_field
+            ):
+                plain_text = make_plain_text(text_object.content)
+                setattr(self, plain_field, plain_text)
+                self.__class__._base_manager.filter(pk=self.pk).update(
+                    **{plain_field: plain_text}
+                )
+
     @classmethod
     def init_text_object_fields(cls):
         post_save.connect(cls.create_text_object_fields, sender=cls)
@@ -53,6 +85,12 @@ class HistoryModelMixin(object):
     def get_history_title(self):
         return str(self)
 
+    @classmethod
+    def prefetch_history_titles(cls, queryset):
+        # fetch anything that get_history_title() needs along with the
+        # objects themselves, for listing many of them at once
+        return queryset
+
     def history_url(self):
         # by default sort according to all objects of this class
         # and this can be overidden in the subclasses in case
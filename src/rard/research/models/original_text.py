@@ -1,38 +1,59 @@
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.fields import ArrayField
 from django.db import models
+from django.db.models.signals import post_delete, post_save
 from django.utils.safestring import mark_safe
 from simple_history.models import HistoricalRecords
 
 from rard.research.models.mixins import HistoryModelMixin
 from rard.research.models.reference import Reference
 from rard.utils.basemodel import BaseModel, DynamicTextField
-from rard.utils.text_processors import make_plain_text
+from rard.utils.decorators import disable_for_loaddata
+from rard.utils.text_processors import make_plain_text, natural_sort_key
 
 
 class OriginalText(HistoryModelMixin, BaseModel):
-    history = HistoricalRecords()
+    history = HistoricalRecords(
+        excluded_fields=[
+            "owner_index",
+            "owner_ordinal",
+            "references_display",
+            "reference_sort_key",
+        ]
+    )
 
     def related_lock_object(self):
         return self.owner
 
     class Meta:
-        ordering = ("citing_work", "reference_order")
+        ordering = ("citing_work", "reference_sort_key")
+        indexes = [
+            models.Index(
+                fields=["citing_work", "reference_sort_key"],
+                name="original_text_reference_idx",
+            )
+        ]
 
     @property
     def reference_list(self):
+        return self.references_display
+
+    def build_reference_list(self):
         """Returns a string which lists the editor and ref position for each reference
         unless there's only one, in which case only the ref position is shown"""
-        references = Reference.objects.filter(original_text=self)
-        if references.count() > 1:
+        # use the reverse relation so that references can be prefetched
+        references = list(self.references.all())
+        if len(references) > 1:
             return " | ".join(
                 [
                     f"{reference.editor} {reference.reference_position}"
                     for reference in references
                 ]
             )
-        else:
-            return references.first().reference_position
+        elif references:
+            return references[0].reference_position
+        return ""
 
     # The value to be used in 'ordering by reference'
     # In some cases it will be a dot-separated list of numbers that also need
@@ -41,6 +62,12 @@ class OriginalText(HistoryModelMixin, BaseModel):
         blank=False, null=True, default=None, max_length=100
     )
 
+    # reference_order as a list of integers, e.g. 00001.00024.01230 is
+    # [1, 24, 1230], which sorts naturally and is indexed for range queries
+    reference_sort_key = ArrayField(
+        models.PositiveIntegerField(), null=True, blank=True, editable=False
+    )
+
     # original text can belong to either a fragment or a testimonium
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
@@ -65,14 +92,50 @@ class OriginalText(HistoryModelMixin, BaseModel):
         "no apparatus criticus exists", blank=False, null=False, default=False
     )
 
+    # the zero-indexed position of this text among its owner's original
+    # texts, and the letter shown for it if there are several (or "")
+    owner_index = models.PositiveIntegerField(
+        null=True, default=None, blank=True, editable=False
+    )
+    owner_ordinal = models.CharField(
+        max_length=8, default="", blank=True, editable=False
+    )
+
+    # the value of reference_list, kept up to date as references change
+    references_display = models.TextField(default="", blank=True, editable=False)
+
+    # changes to these affect the position of the text wrt its owner
+    tracked_fields = (
+        "content_type_id",
+        "object_id",
+        "citing_work_id",
+        "reference_order",
+    )
+
     def save(self, *args, **kwargs):
         """Save html free copy of text fields. We introduce a space
         between closing and opening tags so words at the beginning/end
         of list items don't get merged (and other things like that)"""
         if self.content:
             self.plain_content = make_plain_text(self.content)
+        self.reference_sort_key = natural_sort_key(self.reference_order)
         super(OriginalText, self).save(*args, **kwargs)
 
+    @classmethod
+    def in_reference_range(cls, citing_work, start, end):
+        """The original texts of a citing work with references from start to
+        end inclusive, e.g. "1.3" to "1.10", which includes 1.10.2 etc."""
+        queryset = cls.objects.filter(citing_work=citing_work)
+        start_key = natural_sort_key(start)
+        if start_key:
+            queryset = queryset.filter(reference_sort_key__gte=start_key)
+        end_key = natural_sort_key(end)
+        if end_key:
+            # anything below the next reference along, e.g. 1.11
+            end_key[-1] += 1
+            queryset = queryset.filter(reference_sort_key__lt=end_key)
+        return queryset
+
     def apparatus_criticus_lines(self):
         # use this rather than the above as that doesn't automatically
         # sort the results :/
@@ -85,16 +148,59 @@ class OriginalText(HistoryModelMixin, BaseModel):
         return citing_work_str
 
     def index_with_respect_to_parent_object(self):
-        return (*self.owner.original_texts.all(),).index(self)
+        return self.owner_index
 
     def ordinal_with_respect_to_parent_object(self):
         # if there are any sibling original texts then display
         # an ordinal a, b, c for this original text
-        ordinal = ""
-        if self.owner.original_texts.count() > 1:
-            index = self.index_with_respect_to_parent_object()
-            ordinal = chr(ord("a") + index)
-        return ordinal
+        return self.owner_ordinal
+
+    @classmethod
+    def get_ordinals(cls, pks):
+        """Equivalent of ordinal_with_respect_to_parent_object for several
+        original texts at once, returned as a dictionary keyed by pk"""
+        if not pks:
+            return {}
+        return dict(cls.objects.filter(pk__in=pks).values_list("pk", "owner_ordinal"))
+
+    @classmethod
+    def reindex_owner(cls, content_type_id, object_id, instance=None):
+        """Store the position and ordinal of each of an owner's original
+        texts, writing only those that have changed. If one of the texts is
+        given its values are updated too."""
+        texts = list(
+            cls.objects.filter(content_type_id=content_type_id, object_id=object_id)
+            .order_by(*cls._meta.ordering, "pk")
+            .only("pk", "owner_index", "owner_ordinal")
+        )
+        changed = []
+        for index, text in enumerate(texts):
+            ordinal = chr(ord("a") + index) if len(texts) > 1 else ""
+            if (text.owner_index, text.owner_ordinal) != (index, ordinal):
+                text.owner_index, text.owner_ordinal = index, ordinal
+                changed.append(text)
+            if instance is not None and text.pk == instance.pk:
+                instance.owner_index, instance.owner_ordinal = index, ordinal
+        cls.objects.bulk_update(changed, ["owner_index", "owner_ordinal"])
+
+    @classmethod
+    def reindex_owner_of(cls, owner):
+        cls.reindex_owner(ContentType.objects.get_for_model(owner).pk, owner.pk)
+
+    @classmethod
+    def refresh_reference_lists(cls, pks):
+        """Store the reference list of each of the given original texts"""
+        texts = cls.objects.filter(pk__in=pks).prefetch_related(
+            models.Prefetch("references", queryset=Reference.objects.order_by("pk"))
+        )
+        changed = []
+        for text in texts:
+            references_display = text.build_reference_list()
+            if text.references_display != references_display:
+                text.references_display = references_display
+                changed.append(text)
+        cls.objects.bulk_update(changed, ["references_display"])
+        return {text.pk: text.references_display for text in texts}
 
     def remove_reference_order_padding(self):
         # Remove leading 0s so we display the user-friendly version
@@ -116,15 +222,51 @@ class OriginalText(HistoryModelMixin, BaseModel):
 
     def __str__(self):
         # one-indexed position of this wrt all the others (or pk as fallback)
-        try:
-            display_value = 1 + list(
-                self.owner.original_texts.values_list("pk", flat=True)
-            ).index(self.pk)
-        except ValueError:
+        if self.owner_index is None:
             display_value = self.pk
+        else:
+            display_value = 1 + self.owner_index
         return "Original Text %d" % display_value
 
 
+@disable_for_loaddata
+def handle_saved_original_text(sender, instance, created, **kwargs):
+    changed = instance.changed_fields()
+    if not created and not changed:
+        return
+    owner = (instance.content_type_id, instance.object_id)
+    OriginalText.reindex_owner(*owner, instance=instance)
+    # texts moved from another owner leave a gap there
+    previous_owner = (
+        changed.get("content_type_id", owner[0]),
+        changed.get("object_id", owner[1]),
+    )
+    if not created and previous_owner != owner and None not in previous_owner:
+        OriginalText.reindex_owner(*previous_owner)
+
+
+@disable_for_loaddata
+def handle_deleted_original_text(sender, instance, **kwargs):
+    OriginalText.reindex_owner(instance.content_type_id, instance.object_id)
+
+
+@disable_for_loaddata
+def handle_changed_reference(sender, instance, **kwargs):
+    reference_lists = OriginalText.refresh_reference_lists([instance.original_text_id])
+    # keep any copy of the original text held by the reference up to date
+    if Reference.original_text.is_cached(instance):
+        original_text = instance.original_text
+        original_text.references_display = reference_lists.get(
+            original_text.pk, original_text.references_display
+        )
+
+
+post_save.connect(handle_saved_original_text, sender=OriginalText)
+post_delete.connect(handle_deleted_original_text, sender=OriginalText)
+post_save.connect(handle_changed_reference, sender=Reference)
+post_delete.connect(handle_changed_reference, sender=Reference)
+
+
 class Concordance(HistoryModelMixin, BaseModel):
     # this stays until we have transitioned all existing concordances to the new format
     # likely there should be 0 at this point
@@ -179,9 +321,19 @@ class Translation(HistoryModelMixin, BaseModel):
     def __str__(self):
         # one-indexed position of this or pk
         try:
-            display_value = 1 + list(
-                self.original_text.translation_set.values_list("pk", flat=True)
-            ).index(self.pk)
+            display_value = 1 + [
+                translation.pk
+                for translation in self.original_text.translation_set.all()
+            ].index(self.pk)
         except ValueError:
             display_value = self.pk
         return "Translation %d" % display_value
+
+    @classmethod
+    def prefetch_history_titles(cls, queryset):
+        return queryset.select_related("original_text").prefetch_related(
+            models.Prefetch(
+                "original_text__translation_set",
+                queryset=Translation.objects.only("pk", "original_text"),
+            )
+        )
@@ -6,13 +6,14 @@ from rard.research.models.mixins import HistoryModelMixin
 from rard.utils.shared_functions import organise_links
 from rard.utils.text_processors import make_plain_text
 
-from .base import HistoricalBaseModel, TestimoniumLink
+from .base import DisplayNameModel, HistoricalBaseModel, TestimoniumLink
 
 
-class Testimonium(HistoryModelMixin, HistoricalBaseModel):
+class Testimonium(HistoryModelMixin, DisplayNameModel, HistoricalBaseModel):
     history = HistoricalRecords(
         excluded_fields=[
             "original_texts",
+            *DisplayNameModel.display_name_fields,
         ]
     )
 
@@ -21,6 +22,8 @@ class Testimonium(HistoryModelMixin, HistoricalBaseModel):
 
     LINK_TYPE = TestimoniumLink
 
+    link_names_ordering = ("-work__unknown", "work", "antiquarian", "order")
+
     original_texts = GenericRelation("OriginalText", related_query_name="testimonia")
 
     def definite_book_links(self):
@@ -71,24 +74,6 @@ class Testimonium(HistoryModelMixin, HistoricalBaseModel):
     def get_all_names(self):
         return [link.get_display_name() for link in self.get_all_links()]
 
-    def get_link_names(self, show_certainty=True):
-        links = self.get_all_links().order_by(
-            "-work__unknown", "work", "antiquarian", "order"
-        )
-        names = []
-        for link in links:
-            if link.work and not link.work.unknown:
-                name = "%s [= %s]" % (
-                    link.get_work_display_name(),
-                    link.get_display_name(),
-                )
-            else:
-                name = "%s" % link.get_display_name()
-            if show_certainty and not link.definite:
-                name += " (possible)"
-            names.append(name)
-        return names
-
     def get_all_work_names(self):
         # all the names wrt works
         return [link.get_work_display_name() for link in self.get_all_links()]
@@ -109,12 +94,9 @@ class Testimonium(HistoryModelMixin, HistoricalBaseModel):
         return organise_links(self)
 
     def save(self, *args, **kwargs):
-        if self.commentary:
+        if self.text_object_field_changed("commentary"):
             self.plain_commentary = make_plain_text(self.commentary.content)
         super().save(*args, **kwargs)
 
-    def __str__(self):
-        return self.get_display_name_option_c()
-
 
 Testimonium.init_text_object_fields()
@@ -1,6 +1,9 @@
-from django.contrib.contenttypes.fields import GenericRelation
+import threading
+
+from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
+from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import IntegrityError, models
+from django.db import IntegrityError, models, transaction
 from simple_history.models import HistoricalRecords
 
 from rard.research.models.mixins import HistoryModelMixin
@@ -8,7 +11,7 @@ from rard.utils.basemodel import BaseModel, DynamicTextField
 
 
 class TextObjectField(HistoryModelMixin, BaseModel):
-    history = HistoricalRecords()
+    history = HistoricalRecords(excluded_fields=["owner_content_type", "owner_id"])
 
     def related_lock_object(self):
         return self.get_related_object()
@@ -17,6 +20,16 @@ class TextObjectField(HistoryModelMixin, BaseModel):
     # audit trail to be held
     content = DynamicTextField(default="", blank=True)
 
+    tracked_fields = ("content",)
+
+    # the object this is the introduction or commentary of, so that it can be
+    # found without trying each of the reverse relations in turn
+    owner_content_type = models.ForeignKey(
+        ContentType, null=True, default=None, blank=True, on_delete=models.CASCADE
+    )
+    owner_id = models.PositiveIntegerField(null=True, default=None, blank=True)
+    owner = GenericForeignKey("owner_content_type", "owner_id")
+
     comments = GenericRelation("Comment", related_query_name="text_fields")
 
     def get_history_title(self):
@@ -25,11 +38,29 @@ class TextObjectField(HistoryModelMixin, BaseModel):
             return "Introduction"
         return "Commentary"
 
+    @classmethod
+    def prefetch_history_titles(cls, queryset):
+        return queryset.prefetch_related("owner")
+
     def __str__(self):
         return self.content
 
     def get_related_object(self):
         # what model instance owns this text object field?
+        if self.owner_id is None:
+            return self.find_related_object()
+        owner = self.owner
+        if owner is not None and self.pk is not None:
+            # make sure the owner sees this copy of the text, e.g. so
+            # that saving it updates its plain text from our content
+            for field in owner.get_text_object_fields():
+                if getattr(owner, field.attname) == self.pk:
+                    field.set_cached_value(owner, self)
+        return owner
+
+    def find_related_object(self):
+        # for text object fields whose owner has not been stored, try each
+        # of the reverse relations and remember the owner if found
         related_fields = [
             f
             for f in self._meta.get_fields()
@@ -37,11 +68,30 @@ class TextObjectField(HistoryModelMixin, BaseModel):
         ]
         for field in related_fields:
             try:
-                return getattr(self, field.name)
+                obj = getattr(self, field.name)
             except ObjectDoesNotExist:
-                pass
+                continue
+            if self.pk is not None:
+                self.set_owner(obj)
+            return obj
         return None
 
+    def set_owner(self, obj):
+        """Store the owner without saving anything else"""
+        self.owner = obj
+        TextObjectField.objects.filter(pk=self.pk).update(
+            owner_content_type=self.owner_content_type, owner_id=self.owner_id
+        )
+
+    @classmethod
+    def get_related_objects(cls, text_objects):
+        """The owners of a queryset of text object fields, fetched in one
+        query per type of owner"""
+        return [
+            text_object.get_related_object()
+            for text_object in text_objects.prefetch_related("owner")
+        ]
+
     def update_mentions(self):
         # get the items currently mentioned in the TOF
         found_mention_items = self.get_fragment_testimonia_mentions()
@@ -71,12 +121,35 @@ class TextObjectField(HistoryModelMixin, BaseModel):
             self.update_mentions()
 
         # save the parent object so the plain intro/commentary is
-        # updated for search purposes.
-        obj = self.get_related_object()
-        if obj:
-            obj.save()
+        # updated for search purposes. A new text object is being created
+        # for its owner, which saves itself once its text objects are set
+        if not self._state.adding and "content" in self.changed_fields():
+            obj = self.get_related_object()
+            if obj:
+                obj.save()
         super().save(*args, **kwargs)
 
+    def update_content(self, content):
+        """Save new content, as edited in the inline editors, without saving
+        the owner: only its plain text copy of the content is updated. The
+        mentions and bibliography items linked from the content are brought
+        up to date when the transaction commits, once however many times the
+        content is saved in it."""
+        self.content = content
+        if "content" not in self.changed_fields():
+            return
+        with transaction.atomic():
+            owner = self.get_related_object()
+            # skip our own save() and its updates of the owner and links
+            super().save()
+            if owner is not None:
+                owner.update_plain_text(self)
+            mention_update_queue.schedule(self.pk)
+
+    def update_linked_mentions(self):
+        self.link_bibliography_mentions_in_content()
+        self.update_mentions()
+
     @property
     def fragment(self):
         from rard.research.models import Fragment
@@ -120,6 +193,28 @@ class TextObjectField(HistoryModelMixin, BaseModel):
         return related if isinstance(related, Book) else None
 
 
+class MentionUpdateQueue(threading.local):
+    """Text object fields whose linked mentions and bibliography items need
+    updating once the current transaction commits. Each is updated once,
+    from its latest content, however many times it was scheduled."""
+
+    def __init__(self):
+        self.pending = set()
+
+    def schedule(self, pk):
+        self.pending.add(pk)
+        # later callbacks find nothing left to do
+        transaction.on_commit(self.flush)
+
+    def flush(self):
+        pks, self.pending = self.pending, set()
+        for text_object in TextObjectField.objects.filter(pk__in=pks):
+            text_object.update_linked_mentions()
+
+
+mention_update_queue = MentionUpdateQueue()
+
+
 class PublicCommentaryMentions(models.Model):
     content = DynamicTextField(default="", blank=True)
     approved = models.BooleanField(default=False)
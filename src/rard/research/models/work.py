@@ -2,7 +2,6 @@ from itertools import chain, groupby
 
 from django.contrib.postgres.aggregates import StringAgg
 from django.db import models
-from django.db.models import F
 from django.db.models.signals import post_delete, post_save
 from django.urls import reverse
 from django.utils.text import slugify
@@ -16,6 +15,7 @@ from rard.research.models.base import (
 from rard.research.models.mixins import HistoryModelMixin, TextObjectFieldMixin
 from rard.utils.basemodel import BaseModel, DatedModel, LockableModel, OrderableModel
 from rard.utils.decorators import disable_for_loaddata
+from rard.utils.reorder import reindex_queue, reorder_queryset
 from rard.utils.shared_functions import collate_ub_links
 from rard.utils.text_processors import make_plain_text
 
@@ -61,6 +61,8 @@ class Work(
     )
     plain_introduction = models.TextField(blank=False, default="")
 
+    tracked_fields = ("name", "introduction_id")
+
     @property
     def unknown_book(self):
         return self.book_set.filter(unknown=True).first()
@@ -74,8 +76,12 @@ class Work(
         author_str = ", ".join([a.name for a in self.antiquarian_set.all()])
         return "{}: {}".format(author_str or "Anonymous", self.name)
 
+    @classmethod
+    def prefetch_history_titles(cls, queryset):
+        return queryset.prefetch_related("antiquarian_set")
+
     def save(self, *args, **kwargs):
-        if self.introduction:
+        if self.text_object_field_changed("introduction"):
             self.plain_introduction = make_plain_text(self.introduction.content)
         super().save(*args, **kwargs)
 
@@ -125,70 +131,53 @@ class Work(
         ).distinct()
 
     def get_ordered_materials(self):
-        from rard.research.models import AnonymousFragment, Fragment, Testimonium
-        from rard.research.models.base import (
-            AppositumFragmentLink,
-            FragmentLink,
-            TestimoniumLink,
-        )
+        """Return the fragments, testimonia and apposita linked to this work
+        grouped by book, in the structure used by ordered_book_area.html:
+
+            {book: {material_type: {link: {"linked": ..., ...}}}}
+
+        The links of each type are loaded in one query along with their
+        books, antiquarians and linked objects, plus what is needed to
+        show the linked objects' names and citing works, so the number of
+        queries does not depend on the number of links."""
+        from rard.research.models import Fragment, Testimonium
 
-        fragment_links = list(
-            self.antiquarian_work_fragmentlinks.values(
-                "definite_antiquarian",
-                "definite_work",
-                "definite_book",
-                "book",
-                "order_in_book",
-                pk=F("fragment__pk"),
-                link_id=F("id"),
-            ).order_by("book", "order_in_book")
-        )
-        testimonium_links = list(
-            self.antiquarian_work_testimoniumlinks.values(
-                "definite_antiquarian",
-                "definite_work",
-                "definite_book",
-                "book",
-                "order_in_book",
-                pk=F("testimonium__pk"),
-                link_id=F("id"),
-            ).order_by("book", "order_in_book")
-        )
-        appositum_links = list(
-            self.antiquarian_work_appositumfragmentlinks.values(
-                "definite_antiquarian",
-                "definite_work",
-                "definite_book",
-                "book",
-                "order_in_book",
-                pk=F("anonymous_fragment__pk"),
-                link_id=F("id"),
-            ).order_by("book", "order_in_book")
-        )
         materials = {
-            "fragments": (fragment_links, Fragment, FragmentLink),
-            "testimonia": (testimonium_links, Testimonium, TestimoniumLink),
-            "apposita": (appositum_links, AnonymousFragment, AppositumFragmentLink),
+            "fragments": self.antiquarian_work_fragmentlinks.prefetch_related(
+                *Fragment.link_names_prefetch(prefix="fragment__"),
+            ),
+            "testimonia": self.antiquarian_work_testimoniumlinks.prefetch_related(
+                *Testimonium.link_names_prefetch(prefix="testimonium__"),
+            ),
+            "apposita": self.antiquarian_work_appositumfragmentlinks.all(),
         }
 
         books = self.book_set.all()  # Unknown should be last by default
+        books_by_pk = {book.pk: book for book in books}
 
         ordered_materials = {book: {} for book in books}
 
-        for material_type, (query_list, model, link_model) in materials.items():
-            for book_id, links in groupby(query_list, lambda x: x["book"]):
-                book = books.get(id=book_id)
-                content = ordered_materials[book]
+        for material_type, links in materials.items():
+            linked_field = links.model.linked_field
+            links = (
+                links.select_related("book", "antiquarian", linked_field)
+                .prefetch_related(
+                    "%s__original_texts__citing_work__author" % linked_field
+                )
+                .order_by("book_id", "order_in_book", "pk")
+            )
+            for book_id, book_links in groupby(links, lambda link: link.book_id):
+                content = ordered_materials[books_by_pk[book_id]]
 
                 content[material_type] = {
-                    link_model.objects.get(id=link["link_id"]): {
-                        "linked": model.objects.get(id=link["pk"]),
-                        "definite_antiquarian": link["definite_antiquarian"],
-                        "definite_work": link["definite_work"],
-                        "definite_book": link["definite_book"],
-                        "order": link["order_in_book"],
+                    link: {
+                        "linked": link.linked,
+                        "definite_antiquarian": link.definite_antiquarian,
+                        "definite_work": link.definite_work,
+                        "definite_book": link.definite_book,
+                        "order": link.order_in_book,
                     }
-                    for link in links
+                    for link in book_links
                 }
         return ordered_materials
 
@@ -201,28 +190,32 @@ class Work(
 
         from django.db import transaction
 
-        with transaction.atomic():
-            to_reorder = [
-                FragmentLink.objects.filter(work=self).order_by(
-                    "book__unknown", "book__order", "order_in_book"
-                ),
-                TestimoniumLink.objects.filter(work=self).order_by(
-                    "book__unknown", "book__order", "order_in_book"
-                ),
-                AppositumFragmentLink.objects.filter(work=self).order_by(
-                    "book__unknown", "book__order", "order_in_book"
-                ),
-            ]
-
-            for qs in to_reorder:
-                for count, link in enumerate(qs):
-                    if link.work_order != count:
-                        link.work_order = count
-                        link.save()
-
-        # There should only ever be one antiquarian, but no harm in covering all eventualities
-        for antiquarian in self.antiquarian_set.all():
-            antiquarian.reindex_fragment_and_testimonium_links()
+        with transaction.atomic(), reindex_queue.batch():
+            for link_model in (FragmentLink, TestimoniumLink, AppositumFragmentLink):
+                reorder_queryset(
+                    link_model.objects.filter(work=self),
+                    "work_order",
+                    ["book__unknown", "book__order", "order_in_book"],
+                )
+            self.schedule_display_names()
+
+            # There should only ever be one antiquarian, but no harm in covering all eventualities
+            for antiquarian in self.antiquarian_set.all():
+                antiquarian.schedule_reindex()
+
+    def schedule_reindex(self):
+        """Request reindex_related_links, coalesced with any other requests
+        in the current batch of changes"""
+        reindex_queue.schedule("work", self.pk, self.reindex_related_links)
+
+    def schedule_display_names(self):
+        """Request a refresh of the stored display names of everything
+        linked to this work"""
+        for links in (
+            self.antiquarian_work_fragmentlinks.all(),
+            self.antiquarian_work_testimoniumlinks.all(),
+        ):
+            links.model.schedule_display_names_for(links)
 
 
 class Book(
@@ -251,6 +244,12 @@ class Book(
     )
     plain_introduction = models.TextField(blank=False, default="")
 
+    tracked_fields = OrderableModel.tracked_fields + (
+        "work_id",
+        "unknown",
+        "introduction_id",
+    )
+
     def __str__(self):
         if self.subtitle and self.number:
             return "Book {}: {}".format(self.number, self.subtitle)
@@ -272,26 +271,24 @@ class Book(
         return slugify(self.__str__())
 
     def save(self, *args, **kwargs):
-        if self.introduction:
+        if self.text_object_field_changed("introduction"):
             self.plain_introduction = make_plain_text(self.introduction.content)
         super().save(*args, **kwargs)
 
     def reindex_related_links(self):
         """Following a change, ensure all links to this book have a distinct
         zero-indexed order in this book."""
-        to_reorder = [
-            self.antiquarian_book_fragmentlinks.all().order_by("order_in_book"),
-            self.antiquarian_book_testimoniumlinks.all().order_by("order_in_book"),
-            self.antiquarian_book_appositumfragmentlinks.all().order_by(
-                "order_in_book"
-            ),
-        ]
+        for qs in (
+            self.antiquarian_book_fragmentlinks.all(),
+            self.antiquarian_book_testimoniumlinks.all(),
+            self.antiquarian_book_appositumfragmentlinks.all(),
+        ):
+            reorder_queryset(qs, "order_in_book", ["order_in_book"])
 
-        for qs in to_reorder:
-            for count, link in enumerate(qs):
-                if link.order_in_book != count:
-                    link.order_in_book = count
-                    link.save()
+    def schedule_reindex(self):
+        """Request reindex_related_links, coalesced with any other requests
+        in the current batch of changes"""
+        reindex_queue.schedule("book", self.pk, self.reindex_related_links)
 
 
 @disable_for_loaddata
@@ -318,9 +315,11 @@ def create_unknown_book(sender, instance, **kwargs):
 
 
 @disable_for_loaddata
-def handle_reordered_books(sender, instance, **kwargs):
-    # reindex links for antiquarian
-    instance.work.reindex_related_links()
+def handle_reordered_books(sender, instance, created, **kwargs):
+    # reindex links for antiquarian, unless only e.g. the subtitle changed
+    changed = instance.changed_fields()
+    if created or {"order", "work_id", "unknown"} & changed.keys():
+        instance.work.schedule_reindex()
 
 
 @disable_for_loaddata
@@ -335,21 +334,30 @@ def handle_deleted_book(sender, instance, **kwargs):
     if not instance.unknown:
         work = instance.work
         if work.unknown_book:
-            related_links = chain(
-                work.antiquarian_work_fragmentlinks.all(),
-                work.antiquarian_work_testimoniumlinks.all(),
-                work.antiquarian_work_appositumfragmentlinks.all(),
-            )
-            for link in related_links:
-                if link.book is None:
-                    link.book = link.work.unknown_book
-                    link.save()
+            with reindex_queue.batch():
+                related_links = chain(
+                    work.antiquarian_work_fragmentlinks.all(),
+                    work.antiquarian_work_testimoniumlinks.all(),
+                    work.antiquarian_work_appositumfragmentlinks.all(),
+                )
+                for link in related_links:
+                    if link.book is None:
+                        link.book = link.work.unknown_book
+                        link.save()
+
+                work.unknown_book.schedule_reindex()
+                work.schedule_reindex()
 
-            work.unknown_book.reindex_related_links()
-            work.reindex_related_links()
+
+@disable_for_loaddata
+def handle_saved_work(sender, instance, created, **kwargs):
+    # the work's name is part of the display names of its material
+    if not created and "name" in instance.changed_fields():
+        instance.schedule_display_names()
 
 
 post_save.connect(create_unknown_book, sender=Work)
+post_save.connect(handle_saved_work, sender=Work)
 Work.init_text_object_fields()
 Book.init_text_object_fields()
 post_save.connect(handle_reordered_books, sender=Book)
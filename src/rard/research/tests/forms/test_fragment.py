@@ -39,6 +39,35 @@ class TestFragmentCommentaryForm(TestCase):
         refetch = Fragment.objects.get(pk=fragment.pk)
         self.assertEqual(refetch.commentary.content, data["commentary_text"])
 
+    def test_commentary_save_only_updates_plain_text_of_fragment(self):
+        fragment = Fragment.objects.create(name="fragment")
+        history_count = fragment.history.count()
+
+        data = {"commentary_text": "<p>Something interesting</p>"}
+        form = FragmentCommentaryForm(instance=fragment, data=data)
+        self.assertTrue(form.is_valid())
+        form.save()
+
+        refetch = Fragment.objects.get(pk=fragment.pk)
+        self.assertEqual(refetch.plain_commentary, "Something interesting")
+        self.assertEqual(refetch.history.count(), history_count)
+
+    def test_commentary_mentions_updated_on_commit(self):
+        fragment = Fragment.objects.create(name="fragment")
+        mentioned = Fragment.objects.create(name="mentioned")
+        data = {
+            "commentary_text": (
+                f"<span class='mention' data-id='{mentioned.pk}' "
+                "data-target='fragment'>mention</span>"
+            )
+        }
+        form = FragmentCommentaryForm(instance=fragment, data=data)
+        self.assertTrue(form.is_valid())
+        with self.captureOnCommitCallbacks(execute=True):
+            form.save()
+            self.assertFalse(mentioned.mentioned_in.exists())
+        self.assertEqual(list(mentioned.mentioned_in.all()), [fragment.commentary])
+
 
 class TestFragmentPublicCommentaryForm(TestCase):
     def test_public_commentary_initial_value_update(self):
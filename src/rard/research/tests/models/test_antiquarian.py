@@ -1,6 +1,8 @@
 import pytest
+from django.db import connection
 from django.db.utils import IntegrityError
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rard.research.models import (
@@ -245,6 +247,44 @@ class TestAntiquarian(TestCase):
         self.assertEqual(a.fragmentlinks.all().count(), 1)
         self.assertEqual(a.fragmentlinks.first().work, a.unknown_work)
 
+    def test_reindex_fragment_links_set_based(self):
+        a = Antiquarian.objects.create(name="John Smith", re_code="smitre001")
+        first = Work.objects.create(name="first")
+        second = Work.objects.create(name="second")
+        a.works.add(first)
+        a.works.add(second)
+        for work in (second, first, second):
+            FragmentLink.objects.create(
+                antiquarian=a, fragment=Fragment.objects.create(), work=work
+            )
+        # scramble the order then reindex
+        a.fragmentlinks.update(order=99)
+        small_count = len(list(a.fragmentlinks.all()))
+        a.reindex_fragment_and_testimonium_links()
+        links = a.fragmentlinks.order_by("order")
+        self.assertEqual([link.order for link in links], [0, 1, 2])
+        self.assertEqual([link.work for link in links], [first, second, second])
+
+        # the number of queries does not depend on the number of links
+        for _ in range(5):
+            FragmentLink.objects.create(
+                antiquarian=a, fragment=Fragment.objects.create(), work=second
+            )
+        with CaptureQueriesContext(connection) as small:
+            Antiquarian.objects.get(pk=a.pk).reindex_fragment_and_testimonium_links()
+        for _ in range(5):
+            FragmentLink.objects.create(
+                antiquarian=a, fragment=Fragment.objects.create(), work=first
+            )
+        with CaptureQueriesContext(connection) as large:
+            Antiquarian.objects.get(pk=a.pk).reindex_fragment_and_testimonium_links()
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        self.assertGreater(a.fragmentlinks.count(), small_count)
+        self.assertEqual(
+            list(a.fragmentlinks.order_by("order").values_list("order", flat=True)),
+            list(range(a.fragmentlinks.count())),
+        )
+
 
 class TestWorkLink(TestCase):
     def test_related_queryset(self):
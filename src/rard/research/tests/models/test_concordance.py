@@ -8,6 +8,7 @@ from rard.research.models import (
     Fragment,
     OriginalText,
     PartIdentifier,
+    Work,
 )
 from rard.research.models.base import FragmentLink
 
@@ -38,6 +39,28 @@ class TestConcordanceModel(TestCase):
         for key, val in data.items():
             self.assertEqual(getattr(concordance, key), val)
 
+    def test_is_template(self):
+        self.assertFalse(self.identifier.is_template)
+        template = PartIdentifier.objects.create(edition=self.edition, value="[1-10]")
+        self.assertTrue(template.is_template)
+        self.assertEqual(self.edition.get_part_format(), template)
+        self.assertEqual(str(template), "format for first_edition: [1-10]")
+
+    def test_ordered_by_concordance_order(self):
+        concordances = [
+            ConcordanceModel.objects.create(
+                **self.creation_data,
+                original_text=self.original_text,
+                concordance_order=concordance_order,
+            )
+            for concordance_order in ["130.10", "2", "130.3"]
+        ]
+        self.assertEqual(concordances[0].concordance_sort_key, [130, 10])
+        self.assertEqual(
+            list(ConcordanceModel.get_ordered_queryset(ConcordanceModel.objects.all())),
+            [concordances[1], concordances[2], concordances[0]],
+        )
+
     def test_concordance_identifiers(self):
         # test the names to go in the ConcordanceModel table including ordinals
         # set up a second original text
@@ -50,3 +73,26 @@ class TestConcordanceModel(TestCase):
             [x[0] for x in self.original_text.concordances.all()],
             concordances,
         )
+
+    def test_for_antiquarian_and_work(self):
+        antiquarian = Antiquarian.objects.create(name="name1", re_code="name1")
+        work = Work.objects.create(name="work")
+        antiquarian.works.add(work)
+        FragmentLink.objects.create(
+            fragment=self.fragment, antiquarian=antiquarian, work=work
+        )
+        concordance = ConcordanceModel.objects.create(
+            **self.creation_data, original_text=self.original_text
+        )
+        # a concordance for a fragment with no links
+        other_text = OriginalText.objects.create(
+            owner=Fragment.objects.create(name="other"), citing_work=self.citing_work
+        )
+        ConcordanceModel.objects.create(**self.creation_data, original_text=other_text)
+
+        self.assertEqual(
+            list(ConcordanceModel.objects.for_antiquarian(antiquarian)), [concordance]
+        )
+        self.assertEqual(list(ConcordanceModel.objects.for_work(work)), [concordance])
+        other = Antiquarian.objects.create(name="name2", re_code="name2")
+        self.assertFalse(ConcordanceModel.objects.for_antiquarian(other).exists())
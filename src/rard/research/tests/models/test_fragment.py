@@ -11,8 +11,10 @@ from rard.research.models import (
     OriginalText,
     TextObjectField,
     Topic,
+    Work,
 )
-from rard.research.models.base import AppositumFragmentLink
+from rard.research.models.base import AppositumFragmentLink, FragmentLink
+from rard.utils.reorder import reindex_queue
 
 pytestmark = pytest.mark.django_db
 
@@ -88,6 +90,76 @@ class TestFragment(TestCase):
         self.assertEqual(fragment.get_display_name(), str(fragment))
 
 
+class TestFragmentStoredDisplayNames(TestCase):
+    def setUp(self):
+        self.antiquarian = Antiquarian.objects.create(name="Aq", re_code="aq")
+        self.work = Work.objects.create(name="Work")
+        self.antiquarian.works.add(self.work)
+        self.fragment = Fragment.objects.create(name="name")
+
+    def assert_stored_names_current(self, fragment):
+        fragment.refresh_from_db()
+        self.assertEqual(fragment.display_name, fragment.get_display_name_option_b())
+        self.assertEqual(
+            fragment.short_display_name, fragment.get_display_name_option_c()
+        )
+
+    def test_unlinked_name_stored(self):
+        self.fragment.refresh_from_db()
+        self.assertEqual(self.fragment.display_name, "Unlinked %d" % self.fragment.pk)
+
+    def test_names_stored_when_linked(self):
+        FragmentLink.objects.create(
+            fragment=self.fragment, antiquarian=self.antiquarian, work=self.work
+        )
+        self.assert_stored_names_current(self.fragment)
+        self.assertEqual(str(self.fragment), self.fragment.short_display_name)
+
+    def test_names_follow_link_order(self):
+        other = Fragment.objects.create(name="other")
+        for fragment in (self.fragment, other):
+            FragmentLink.objects.create(
+                fragment=fragment, antiquarian=self.antiquarian, work=self.work
+            )
+        FragmentLink.objects.get(fragment=self.fragment).delete()
+        self.assert_stored_names_current(self.fragment)
+        self.assert_stored_names_current(other)
+        self.assertIn("F1", other.display_name)
+
+    def test_names_follow_renamed_antiquarian_and_work(self):
+        FragmentLink.objects.create(
+            fragment=self.fragment, antiquarian=self.antiquarian, work=self.work
+        )
+        self.antiquarian.name = "Renamed"
+        self.antiquarian.save()
+        self.work.name = "Renamed work"
+        self.work.save()
+        self.assert_stored_names_current(self.fragment)
+        self.assertIn("Renamed work", self.fragment.display_name)
+
+    def test_save_keeps_stored_names(self):
+        stale = Fragment.objects.get(pk=self.fragment.pk)
+        FragmentLink.objects.create(
+            fragment=self.fragment, antiquarian=self.antiquarian, work=self.work
+        )
+        runs = reindex_queue.runs["display_name"]
+        stale.name = "renamed"
+        stale.save()
+        # the older names are not saved and nothing needs refreshing
+        self.assertEqual(reindex_queue.runs["display_name"], runs)
+        self.assert_stored_names_current(self.fragment)
+        self.assertEqual(Fragment.objects.get(pk=self.fragment.pk).name, "renamed")
+
+    def test_str_reads_stored_name(self):
+        FragmentLink.objects.create(
+            fragment=self.fragment, antiquarian=self.antiquarian, work=self.work
+        )
+        fragment = Fragment.objects.get(pk=self.fragment.pk)
+        with self.assertNumQueries(0):
+            str(fragment)
+            fragment.get_display_name()
+
+
 class TestAnonymousFragment(TestCase):
     @classmethod
     def setUpTestData(cls):
@@ -226,6 +298,33 @@ class TestAnonymousFragment(TestCase):
         self.anon2.refresh_from_db()
         self.assertLess(self.anon2.order, self.anon1.order)
 
+    def test_reindex_anonymous_fragments_on_topic_move(self):
+        t3 = Topic.objects.create(name="Religion")
+        anon4 = AnonymousFragment.objects.create(name="anon4")
+        anon4.topics.add(t3)
+        history_count = AnonymousFragment.history.count()
+
+        t3.move_to(0)
+        # anon3 is an apposita so comes first within its topic
+        self.assertEqual(
+            [a.name for a in AnonymousFragment.objects.all()],
+            ["anon4", "anon3", "anon1", "anon2"],
+        )
+        self.assertEqual(
+            [a.order for a in AnonymousFragment.objects.all()], [0, 1, 2, 3]
+        )
+        # the fragments are renumbered without being saved
+        self.assertEqual(AnonymousFragment.history.count(), history_count)
+
+    def test_topic_save_without_reorder_does_not_reindex(self):
+        # mess up the order so we can tell if a reindex happens
+        AnonymousFragment.objects.update(order=99)
+        self.t1.name = "Kingship"
+        self.t1.save()
+        self.assertEqual(
+            set(AnonymousFragment.objects.values_list("order", flat=True)), {99}
+        )
+
     def test_anonymous_apposita_asymmetry(self):
         """When we make one anonymous fragment an apposita of another,
         it should not be a symmetric relationship"""
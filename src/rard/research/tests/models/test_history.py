@@ -0,0 +1,241 @@
+from io import StringIO
+
+import pytest
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from rard.research.models import (
+    Antiquarian,
+    CitingAuthor,
+    CitingWork,
+    Fragment,
+    HistoricalRecordLog,
+    OriginalText,
+    TextObjectField,
+    Translation,
+    Work,
+)
+from rard.research.models.history import compactable_history_ids, diff_words
+from rard.users.tests.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class TestDiffWords(TestCase):
+    def test_changed_words(self):
+        diff = diff_words("the quick brown fox", "the slow brown fox")
+        self.assertEqual(diff, "the <del>quick</del> <ins>slow</ins> brown fox")
+
+    def test_html_and_escaping(self):
+        diff = diff_words("<p>a &lt; b</p>", "<p>a &lt; <b>c</b></p>")
+        self.assertEqual(diff, "a &lt; <del>b</del> <ins>c</ins>")
+
+    def test_long_unchanged_text_shortened(self):
+        words = ["word%d" % i for i in range(100)]
+        diff = diff_words(" ".join(words), " ".join(words + ["new"]), context=3)
+        self.assertEqual(diff, "… word97 word98 word99 <ins>new</ins>")
+
+    def test_formatting_only(self):
+        self.assertEqual(
+            diff_words("<p>text</p>", "<p><b>text</b></p>"),
+            "<em>No changes to the text</em>",
+        )
+
+
+class TestHistoricalRecordLog(TestCase):
+    def setUp(self):
+        self.antiquarian = Antiquarian.objects.create(name="before", re_code="code001")
+        self.antiquarian.name = "after"
+        self.antiquarian.save()
+        self.history_item = self.antiquarian.history.first()
+        self.log = HistoricalRecordLog.objects.get(
+            content_type=ContentType.objects.get_for_model(self.history_item),
+            object_id=self.history_item.pk,
+        )
+
+    def test_diff_stored_when_logged(self):
+        self.assertIn("<em>Field: name</em>", self.log.diff)
+        self.assertIn("<del>before</del> <ins>after</ins>", self.log.diff)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                HistoricalRecordLog.get_diff(self.history_item), self.log.diff
+            )
+
+    def test_missing_diff_not_stored_when_shown(self):
+        diff = self.log.diff
+        HistoricalRecordLog.objects.filter(pk=self.log.pk).update(diff=None)
+        self.assertEqual(HistoricalRecordLog.get_diff(self.history_item), diff)
+        self.log.refresh_from_db()
+        self.assertIsNone(self.log.diff)
+
+        self.assertEqual(HistoricalRecordLog.store_diffs(Antiquarian.history.model), 1)
+        self.log.refresh_from_db()
+        self.assertEqual(self.log.diff, diff)
+
+    def test_no_previous_record(self):
+        history_item = self.antiquarian.history.last()
+        self.assertEqual(HistoricalRecordLog.get_diff(history_item), "")
+
+    def test_diffs_stored_after_compaction(self):
+        self.antiquarian.name = "later"
+        self.antiquarian.save()
+        call_command("compact_history", "--keep=1", stdout=StringIO())
+        # the latest record is now diffed against the first
+        latest = self.antiquarian.history.first()
+        self.assertIn(
+            "<del>before</del> <ins>later</ins>",
+            HistoricalRecordLog.objects.get(
+                content_type=self.log.content_type, object_id=latest.pk
+            ).diff,
+        )
+
+
+class TestCompactableHistory(TestCase):
+    def setUp(self):
+        antiquarian = Antiquarian.objects.create(name="name", re_code="code001")
+        user = UserFactory.create()
+        # system saves, a user edit then more system saves
+        for name in ["s1", "s2", "s3", "u", "s4", "s5"]:
+            antiquarian.name = name
+            antiquarian._history_user = user if name == "u" else None
+            antiquarian.save()
+        self.historical_model = Antiquarian.history.model
+        self.ids = list(
+            antiquarian.history.order_by("history_date", "history_id").values_list(
+                "history_id", flat=True
+            )
+        )
+
+    def compactable(self, **kwargs):
+        return set(compactable_history_ids(self.historical_model, **kwargs))
+
+    def test_collapse_system(self):
+        # the creation record and the last of each run of system records
+        # are kept, as are user edits
+        s1, s2, _, _, s4, _ = self.ids[-6:]
+        self.assertEqual(
+            self.compactable(collapse_system=True),
+            set(self.ids[1:-6]) | {s1, s2, s4},
+        )
+
+    def test_keep(self):
+        self.assertEqual(self.compactable(keep=2), set(self.ids[1:-3]))
+        self.assertEqual(
+            self.compactable(keep=2, keep_user_edits=False), set(self.ids[1:-2])
+        )
+
+    def test_nothing_to_remove(self):
+        self.assertEqual(self.compactable(), set())
+
+
+class TestActivity(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.antiquarian = Antiquarian.objects.create(name="name", re_code="code001")
+        self.work = Work.objects.create(name="work")
+        self.antiquarian.works.add(self.work)
+        self.other = Antiquarian.objects.create(name="other", re_code="code002")
+        for obj in (self.antiquarian, self.work, self.other):
+            obj._history_user = self.user
+            obj.save()
+
+    def test_by_user(self):
+        logs = HistoricalRecordLog.activity(user=self.user)
+        self.assertEqual(
+            [log.title for log in logs],
+            [str(self.other), str(self.work), str(self.antiquarian)],
+        )
+        self.assertEqual(logs[0].url, self.other.history_url())
+
+    def test_keyset_pages(self):
+        logs = HistoricalRecordLog.activity(user=self.user, limit=2)
+        last = logs[-1]
+        next_logs = HistoricalRecordLog.activity(
+            user=self.user, before=(last.history_date, last.pk)
+        )
+        self.assertEqual([log.object for log in next_logs], [self.antiquarian])
+
+    def test_invalid_before_date_ignored(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("history:activity"),
+            {"before": "2020-13-45T00:00", "before_id": "1"},
+        )
+        self.assertEqual(response.status_code, 200)
+        # the first page, as if no date had been given
+        self.assertEqual(
+            [log.pk for log in response.context["logs"]],
+            [log.pk for log in HistoricalRecordLog.activity()],
+        )
+
+    def test_by_antiquarian(self):
+        objects = {
+            log.object
+            for log in HistoricalRecordLog.activity(antiquarian=self.antiquarian)
+        }
+        self.assertIn(self.antiquarian, objects)
+        self.assertIn(self.work, objects)
+        self.assertNotIn(self.other, objects)
+
+    def test_titles_resolved_in_bulk(self):
+        # several objects of each of a mix of models, all needing related
+        # objects for their titles
+        editor = UserFactory.create()
+        edited = []
+        fragment = Fragment.objects.create(name="fragment")
+        for count in range(3):
+            antiquarian = Antiquarian.objects.create(
+                name="author%d" % count, re_code="re%d" % count
+            )
+            work = Work.objects.create(name="work%d" % count)
+            antiquarian.works.add(work)
+            author = CitingAuthor.objects.create(name="citing%d" % count)
+            citing_work = CitingWork.objects.create(author=author, title="title")
+            original_text = OriginalText.objects.create(
+                owner=fragment, citing_work=citing_work, content="content"
+            )
+            translations = [
+                Translation.objects.create(
+                    original_text=original_text,
+                    translator_name="translator",
+                    translated_text="text",
+                )
+                for _ in range(2)
+            ]
+            edited += [work, citing_work, antiquarian.introduction] + translations
+        for obj in edited:
+            obj._history_user = editor
+            obj.save()
+
+        logs = list(HistoricalRecordLog.objects.filter(history_user=editor))
+        self.assertEqual(len(logs), len(edited))
+        HistoricalRecordLog.resolve_records(logs)  # cache the content types
+        # for each of the four models, the historical records and the
+        # objects, plus the works' antiquarians, the translations of the
+        # translations' original texts and the introductions' owners
+        with self.assertNumQueries(11):
+            HistoricalRecordLog.resolve_records(logs)
+        self.assertEqual(
+            {log.title for log in logs},
+            {str(obj) for obj in edited if not isinstance(obj, TextObjectField)}
+            | {"Introduction"},
+        )
+
+    def test_deleted_object(self):
+        pk = self.other.pk
+        self.other.delete()
+        # its introduction is deleted with it, so find the antiquarian's log
+        log = (
+            HistoricalRecordLog.objects.filter(
+                content_type=ContentType.objects.get_for_model(
+                    Antiquarian.history.model
+                )
+            )
+            .order_by("history_date", "pk")
+            .last()
+        )
+        HistoricalRecordLog.resolve_records([log])
+        self.assertIsNone(log.object)
+        self.assertEqual(log.title, "Antiquarian %d (deleted)" % pk)
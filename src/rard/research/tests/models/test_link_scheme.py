@@ -1,5 +1,8 @@
 import pytest
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
 from rard.research.models import (
     AnonymousFragment,
@@ -14,6 +17,8 @@ from rard.research.models.base import (
     FragmentLink,
     TestimoniumLink,
 )
+from rard.users.tests.factories import UserFactory
+from rard.utils.reorder import reindex_queue
 
 pytestmark = pytest.mark.django_db
 
@@ -1445,3 +1450,245 @@ class TestAppositaLinkScheme(TestCase):
         fls = list(FragmentLink.objects.filter(fragment=f, work=w))
         self.assertEqual(len(fls), 1)
         self.assertEqual(fls[0].book, w.unknown_book)
+
+
+class TestReindexQueue(TestCase):
+    def setUp(self):
+        self.antiquarian = Antiquarian.objects.create(name="aq1", re_code="aq1")
+        self.work = Work.objects.create(name="w1")
+        self.antiquarian.works.add(self.work)
+
+    def add_fragments(self, count):
+        for _ in range(count):
+            FragmentLink.objects.create(
+                fragment=Fragment.objects.create(),
+                antiquarian=self.antiquarian,
+                work=self.work,
+            )
+
+    def test_each_reindex_runs_once(self):
+        self.add_fragments(3)
+        reindex_queue.runs.clear()
+        link = self.antiquarian.fragmentlinks.order_by("order_in_book").last()
+        link.move_to_by_book(0)
+        self.assertEqual(reindex_queue.runs["antiquarian"], 1)
+        self.assertEqual(reindex_queue.runs["unattached"], 1)
+        link.refresh_from_db()
+        self.assertEqual(link.order, 0)
+
+    def test_runs_do_not_depend_on_number_of_links(self):
+        def runs_for_new_author():
+            a = Antiquarian.objects.create(name="aq", re_code="aq%d" % self.count)
+            self.count += 1
+            reindex_queue.runs.clear()
+            a.works.add(self.work)
+            runs = dict(reindex_queue.runs)
+            a.works.remove(self.work)
+            return runs
+
+        self.count = 2
+        self.add_fragments(2)
+        few = runs_for_new_author()
+        self.add_fragments(10)
+        many = runs_for_new_author()
+        self.assertEqual(few, many)
+        self.assertEqual(many["work"], 1)
+
+    def test_batch_defers_until_exit(self):
+        calls = []
+        with reindex_queue.batch():
+            for _ in range(3):
+                reindex_queue.schedule("work", 1, lambda: calls.append("work"))
+            reindex_queue.schedule("book", 1, lambda: calls.append("book"))
+            self.assertEqual(calls, [])
+        # run once each, books before works
+        self.assertEqual(calls, ["book", "work"])
+
+    def test_batch_discarded_on_error(self):
+        calls = []
+        with self.assertRaises(ValueError):
+            with reindex_queue.batch():
+                reindex_queue.schedule("work", 1, lambda: calls.append("work"))
+                raise ValueError
+        self.assertEqual(calls, [])
+        self.assertEqual(reindex_queue.pending, {})
+
+    def test_batch_coalesces_separate_saves(self):
+        self.add_fragments(3)
+        links = list(self.antiquarian.fragmentlinks.order_by("order_in_book"))
+        reindex_queue.runs.clear()
+        with reindex_queue.batch():
+            links[2].move_to_by_book(0)
+            links[2].move_to_by_book(1)
+        self.assertEqual(reindex_queue.runs["antiquarian"], 1)
+        links[2].refresh_from_db()
+        self.assertEqual(links[2].order_in_book, 1)
+
+    def test_reindexes_run_after_rolled_back_savepoint(self):
+        calls = []
+        with transaction.atomic():
+            try:
+                with transaction.atomic(), reindex_queue.batch():
+                    reindex_queue.schedule("work", 1, lambda: calls.append(1))
+                    raise ValueError
+            except ValueError:
+                pass
+            reindex_queue.schedule("work", 2, lambda: calls.append(2))
+        self.assertEqual(calls, [2])
+
+    def test_request_renders_reindexed_order(self):
+        self.add_fragments(3)
+        link = self.antiquarian.fragmentlinks.order_by("order_in_book").last()
+        self.client.force_login(UserFactory.create())
+        reindex_queue.runs.clear()
+        response = self.client.post(
+            reverse("move_link"),
+            {
+                "link_id": link.pk,
+                "object_type": "fragment",
+                "move_to_by_book": 0,
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(reindex_queue.runs["antiquarian"], 1)
+        link.refresh_from_db()
+        self.assertEqual((link.order_in_book, link.order), (0, 0))
+        # the partial shows the link first, as reindexed
+        html = response.json()["html"]
+        self.assertLess(
+            html.index(link.get_work_display_name()),
+            html.index(
+                FragmentLink.objects.get(order_in_book=1).get_work_display_name()
+            ),
+        )
+
+
+class TestUnattachedLinkReindex(TestCase):
+    def setUp(self):
+        self.antiquarian = Antiquarian.objects.create(name="aq1", re_code="aq1")
+        self.work = Work.objects.create(name="w1")
+        self.other_work = Work.objects.create(name="w2")
+        self.antiquarian.works.add(self.work)
+        self.antiquarian.works.add(self.other_work)
+        self.add_fragments(self.work, 2)
+        self.add_fragments(self.other_work, 3)
+        self.antiquarian.works.remove(self.work)
+        self.antiquarian.works.remove(self.other_work)
+
+    def add_fragments(self, work, count):
+        for _ in range(count):
+            FragmentLink.objects.create(
+                fragment=Fragment.objects.create(),
+                antiquarian=self.antiquarian,
+                work=work,
+            )
+
+    def unattached(self):
+        return FragmentLink.objects.filter(antiquarian=None).order_by("order")
+
+    def test_unattached_links_ordered_globally(self):
+        # the works have no worklinks so their links are sorted by work order
+        self.assertEqual(
+            list(self.unattached().values_list("order", "work_order")),
+            [(0, 0), (1, 0), (2, 1), (3, 1), (4, 2)],
+        )
+
+    def test_reindex_does_not_touch_earlier_links(self):
+        unattached = FragmentLink.objects.filter(antiquarian=None)
+        unattached.filter(work_order=0).update(order=99)
+        unattached.filter(work_order__gt=0).update(order=50)
+        Antiquarian.reindex_null_fragment_and_testimonium_links(self.work, since=1)
+        self.assertEqual(
+            sorted(unattached.values_list("order", flat=True)), [2, 3, 4, 99, 99]
+        )
+
+    def test_move_reindexes_from_first_moved(self):
+        unattached = FragmentLink.objects.filter(antiquarian=None)
+        with reindex_queue.batch():
+            Antiquarian.schedule_null_reindex(self.work, since=2)
+            Antiquarian.schedule_null_reindex(self.work, since=1)
+            unattached.filter(work_order=0).update(order=99)
+            unattached.filter(work_order__gt=0).update(order=50)
+        self.assertEqual(
+            sorted(unattached.values_list("order", flat=True)), [2, 3, 4, 99, 99]
+        )
+
+    def test_later_links_renumbered_when_count_changes(self):
+        self.unattached().first().delete()
+        self.assertEqual(
+            list(self.unattached().values_list("order", flat=True)), list(range(4))
+        )
+
+
+class TestBulkLinkPropagation(TestCase):
+    def setUp(self):
+        self.antiquarian = Antiquarian.objects.create(name="aq1", re_code="aq1")
+        self.work = Work.objects.create(name="w1")
+        self.antiquarian.works.add(self.work)
+        self.count = 0
+
+    def add_fragments(self, count):
+        # each fragment has an appositum
+        fragments = [Fragment.objects.create() for _ in range(count)]
+        links = FragmentLink.bulk_create_links(
+            [
+                FragmentLink(
+                    fragment=fragment, antiquarian=self.antiquarian, work=self.work
+                )
+                for fragment in fragments
+            ]
+        )
+        Fragment.apposita.through.objects.bulk_create(
+            [
+                Fragment.apposita.through(
+                    fragment=fragment,
+                    anonymousfragment=AnonymousFragment.objects.create(),
+                )
+                for fragment in fragments
+            ]
+        )
+        AppositumFragmentLink.bulk_ensure_apposita_links(links)
+
+    def add_author(self):
+        self.count += 1
+        antiquarian = Antiquarian.objects.create(
+            name="aq", re_code="new%d" % self.count
+        )
+        with CaptureQueriesContext(connection) as context:
+            antiquarian.works.add(self.work)
+        return antiquarian, len(context.captured_queries)
+
+    def test_links_copied_to_new_author(self):
+        self.add_fragments(3)
+        antiquarian, _ = self.add_author()
+        links = antiquarian.fragmentlinks.order_by("order")
+        self.assertEqual(
+            [link.fragment for link in links],
+            [
+                link.fragment
+                for link in self.antiquarian.fragmentlinks.order_by("order")
+            ],
+        )
+        self.assertEqual([link.order for link in links], [0, 1, 2])
+        self.assertTrue(all(link.book == self.work.unknown_book for link in links))
+        # each new fragment link brings its appositum link
+        for link in links:
+            self.assertEqual(
+                AppositumFragmentLink.objects.filter(
+                    antiquarian=antiquarian, link_object=link
+                ).count(),
+                1,
+            )
+        self.assertEqual(
+            AppositumFragmentLink.objects.filter(antiquarian=antiquarian).count(), 3
+        )
+
+    def test_add_author_queries_do_not_depend_on_number_of_links(self):
+        # benchmark adding an author to a work of several hundred fragments
+        self.add_fragments(5)
+        antiquarian, few = self.add_author()
+        antiquarian.works.remove(self.work)
+        self.add_fragments(295)
+        antiquarian, many = self.add_author()
+        self.assertEqual(few, many)
+        self.assertEqual(antiquarian.fragmentlinks.count(), 300)
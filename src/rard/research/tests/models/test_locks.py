@@ -1,4 +1,5 @@
 from datetime import timedelta
+from unittest.mock import patch
 
 import pytest
 from django.core import mail
@@ -7,6 +8,7 @@ from django.utils import timezone
 
 from rard.research.models import Antiquarian
 from rard.users.tests.factories import UserFactory
+from rard.utils.basemodel import ObjectLock, OutboxEmail
 
 pytestmark = pytest.mark.django_db
 
@@ -24,12 +26,62 @@ class TestLocks(TestCase):
         self.antiquarian.lock(self.user)
         self.assertTrue(self.antiquarian.is_locked())
 
+    def test_lock_only_once(self):
+        self.assertTrue(self.antiquarian.lock(self.user))
+        # a second attempt, e.g. from another copy of the object, fails
+        other_user = UserFactory.create()
+        antiquarian = Antiquarian.objects.get(pk=self.antiquarian.pk)
+        self.assertFalse(antiquarian.lock(other_user))
+        self.assertEqual(antiquarian.locked_by, self.user)
+        self.assertEqual(self.antiquarian.object_locks.count(), 1)
+
+    def test_lock_replaces_expired_lock(self):
+        when = timezone.now() - timedelta(days=1)
+        self.antiquarian.lock(self.user, lock_until=when)
+        requester = UserFactory.create()
+        self.antiquarian.get_lock_record().objectlockrequest_set.create(
+            from_user=requester
+        )
+        other_user = UserFactory.create()
+        antiquarian = Antiquarian.objects.get(pk=self.antiquarian.pk)
+        self.assertTrue(antiquarian.lock(other_user))
+        self.assertEqual(antiquarian.locked_by, other_user)
+        # whoever requested the item is told it became available
+        OutboxEmail.send_pending()
+        self.assertEqual([email.to for email in mail.outbox], [[requester.email]])
+
     def test_unlock(self):
         self.antiquarian.lock(self.user)
         self.antiquarian.unlock()
         self.assertFalse(self.antiquarian.is_locked())
         self.assertIsNone(self.antiquarian.locked_at)
 
+    def test_lock_state_cached(self):
+        self.antiquarian.lock(self.user)
+        antiquarian = Antiquarian.objects.get(pk=self.antiquarian.pk)
+        # the lock and its user are fetched once for all the lock properties
+        with self.assertNumQueries(1):
+            self.assertTrue(antiquarian.is_locked())
+            self.assertEqual(antiquarian.locked_by, self.user)
+            self.assertIsNotNone(antiquarian.locked_at)
+            self.assertIsNone(antiquarian.locked_until)
+        antiquarian.unlock()
+        with self.assertNumQueries(0):
+            self.assertFalse(antiquarian.is_locked())
+
+    def test_lock_prefetch(self):
+        self.antiquarian.lock(self.user)
+        Antiquarian.objects.create(name="Unlocked", re_code="unlocked001")
+        antiquarians = list(
+            Antiquarian.objects.order_by("pk").prefetch_related(
+                Antiquarian.lock_prefetch()
+            )
+        )
+        with self.assertNumQueries(0):
+            self.assertTrue(antiquarians[0].is_locked())
+            self.assertEqual(antiquarians[0].locked_by, self.user)
+            self.assertFalse(antiquarians[1].is_locked())
+
     def test_unlock_failsafe(self):
         self.assertFalse(self.antiquarian.is_locked())
         self.antiquarian.unlock()
@@ -41,21 +93,14 @@ class TestLocks(TestCase):
         self.antiquarian.unlock()
         # the requester should be emailed. We should have two emails
         # one for the lock request, the other for the unlock event
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxEmail.send_pending(), 2)
         self.assertEqual(len(mail.outbox), 2)
         self.assertEqual(mail.outbox[1].to, [other_user.email])
         self.assertEqual(
             mail.outbox[1].subject, "The item you requested has become available"
         )
 
-    def test_long_lock_email(self):
-        self.antiquarian.lock(self.user)
-        self.antiquarian.send_long_lock_email()
-        self.assertEqual(len(mail.outbox), 1)
-        self.assertEqual(mail.outbox[0].to, [self.user.email])
-        self.assertEqual(
-            mail.outbox[0].subject, "You have had an item locked for a while"
-        )
-
     def test_locked_at(self):
         # default none
         self.assertIsNone(self.antiquarian.locked_at)
@@ -83,18 +128,22 @@ class TestLocks(TestCase):
         # set a lock that has already expired...
         when = timezone.now() - timedelta(days=1)
         self.antiquarian.lock(self.user, lock_until=when)
-        self.assertEqual(self.antiquarian.locked_until, when)
+        self.assertEqual(self.antiquarian.get_lock_record().locked_until, when)
 
-        self.antiquarian.check_lock_expired()
+        ObjectLock.sweep_expired()
         # the following values should have been reset
         self.assertIsNone(self.antiquarian.locked_at)
         self.assertIsNone(self.antiquarian.locked_until)
         self.assertIsNone(self.antiquarian.locked_by)
 
-    def test_check_locked_expired_failsafe(self):
-        # should not cause an issue if the lock is not there
+    def test_expired_lock_ignored(self):
+        when = timezone.now() - timedelta(days=1)
+        self.antiquarian.lock(self.user, lock_until=when)
         self.assertFalse(self.antiquarian.is_locked())
-        self.antiquarian.check_lock_expired()
+        self.assertIsNone(self.antiquarian.locked_by)
+        self.assertIsNone(self.antiquarian.locked_until)
+        # it is left for the sweeper to remove
+        self.assertEqual(ObjectLock.objects.count(), 1)
 
     def test_request_lock(self):
         other_user = UserFactory.create()
@@ -102,6 +151,7 @@ class TestLocks(TestCase):
         self.antiquarian.request_lock(other_user)
         self.assertEqual(other_user.objectlockrequest_set.count(), 1)
         # check email sent
+        OutboxEmail.send_pending()
         self.assertEqual(len(mail.outbox), 1)
         self.assertEqual(mail.outbox[0].to, [self.user.email])
         self.assertEqual(mail.outbox[0].subject, "Request to edit record")
@@ -121,3 +171,92 @@ class TestLocks(TestCase):
         self.assertTrue(self.antiquarian.is_locked())
         self.antiquarian.break_lock(admin_user)
         self.assertTrue(self.antiquarian.is_locked())
+
+
+class TestOutboxEmail(TestCase):
+    def queue(self, subject="subject"):
+        return OutboxEmail.queue(
+            subject, "", "from@example.com", ["to@example.com"], html_message="<p>"
+        )
+
+    def test_send_pending(self):
+        emails = [self.queue("first"), self.queue("second")]
+        self.assertEqual(OutboxEmail.send_pending(batch_size=1), 1)
+        self.assertEqual([m.subject for m in mail.outbox], ["first"])
+        self.assertEqual(OutboxEmail.send_pending(), 1)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[1].alternatives, [("<p>", "text/html")])
+        for email in emails:
+            email.refresh_from_db()
+            self.assertIsNotNone(email.sent_at)
+        # nothing more to send
+        self.assertEqual(OutboxEmail.send_pending(), 0)
+
+    def test_failed_email_retried_later(self):
+        email = self.queue()
+        with patch.object(
+            OutboxEmail, "as_message", side_effect=ConnectionRefusedError("down")
+        ):
+            self.assertEqual(OutboxEmail.send_pending(), 0)
+        email.refresh_from_db()
+        self.assertIsNone(email.sent_at)
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(email.last_error, "down")
+        self.assertGreater(email.send_after, timezone.now())
+
+        # not due yet
+        self.assertEqual(OutboxEmail.send_pending(), 0)
+        OutboxEmail.objects.update(send_after=timezone.now())
+        self.assertEqual(OutboxEmail.send_pending(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class TestLockSweeper(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.requester = UserFactory.create()
+        self.antiquarians = [
+            Antiquarian.objects.create(name=name, re_code="%s001" % name)
+            for name in ("first", "second", "third")
+        ]
+
+    def test_sweep_expired(self):
+        expired = timezone.now() - timedelta(days=1)
+        for antiquarian in self.antiquarians[:2]:
+            antiquarian.lock(self.user, lock_until=expired)
+            antiquarian.get_lock_record().objectlockrequest_set.create(
+                from_user=self.requester
+            )
+        unexpired = timezone.now() + timedelta(days=1)
+        self.antiquarians[2].lock(self.user, lock_until=unexpired)
+
+        self.assertEqual(ObjectLock.sweep_expired(), 2)
+        self.assertEqual(
+            list(ObjectLock.objects.values_list("object_id", flat=True)),
+            [self.antiquarians[2].pk],
+        )
+        # one email to the requester about both items
+        OutboxEmail.send_pending()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.requester.email])
+        html = mail.outbox[0].alternatives[0][0]
+        for antiquarian in self.antiquarians[:2]:
+            self.assertIn(antiquarian.get_absolute_url(), html)
+
+        self.assertEqual(ObjectLock.sweep_expired(), 0)
+
+    def test_warn_long_locks(self):
+        for antiquarian in self.antiquarians[:2]:
+            antiquarian.lock(self.user)
+        self.antiquarians[2].lock(self.requester)
+        ObjectLock.objects.filter(locked_by=self.user).update(
+            locked_at=timezone.now() - timedelta(days=10)
+        )
+
+        self.assertEqual(ObjectLock.warn_long_locks(days=5), 1)
+        OutboxEmail.send_pending()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.user.email])
+        self.assertEqual(
+            mail.outbox[0].subject, "You have had items locked for a while"
+        )
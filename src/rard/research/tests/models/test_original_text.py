@@ -1,8 +1,11 @@
 import pytest
+from django.db import connection
 from django.db.utils import IntegrityError
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from rard.research.models import (
+    ApparatusCriticusItem,
     CitingWork,
     Fragment,
     OriginalText,
@@ -48,6 +51,124 @@ class TestOriginalText(TestCase):
         }
         text = OriginalText.objects.create(**data, owner=self.fragment)
         self.assertEqual(text.remove_reference_order_padding(), "1.10.12345")
+        self.assertEqual(text.reference_sort_key, [1, 10, 12345])
+
+    def test_in_reference_range(self):
+        texts = {
+            reference_order: OriginalText.objects.create(
+                content="content",
+                citing_work=self.citing_work,
+                reference_order=reference_order,
+                owner=self.fragment,
+            )
+            for reference_order in ["1.2", "1.3", "1.9.4", "1.10", "1.10.2", "1.11"]
+        }
+        self.assertEqual(
+            list(OriginalText.in_reference_range(self.citing_work, "1.3", "1.10")),
+            [texts[key] for key in ["1.3", "1.9.4", "1.10", "1.10.2"]],
+        )
+
+    def test_get_ordinals(self):
+        texts = [
+            OriginalText.objects.create(
+                content="content", citing_work=self.citing_work, owner=self.fragment
+            )
+            for _ in range(3)
+        ]
+        other = Fragment.objects.create(name="other")
+        only_text = OriginalText.objects.create(
+            content="content", citing_work=self.citing_work, owner=other
+        )
+        ordinals = OriginalText.get_ordinals([t.pk for t in texts + [only_text]])
+        for text in texts + [only_text]:
+            text.refresh_from_db()
+            self.assertEqual(
+                ordinals[text.pk], text.ordinal_with_respect_to_parent_object()
+            )
+        self.assertEqual([ordinals[t.pk] for t in texts], ["a", "b", "c"])
+        self.assertEqual(ordinals[only_text.pk], "")
+        self.assertEqual(OriginalText.get_ordinals([]), {})
+
+    def test_positions_maintained(self):
+        def positions():
+            return list(
+                self.fragment.original_texts.order_by("pk").values_list(
+                    "owner_index", "owner_ordinal"
+                )
+            )
+
+        first = OriginalText.objects.create(
+            content="content", citing_work=self.citing_work, owner=self.fragment
+        )
+        self.assertEqual((first.owner_index, first.owner_ordinal), (0, ""))
+        self.assertEqual(str(first), "Original Text 1")
+
+        second = OriginalText.objects.create(
+            content="content", citing_work=self.citing_work, owner=self.fragment
+        )
+        self.assertEqual(positions(), [(0, "a"), (1, "b")])
+        self.assertEqual(str(second), "Original Text 2")
+
+        # moving a text reindexes both the old and the new owner
+        other = Fragment.objects.create(name="other")
+        first.owner = other
+        first.save()
+        self.assertEqual(positions(), [(0, "")])
+        self.assertEqual((first.owner_index, first.owner_ordinal), (0, ""))
+
+        second.delete()
+        self.assertEqual(positions(), [])
+
+    def test_reindex_owner_writes_only_changes(self):
+        for _ in range(2):
+            OriginalText.objects.create(
+                content="content", citing_work=self.citing_work, owner=self.fragment
+            )
+        # a select and no updates
+        with self.assertNumQueries(1):
+            OriginalText.reindex_owner_of(self.fragment)
+
+    def test_render_apparatus_criticus_mentions_in_bulk(self):
+        def render_queries(text):
+            text.refresh_from_db()
+            with CaptureQueriesContext(connection) as context:
+                rendered = text.render_content()
+            return len(context.captured_queries), rendered
+
+        texts = [
+            OriginalText.objects.create(
+                content="content",
+                citing_work=self.citing_work,
+                owner=self.fragment,
+                reference_order=str(count),
+            )
+            for count in range(2)
+        ]
+        text = texts[1]
+        mention = (
+            '<span class="mention" data-denotation-char="#" data-id="{}" '
+            'data-original-text="{}" data-parent="{}" '
+            'data-target="apparatuscriticusitem">'
+            '<span contenteditable="false"><span>#</span>1</span></span>'
+        )
+        items = []
+        for count in range(6):
+            items.append(
+                ApparatusCriticusItem.objects.create(
+                    parent=text, content="item %d" % count
+                )
+            )
+            text.content = "".join(
+                mention.format(item.pk, text.pk, self.fragment.pk) for item in items
+            )
+            text.save()
+            if count == 0:
+                queries_for_one, _ = render_queries(text)
+
+        queries_for_many, rendered = render_queries(text)
+        self.assertEqual(queries_for_one, queries_for_many)
+        for item in items:
+            self.assertIn(">b%d</sup>" % (item.order + 1), rendered)
 
 
 class TestTranslation(TestCase):
@@ -181,6 +302,14 @@ class TestReferences(TestCase):
         self.reference.delete()
         self.original_text.refresh_from_db()
         self.assertEqual(self.original_text.references.count(), 0)
+        self.assertEqual(self.original_text.reference_list, "")
+
+    def test_reference_list_stored(self):
+        self.reference.reference_position = "3.1"
+        self.reference.save()
+        text = OriginalText.objects.get(pk=self.original_text.pk)
+        self.assertEqual(text.references_display, "3.1")
+        self.assertEqual(text.reference_list, text.build_reference_list())
 
     def test_reference_list_property(self):
         self.assertEqual(self.original_text.references.count(), 1)
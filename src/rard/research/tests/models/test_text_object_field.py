@@ -139,3 +139,54 @@ class TestTextObjectField(TestCase):
         self.assertIn((antiquarian), fragment.mentioned_in_list)
         self.assertNotIn((antiquarian), anon_frag.mentioned_in_list)
         self.assertNotIn((antiquarian), testimonium.mentioned_in_list)
+
+    def test_plain_text_follows_content(self):
+        fragment = Fragment.objects.create(name="name")
+        fragment.commentary.content = "<p>some commentary</p>"
+        fragment.commentary.save()
+        fragment = Fragment.objects.get(pk=fragment.pk)
+        self.assertEqual(fragment.plain_commentary, "some commentary")
+
+    def test_plain_text_not_recalculated_when_content_unchanged(self):
+        fragment = Fragment.objects.create(name="name")
+        fragment = Fragment.objects.get(pk=fragment.pk)
+        self.assertFalse(fragment.text_object_field_changed("commentary"))
+        # the commentary is not fetched for an unrelated change
+        fragment.name = "another name"
+        with self.assertNumQueries(0):
+            fragment.text_object_field_changed("commentary")
+        fragment.commentary.content = "changed"
+        self.assertTrue(fragment.text_object_field_changed("commentary"))
+
+    def test_owner_stored(self):
+        fragment = Fragment.objects.create(name="name")
+        text = TextObjectField.objects.get(pk=fragment.commentary.pk)
+        self.assertEqual(text.owner_id, fragment.pk)
+        # found with a single lookup rather than trying each relation
+        with self.assertNumQueries(1):
+            self.assertEqual(text.get_related_object(), fragment)
+            self.assertEqual(text.fragment, fragment)
+
+    def test_owner_found_and_stored_when_missing(self):
+        antiquarian = Antiquarian.objects.create(name="name", re_code="name")
+        TextObjectField.objects.filter(pk=antiquarian.introduction.pk).update(
+            owner_content_type=None, owner_id=None
+        )
+        text = TextObjectField.objects.get(pk=antiquarian.introduction.pk)
+        self.assertEqual(text.get_related_object(), antiquarian)
+        text = TextObjectField.objects.get(pk=antiquarian.introduction.pk)
+        self.assertEqual(text.owner, antiquarian)
+
+    def test_related_objects_fetched_in_bulk(self):
+        antiquarians = [
+            Antiquarian.objects.create(name="name%d" % i, re_code="name%d" % i)
+            for i in range(3)
+        ]
+        fragment = Fragment.objects.create(name="name")
+        texts = TextObjectField.objects.filter(
+            pk__in=[a.introduction.pk for a in antiquarians] + [fragment.commentary.pk]
+        ).order_by("pk")
+        # one for the text objects and one per type of owner
+        with self.assertNumQueries(3):
+            owners = TextObjectField.get_related_objects(texts)
+        self.assertEqual(owners, antiquarians + [fragment])
@@ -1,5 +1,8 @@
 import pytest
+from django.db import connection
+from django.template.loader import render_to_string
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rard.research.models import (
@@ -12,6 +15,7 @@ from rard.research.models import (
 )
 from rard.research.models.base import FragmentLink, TestimoniumLink
 from rard.research.models.work import collate_unknown
+from rard.utils.reorder import reindex_queue
 
 pytestmark = pytest.mark.django_db
 
@@ -395,6 +399,66 @@ class TestWork(TestCase):
         )
 
 
+class TestOrderedMaterials(TestCase):
+    def setUp(self):
+        self.antiquarian = Antiquarian.objects.create(name="aq", re_code="aq")
+        self.work = Work.objects.create(name="work")
+        self.antiquarian.works.add(self.work)
+        self.book = Book.objects.create(work=self.work, number=1)
+
+    def add_links(self, count):
+        for _ in range(count):
+            for book in (self.book, None):
+                FragmentLink.objects.create(
+                    fragment=Fragment.objects.create(),
+                    antiquarian=self.antiquarian,
+                    work=self.work,
+                    book=book,
+                )
+                TestimoniumLink.objects.create(
+                    testimonium=Testimonium.objects.create(),
+                    antiquarian=self.antiquarian,
+                    work=self.work,
+                    book=book,
+                )
+
+    def render_materials(self):
+        with CaptureQueriesContext(connection) as context:
+            materials = self.work.get_ordered_materials()
+            render_to_string(
+                "research/partials/ordered_book_area.html",
+                {"ordered_materials": materials},
+            )
+        return materials, len(context.captured_queries)
+
+    def test_grouped_by_book_in_order(self):
+        self.add_links(2)
+        materials, _ = self.render_materials()
+        self.assertEqual(list(materials), [self.book, self.work.unknown_book])
+        for book, content in materials.items():
+            links = list(content["fragments"])
+            self.assertEqual(
+                links,
+                list(
+                    FragmentLink.objects.filter(book=book).order_by(
+                        "order_in_book", "pk"
+                    )
+                ),
+            )
+            for link, details in content["fragments"].items():
+                self.assertEqual(details["linked"], link.fragment)
+                self.assertEqual(details["order"], link.order_in_book)
+            self.assertEqual(len(content["testimonia"]), 2)
+            self.assertNotIn("apposita", content)
+
+    def test_queries_do_not_depend_on_number_of_links(self):
+        self.add_links(1)
+        _, few = self.render_materials()
+        self.add_links(5)
+        _, many = self.render_materials()
+        self.assertEqual(few, many)
+
+
 class TestBook(TestCase):
     def setUp(self):
         self.work = Work.objects.create(name="book_name")
@@ -468,3 +532,14 @@ class TestBook(TestCase):
         book.delete()
         with self.assertRaises(TextObjectField.DoesNotExist):
             TextObjectField.objects.get(pk=introduction_pk)
+
+    def test_reindex_only_when_order_changed(self):
+        book = Book.objects.create(number="1", subtitle="Subtitle", work=self.work)
+        book = Book.objects.get(pk=book.pk)
+        reindex_queue.runs.clear()
+        book.subtitle = "Another subtitle"
+        book.save()
+        self.assertEqual(reindex_queue.runs["work"], 0)
+        book.order = 1
+        book.save()
+        self.assertEqual(reindex_queue.runs["work"], 1)
@@ -1,8 +1,20 @@
 import pytest
+from django.db import connection
 from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from rard.research.models import Antiquarian
+from rard.research.models import (
+    AnonymousFragment,
+    Antiquarian,
+    CitingWork,
+    Fragment,
+    OriginalText,
+    Reference,
+    Testimonium,
+    Work,
+)
+from rard.research.models.base import FragmentLink, TestimoniumLink
 from rard.research.views import (
     AntiquarianCreateView,
     AntiquarianDeleteView,
@@ -235,3 +247,69 @@ class TestAntiquarianUpdateIntroductionView(TestCase):
         intro = self.antiquarian.introduction
         self.assertTrue(bool(intro.content))
         self.assertEqual(intro.content, intro_text)
+
+
+class TestAntiquarianDetailView(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create(is_superuser=True)
+        self.antiquarian = Antiquarian.objects.create(name="aq", re_code="aq")
+        self.work = Work.objects.create(name="work")
+        self.antiquarian.works.add(self.work)
+        self.citing_work = CitingWork.objects.create(title="title")
+
+    def add_original_text(self, owner):
+        original_text = OriginalText.objects.create(
+            owner=owner, citing_work=self.citing_work, content="content"
+        )
+        Reference.objects.create(original_text=original_text, reference_position="1")
+
+    def add_material(self, count):
+        for _ in range(count):
+            fragment = Fragment.objects.create()
+            self.add_original_text(fragment)
+            FragmentLink.objects.create(
+                fragment=fragment, antiquarian=self.antiquarian, work=self.work
+            )
+            testimonium = Testimonium.objects.create()
+            self.add_original_text(testimonium)
+            TestimoniumLink.objects.create(
+                testimonium=testimonium,
+                antiquarian=self.antiquarian,
+                work=self.antiquarian.unknown_work,
+            )
+            anonymous_fragment = AnonymousFragment.objects.create()
+            self.add_original_text(anonymous_fragment)
+            fragment.apposita.add(anonymous_fragment)
+
+    def render_page(self):
+        url = reverse("antiquarian:detail", kwargs={"pk": self.antiquarian.pk})
+        request = RequestFactory().get(url)
+        request.user = self.user
+        with CaptureQueriesContext(connection) as context:
+            response = AntiquarianDetailView.as_view()(request, pk=self.antiquarian.pk)
+            response.render()
+        return response, len(context.captured_queries)
+
+    def test_page_lists_material_by_work(self):
+        self.add_material(2)
+        response, _ = self.render_page()
+        page = response.context_data["page"]
+        works = {work: (t, f, a) for work, t, f, a in page.works}
+        self.assertEqual(
+            works[self.work][1],
+            list(self.antiquarian.fragmentlinks.order_by("work_order")),
+        )
+        self.assertEqual(len(works[self.work][2]), 2)
+        for link in works[self.work][1]:
+            self.assertContains(response, "fragmentlink_%d" % link.pk)
+        self.assertEqual(
+            page.unknown_work_testimonium_links,
+            list(self.antiquarian.testimoniumlinks.order_by("work_order")),
+        )
+
+    def test_queries_do_not_depend_on_amount_of_material(self):
+        self.add_material(2)
+        _, few = self.render_page()
+        self.add_material(6)
+        _, many = self.render_page()
+        self.assertEqual(few, many)
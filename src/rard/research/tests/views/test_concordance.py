@@ -1,7 +1,11 @@
+import json
+from io import StringIO
+
 import pytest
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
 from django.core.exceptions import PermissionDenied
+from django.core.management import call_command
 from django.test import RequestFactory, TestCase
 from django.urls import reverse
 
@@ -286,6 +290,42 @@ class TestConcordanceViews(TestCase):
         )  # check two concordances are found
         self.assertTrue(p2_index < p3_index)  # check ordered by identifier
 
+    def test_export_csv(self):
+        url = reverse("concordance:export")
+        self.client.force_login(self.user)
+        response = self.client.get(url, {"edition": self.edition.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith("edition,identifier"))
+        self.assertIn(str(self.concordance), lines[1])
+        self.assertIn(self.fragment.get_absolute_url(), lines[1])
+
+    def test_export_json(self):
+        url = reverse("concordance:export")
+        self.client.force_login(self.user)
+        response = self.client.get(url, {"edition": self.edition.pk, "format": "json"})
+        rows = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["identifier"], "3")
+        self.assertEqual(rows[0]["reference"], "55.l")
+        self.assertEqual(rows[0]["frrant"], str(self.fragment))
+
+    def test_export_command(self):
+        out = StringIO()
+        call_command("export_concordances", edition=self.edition.pk, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn(str(self.concordance), lines[1])
+
+    def test_export_needs_edition_or_antiquarian(self):
+        url = reverse("concordance:export")
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 400)
+        response = self.client.get(url, {"edition": self.edition.pk, "format": "xml"})
+        self.assertEqual(response.status_code, 400)
+
     def test_create_view_dispatch_creates_top_level_object(self):
         # dispatch method creates an attribute used by the
         # locking mechanism so here we ensure it is created
@@ -678,6 +678,8 @@ class TestFragmentDuplicationView(TestCase):
                 "original_text",
                 "order",
                 "model",
+                "display_name",
+                "short_display_name",
             ]:
                 continue
             if field.is_relation and getattr(original, field.name):
@@ -708,6 +710,14 @@ class TestFragmentDuplicationView(TestCase):
         duplicate_tr = Translation.objects.filter(original_text=duplicate_ot).first()
 
         self.compare_model_objects(self.frag, duplicate_frag)
+        # the stored names are the duplicate's own
+        self.assertEqual(
+            duplicate_frag.display_name, duplicate_frag.get_display_name_option_b()
+        )
+        self.assertEqual(
+            duplicate_frag.short_display_name,
+            duplicate_frag.get_display_name_option_c(),
+        )
         self.assertEqual(
             list(self.frag.topics.all()), list(duplicate_frag.topics.all())
         )
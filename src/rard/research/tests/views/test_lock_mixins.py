@@ -1,3 +1,4 @@
+import json
 from datetime import timedelta
 
 import pytest
@@ -9,6 +10,7 @@ from django.utils import timezone
 from rard.research.models import Antiquarian
 from rard.research.views import AntiquarianDetailView, AntiquarianWorkCreateView
 from rard.users.tests.factories import UserFactory
+from rard.utils.basemodel import OutboxEmail
 
 pytestmark = pytest.mark.django_db
 
@@ -30,6 +32,21 @@ class TestCheckLockMixin(TestCase):
         response_content = response.content.decode("utf-8")
         self.assertTrue(response_content.find("😢") > 0)
 
+    def test_expired_lock_refused(self):
+        antiquarian = Antiquarian.objects.create()
+        data = {"name": "name", "subtitle": "subtitle"}
+        url = reverse("antiquarian:create_work", kwargs={"pk": antiquarian.pk})
+
+        request = RequestFactory().post(url, data=data)
+        request.user = UserFactory.create()
+        # the user's lock has expired but has not been removed yet
+        antiquarian.lock(request.user, timezone.now() - timedelta(minutes=1))
+
+        response = AntiquarianWorkCreateView.as_view()(request, pk=antiquarian.pk)
+        response_content = response.content.decode("utf-8")
+        self.assertTrue(response_content.find("😢") > 0)
+        self.assertFalse(antiquarian.works.filter(name="name").exists())
+
 
 class TestCanLockMixin(TestCase):
     def test_post_creates_lock(self):
@@ -126,6 +143,7 @@ class TestCanLockMixin(TestCase):
         self.assertEqual(request.user.objectlockrequest_set.count(), 1)
 
         # check email sent
+        OutboxEmail.send_pending()
         self.assertEqual(len(mail.outbox), 1)
         self.assertEqual(mail.outbox[0].to, [another_user.email])
         self.assertEqual(mail.outbox[0].subject, "Request to edit record")
@@ -193,3 +211,36 @@ class TestCanLockMixin(TestCase):
             < refetch.locked_until
             < time_after + timedelta(days=DAYS)
         )
+
+
+class TestLockStatusView(TestCase):
+    def setUp(self):
+        self.user = UserFactory.create()
+        self.locked = Antiquarian.objects.create(name="locked", re_code="locked001")
+        self.locked.lock(self.user)
+        self.unlocked = Antiquarian.objects.create(
+            name="unlocked", re_code="unlocked001"
+        )
+
+    def get(self, *values):
+        self.client.force_login(self.user)
+        return self.client.get(reverse("lock_status"), data={"object": list(values)})
+
+    def test_status_of_several_objects(self):
+        locked = "antiquarian:%d" % self.locked.pk
+        unlocked = "antiquarian:%d" % self.unlocked.pk
+        response = self.get(locked, unlocked)
+        locks = json.loads(response.content)["locks"]
+        self.assertTrue(locks[locked]["locked"])
+        self.assertTrue(locks[locked]["locked_by_user"])
+        self.assertFalse(locks[unlocked]["locked"])
+        self.assertIsNone(locks[unlocked]["locked_by"])
+
+    def test_view_permission_needed(self):
+        self.user = UserFactory.create(is_superuser=False)
+        response = self.get("antiquarian:%d" % self.locked.pk)
+        self.assertEqual(response.status_code, 403)
+
+    def test_unknown_objects_rejected(self):
+        for value in ["nothing:1", "antiquarian:x", "citingauthor"]:
+            self.assertEqual(self.get(value).status_code, 400)
@@ -1,9 +1,12 @@
+import json
 from unittest import mock
 
 import pytest
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.db import connection
 from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rard.research.models import (
@@ -394,3 +397,69 @@ class TestMentionsView(TestCase):
         )
         self.assertEqual(len(list(view.get_queryset())), 1)
         self.assertEqual(view.get_queryset().first(), self.f600)
+
+    def test_results_are_limited(self):
+        for _ in range(4):
+            fragment = Fragment.objects.create()
+            FragmentLink.objects.create(fragment=fragment, antiquarian=self.antman)
+
+        view = MentionSearchView()
+        view.paginate_by = 3
+        view.request = self.request(data={"q": "fr"})
+        response = view.get(view.request)
+        first_page = [item["id"] for item in json.loads(response.content)]
+        self.assertEqual(len(first_page), 3)
+
+        view.request = self.request(data={"q": "fr", "page": 3})
+        response = view.get(view.request)
+        last_page = [item["id"] for item in json.loads(response.content)]
+        self.assertEqual(len(last_page), 1)
+        self.assertNotIn(last_page[0], first_page)
+
+    def test_pages_are_ordered(self):
+        # works sharing a name are still paged in a stable order
+        for _ in range(4):
+            Work.objects.create(name="same")
+
+        view = MentionSearchView()
+        view.paginate_by = 2
+        pages = []
+        for page in range(1, 3):
+            view.request = self.request(data={"q": "wk:same", "page": page})
+            response = view.get(view.request)
+            pages += [item["id"] for item in json.loads(response.content)]
+        self.assertEqual(
+            pages,
+            list(
+                Work.objects.filter(name="same")
+                .order_by("pk")
+                .values_list("pk", flat=True)
+            ),
+        )
+
+    def test_fragment_results_constant_queries(self):
+        def count_queries():
+            request = self.request(data={"q": "fr"})
+            request.user = user
+            with CaptureQueriesContext(connection) as context:
+                response = MentionSearchView.as_view()(request)
+            return len(context.captured_queries), response
+
+        user = UserFactory()
+        before, _ = count_queries()
+
+        for _ in range(5):
+            fragment = Fragment.objects.create()
+            FragmentLink.objects.create(
+                fragment=fragment, antiquarian=self.andrew, work=self.provisions
+            )
+        after, response = count_queries()
+        self.assertEqual(before, after)
+
+        # the display names are still rendered correctly, as stored once
+        # the links were added
+        fragment.refresh_from_db()
+        self.f1.refresh_from_db()
+        data = {item["id"]: item["value"] for item in json.loads(response.content)}
+        self.assertEqual(data[fragment.pk], str(fragment))
+        self.assertEqual(data[self.f1.pk], str(self.f1))
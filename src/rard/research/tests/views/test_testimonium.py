@@ -158,6 +158,8 @@ class TestTestimoniumDuplicationView(TestCase):
                 "original_text",
                 "order",
                 "model",
+                "display_name",
+                "short_display_name",
             ]:
                 continue
             if field.is_relation and getattr(original, field.name):
@@ -189,6 +191,14 @@ class TestTestimoniumDuplicationView(TestCase):
         duplicate_tr = Translation.objects.filter(original_text=duplicate_ot).first()
 
         self.compare_model_objects(self.tes, duplicate_frag)
+        # the stored names are the duplicate's own
+        self.assertEqual(
+            duplicate_frag.display_name, duplicate_frag.get_display_name_option_b()
+        )
+        self.assertEqual(
+            duplicate_frag.short_display_name,
+            duplicate_frag.get_display_name_option_c(),
+        )
         self.compare_model_objects(self.ot, duplicate_ot)
         self.compare_model_objects(self.ref, duplicate_ref)
         self.compare_model_objects(self.apc, duplicate_apc)
@@ -72,6 +72,7 @@ urlpatterns = [
         views.RefreshOriginalTextContentView.as_view(),
         name="refresh_original_text_content",
     ),
+    path("ajax/lock-status/", views.LockStatusView.as_view(), name="lock_status"),
     # path("comment/<pk>/delete/", views.CommentDeleteView.as_view(), name="delete_comment"),
     # path("text-field/<pk>/comments/", views.TextObjectFieldCommentListView.as_view(), name="list_comments_on_text"),
     path(
@@ -533,6 +534,11 @@ urlpatterns = [
             (
                 [
                     path("list/", views.ConcordanceListView.as_view(), name="list"),
+                    path(
+                        "export/",
+                        views.ConcordanceExportView.as_view(),
+                        name="export",
+                    ),
                     path(
                         "fetch-works/",
                         views.fetch_works,
@@ -620,6 +626,11 @@ urlpatterns = [
                         views.HistoryListView.as_view(),
                         name="list",
                     ),
+                    path(
+                        "activity/",
+                        views.ActivityView.as_view(),
+                        name="activity",
+                    ),
                 ],
                 "research",
             ),
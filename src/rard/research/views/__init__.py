@@ -47,6 +47,7 @@ from .concordance import (
     ConcordanceCreateView,
     ConcordanceDeleteView,
     ConcordanceEditionView,
+    ConcordanceExportView,
     ConcordanceListView,
     ConcordanceUpdateView,
     OldConcordanceDeleteView,
@@ -91,8 +92,9 @@ from .fragment import (
     duplicate_fragment,
     fetch_fragments,
 )
-from .history import HistoryListView
+from .history import ActivityView, HistoryListView
 from .home import HomeView
+from .lock import LockStatusView
 from .mention import MentionSearchView
 from .original_text import (
     AnonymousFragmentOriginalTextCreateView,
@@ -149,6 +151,7 @@ from .work import (
 )
 
 __all__ = [
+    "ActivityView",
     "AddAppositumAnonymousLinkView",
     "AddAppositumFragmentLinkView",
     "AddAppositumGeneralLinkView",
@@ -192,6 +195,7 @@ __all__ = [
     "ConcordanceCreateView",
     "ConcordanceDeleteView",
     "ConcordanceEditionView",
+    "ConcordanceExportView",
     "ConcordanceListView",
     "ConcordanceUpdateView",
     "OldConcordanceDeleteView",
@@ -231,6 +235,7 @@ __all__ = [
     "duplicate_fragment",
     "HistoryListView",
     "HomeView",
+    "LockStatusView",
     "MentionSearchView",
     "MoveTopicView",
     "MoveAnonymousTopicLinkView",
@@ -20,17 +20,23 @@ from rard.research.forms import (
     WorkForm,
 )
 from rard.research.models import Antiquarian, AntiquarianConcordance, Book, Work
+from rard.research.models.antiquarian import AntiquarianPage
 from rard.research.views.mixins import (
     CanLockMixin,
     CheckLockMixin,
     DateOrderMixin,
+    PrefetchLocksMixin,
     TextObjectFieldUpdateMixin,
     TextObjectFieldViewMixin,
 )
 
 
 class AntiquarianListView(
-    DateOrderMixin, LoginRequiredMixin, PermissionRequiredMixin, ListView
+    DateOrderMixin,
+    PrefetchLocksMixin,
+    LoginRequiredMixin,
+    PermissionRequiredMixin,
+    ListView,
 ):
     paginate_by = 10
     model = Antiquarian
@@ -43,6 +49,11 @@ class AntiquarianDetailView(
     model = Antiquarian
     permission_required = ("research.view_antiquarian",)
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["page"] = AntiquarianPage(self.object)
+        return context
+
     def post(self, *args, **kwargs):
         link_pk = self.request.POST.get("link_id", None)
         work_pk = self.request.POST.get("work_id", None)
@@ -95,6 +106,7 @@ class MoveLinkView(LoginRequiredMixin, View):
         template = self.render_partial_template
         context = {
             "antiquarian": antiquarian,
+            "page": AntiquarianPage(antiquarian),
             "has_object_lock": True,
             "can_edit": True,
             "perms": PermWrapper(self.request.user),
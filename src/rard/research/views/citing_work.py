@@ -86,7 +86,7 @@ class CitingAuthorListView(
         ordering += [
             "content_type",  # by fragment, then testimonium, then anon frag
             "citing_work",  # group by work
-            "reference_order",  # then by reference
+            "reference_sort_key",  # then by reference
         ]
         return OriginalText.objects.all().order_by(*ordering)
 
@@ -104,7 +104,7 @@ class CitingAuthorFullListView(
 
     def get_queryset(self):
         # all citing authors
-        return CitingAuthor.objects.all()
+        return CitingAuthor.objects.prefetch_related(CitingAuthor.lock_prefetch())
 
 
 class CitingAuthorDetailView(
@@ -118,7 +118,7 @@ class CitingAuthorDetailView(
         # Add in a queryset of all materials by the citing author
         ordering = [
             "citing_work",  # Group by work
-            "reference_order",  # Then order by reference order
+            "reference_sort_key",  # Then order by reference order
         ]
         ordered_texts = OriginalText.objects.filter(
             citing_work__author__id=self.kwargs["pk"]
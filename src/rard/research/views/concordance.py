@@ -1,6 +1,9 @@
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import BadRequest
 from django.db import DatabaseError
-from django.http import HttpResponse
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils.decorators import method_decorator
@@ -21,6 +24,12 @@ from rard.research.models.bibliography import BibliographyItem
 from rard.research.models.original_text import Concordance
 from rard.research.models.work import Work
 from rard.research.views.mixins import CheckLockMixin
+from rard.utils.concordance_export import (
+    EXPORT_CONTENT_TYPES,
+    concordance_rows,
+    export_lines,
+    get_export_queryset,
+)
 
 
 def fetch_works(request):
@@ -70,6 +79,28 @@ def get_part_format(edition):
         raise DatabaseError(f"No template part identifier exists for edition {edition}")
 
 
+def set_original_text_pks(items):
+    """Give each fragment or testimonium the pks of its original texts, to
+    match them with concordances, fetched in one query"""
+    content_types = ContentType.objects.get_for_models(
+        *{item.__class__ for item in items}
+    )
+    query = Q()
+    for model, content_type in content_types.items():
+        pks = [item.pk for item in items if item.__class__ == model]
+        query |= Q(content_type=content_type, object_id__in=pks)
+    original_text_pks = {}
+    if query:
+        for pk, content_type_id, object_id in OriginalText.objects.filter(
+            query
+        ).values_list("pk", "content_type", "object_id"):
+            original_text_pks.setdefault((content_type_id, object_id), set()).add(pk)
+    for item in items:
+        item.original_text_pks = original_text_pks.get(
+            (content_types[item.__class__].pk, item.pk), set()
+        )
+
+
 def create_edition_bib_item(pk):
     edition = Edition.objects.get(pk=pk)
     BibliographyItem.objects.create(
@@ -111,21 +142,19 @@ class ConcordanceListView(LoginRequiredMixin, PermissionRequiredMixin, ListView)
             results = list(antiquarian.testimonia.all()) + list(
                 antiquarian.ordered_fragments()
             )
-            filtered_concordances = [
-                concordance
-                for concordance in queryset
-                if antiquarian in concordance.antiquarians
-            ]
-            results_qs = {"frrant": results, "concordances": filtered_concordances}
+            filtered_concordances = queryset.for_antiquarian(antiquarian)
 
             if work_pk:
                 # work can only be selected if antiquarian has been selected
                 work = Work.objects.get(pk=work_pk)
                 results = list(work.all_testimonia()) + list(work.all_fragments())
-                filtered_concordances = [
-                    concordance for concordance in queryset if work in concordance.works
-                ]
-                results_qs = {"frrant": results, "concordances": filtered_concordances}
+                filtered_concordances = queryset.for_work(work)
+
+            set_original_text_pks(results)
+            results_qs = {
+                "frrant": results,
+                "concordances": list(filtered_concordances),
+            }
 
         elif edition_pk:
             # also sort by this rather than by the frrant thing
@@ -154,6 +183,36 @@ class ConcordanceListView(LoginRequiredMixin, PermissionRequiredMixin, ListView)
         return context
 
 
+class ConcordanceExportView(LoginRequiredMixin, PermissionRequiredMixin, View):
+    """Streams the concordances of an edition (?edition=<pk>) and/or
+    antiquarian (?antiquarian=<pk>) as csv, tsv or json (?format=...)
+    without loading them all into memory"""
+
+    permission_required = "research.view_concordance"
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get("format", "csv")
+        if export_format not in EXPORT_CONTENT_TYPES:
+            raise BadRequest("format not recognised")
+        edition = antiquarian = None
+        if request.GET.get("edition"):
+            edition = get_object_or_404(Edition, pk=request.GET["edition"])
+        if request.GET.get("antiquarian"):
+            antiquarian = get_object_or_404(Antiquarian, pk=request.GET["antiquarian"])
+        if not (edition or antiquarian):
+            raise BadRequest("an edition or antiquarian is required")
+
+        rows = concordance_rows(get_export_queryset(edition, antiquarian))
+        response = StreamingHttpResponse(
+            export_lines(rows, export_format),
+            content_type=EXPORT_CONTENT_TYPES[export_format],
+        )
+        response["Content-Disposition"] = (
+            'attachment; filename="concordances.%s"' % export_format
+        )
+        return response
+
+
 class ConcordanceEditionView(
     CheckLockMixin, LoginRequiredMixin, PermissionRequiredMixin, View
 ):
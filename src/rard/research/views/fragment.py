@@ -39,6 +39,7 @@ from rard.research.models import (
     CitingAuthor,
     CitingWork,
     Fragment,
+    OriginalText,
     Reference,
     Testimonium,
     Topic,
@@ -51,6 +52,7 @@ from rard.research.views.mixins import (
     CanLockMixin,
     CheckLockMixin,
     GetWorkLinkRequestDataMixin,
+    PrefetchLocksMixin,
     TextObjectFieldUpdateMixin,
     TextObjectFieldViewMixin,
 )
@@ -65,6 +67,7 @@ from rard.utils.duplication import (
     duplicate_original_text,
     update_ot_content_references,
 )
+from rard.utils.reorder import reindex_queue
 from rard.utils.shared_functions import reassign_to_unknown
 
 
@@ -292,7 +295,9 @@ class AppositumCreateView(AnonymousFragmentCreateView):
         return self.owner_for
 
 
-class FragmentListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+class FragmentListView(
+    PrefetchLocksMixin, LoginRequiredMixin, PermissionRequiredMixin, ListView
+):
     paginate_by = 10
     model = Fragment
     permission_required = ("research.view_fragment",)
@@ -337,7 +342,7 @@ class AnonymousFragmentListView(LoginRequiredMixin, PermissionRequiredMixin, Lis
         # Sort by citing author then reference order
         return qs.order_by(
             "fragment__original_texts__citing_work__author",
-            "fragment__original_texts__reference_order",
+            "fragment__original_texts__reference_sort_key",
         )
 
     def get_context_data(self, *args, **kwargs):
@@ -391,8 +396,12 @@ class UnlinkedFragmentListView(LoginRequiredMixin, PermissionRequiredMixin, List
 
     def get_queryset(self):
         """Queryset should include all unlinked fragments."""
-        qs = Fragment.objects.all().filter(
-            linked_antiquarians=None,
+        qs = (
+            Fragment.objects.all()
+            .filter(
+                linked_antiquarians=None,
+            )
+            .prefetch_related(Fragment.lock_prefetch())
         )
 
         return qs
@@ -1117,8 +1126,10 @@ class FragmentUpdateWorkLinkView(
         )
 
     def post(self, request, *args, **kwargs):
-        super().post(request, *args, **kwargs)
-        self.object.save()
+        # reindex once for both saves
+        with reindex_queue.batch():
+            super().post(request, *args, **kwargs)
+            self.object.save()
         context = self.get_context_data()
 
         return render(request, "research/partials/linked_work.html", context)
@@ -1240,6 +1251,9 @@ def duplicate_fragment(request, pk, model_name):
     new_fragment = Fragment.objects.create(**new_fragment_data)
     # Attach the original texts
     new_fragment.original_texts.set(new_original_texts)
+    # the copies were made under the original fragment so reindex both
+    OriginalText.reindex_owner_of(original_fragment)
+    OriginalText.reindex_owner_of(new_fragment)
 
     # Duplicate relationships to topics
     if not model_name == "testimonium":
@@ -3,7 +3,12 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import transaction
 from django.http import Http404, HttpResponseRedirect
-from django.views.generic import ListView
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_datetime
+from django.views.generic import ListView, TemplateView
+
+from rard.research.models import Antiquarian, HistoricalRecordLog
+from rard.users.models import User
 
 
 class HistoryListView(LoginRequiredMixin, ListView):
@@ -59,3 +64,48 @@ class HistoryListView(LoginRequiredMixin, ListView):
                 pass
 
         return HttpResponseRedirect(self.request.path)
+
+
+class ActivityView(LoginRequiredMixin, TemplateView):
+    """Recent changes across all the history tables, optionally only those
+    by a user (?user=<pk>) or to an antiquarian and its works, fragments etc.
+    (?antiquarian=<pk>). Pages are found with the date and id of the last
+    change shown (?before=<date>&before_id=<id>)"""
+
+    template_name = "research/activity.html"
+    paginate_by = 50
+
+    def get_before(self):
+        try:
+            history_date = parse_datetime(self.request.GET.get("before", ""))
+            pk = int(self.request.GET.get("before_id", ""))
+        except ValueError:
+            # either malformed, or a well-formed but invalid date
+            return None
+        return (history_date, pk) if history_date else None
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        user = antiquarian = None
+        if self.request.GET.get("user"):
+            user = get_object_or_404(User, pk=self.request.GET["user"])
+        if self.request.GET.get("antiquarian"):
+            antiquarian = get_object_or_404(
+                Antiquarian, pk=self.request.GET["antiquarian"]
+            )
+        # fetch one more than we show to find out if there is another page
+        logs = HistoricalRecordLog.activity(
+            user=user,
+            antiquarian=antiquarian,
+            before=self.get_before(),
+            limit=self.paginate_by + 1,
+        )
+        context.update(
+            {
+                "logs": logs[: self.paginate_by],
+                "has_next": len(logs) > self.paginate_by,
+                "activity_user": user,
+                "antiquarian": antiquarian,
+            }
+        )
+        return context
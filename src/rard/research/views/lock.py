@@ -0,0 +1,45 @@
+from django.apps import apps
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import BadRequest, PermissionDenied
+from django.http import JsonResponse
+from django.views.generic import View
+
+from rard.utils.basemodel import LockableModel, ObjectLock
+
+
+class LockStatusView(LoginRequiredMixin, View):
+    """Reports whether each of a number of objects is locked, so that a page
+    can check all of its objects in one request. The objects are given as
+    repeated parameters of the form <model name>:<pk>, for example
+    ?object=fragment:12&object=work:3. The user needs permission to view
+    objects of each of the models"""
+
+    def get(self, request, *args, **kwargs):
+        requested = {}
+        for value in request.GET.getlist("object"):
+            model_name, _, pk = value.partition(":")
+            try:
+                model = apps.get_model("research", model_name)
+                pk = int(pk)
+            except (LookupError, ValueError):
+                raise BadRequest("object not recognised")
+            if not issubclass(model, LockableModel):
+                raise BadRequest("object cannot be locked")
+            if not request.user.has_perm("research.view_%s" % model._meta.model_name):
+                raise PermissionDenied
+            requested[value] = (ContentType.objects.get_for_model(model).pk, pk)
+
+        locks = ObjectLock.get_current_locks(requested.values())
+        statuses = {}
+        for value, key in requested.items():
+            lock = locks.get(key)
+            statuses[value] = {
+                "locked": lock is not None,
+                "locked_by": str(lock.locked_by) if lock else None,
+                "locked_by_user": lock is not None
+                and lock.locked_by_id == request.user.pk,
+                "locked_at": lock.locked_at if lock else None,
+                "locked_until": lock.locked_until if lock else None,
+            }
+        return JsonResponse(data={"status": 200, "locks": statuses})
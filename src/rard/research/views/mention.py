@@ -4,7 +4,7 @@
 from django.apps import apps
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.postgres.aggregates import StringAgg
-from django.db.models import CharField, F, Q, Value
+from django.db.models import CharField, F, Q, Value, prefetch_related_objects
 from django.db.models.functions import Concat
 from django.http import JsonResponse
 from django.utils.decorators import method_decorator
@@ -26,6 +26,19 @@ from rard.research.models import (
 class MentionSearchView(LoginRequiredMixin, View):
     context_object_name = "results"
 
+    # maximum number of results returned per request. Further results
+    # can be requested with the 'page' parameter
+    paginate_by = 50
+
+    @property
+    def DISPLAY_PREFETCHES(self):
+        # related data needed to render each result's display name
+        return {
+            Fragment: Fragment.link_names_prefetch(),
+            Testimonium: Testimonium.link_names_prefetch(),
+            Work: ["antiquarian_set"],
+        }
+
     @property
     def BASIC_SEARCH_METHODS(self):
         return {
@@ -77,7 +90,8 @@ class MentionSearchView(LoginRequiredMixin, View):
         qs = target_model.objects.all()
         results = qs.filter(model_query)
 
-        return results.distinct().order_by(ordering)
+        # with the pk as a tie-breaker so that pages are stable
+        return results.distinct().order_by(ordering, "pk")
 
     @classmethod
     def anonymous_fragment_search(cls, keywords):
@@ -92,7 +106,7 @@ class MentionSearchView(LoginRequiredMixin, View):
             order_query = Q()
 
         results = qs.filter(order_query)
-        return results.distinct()
+        return results.distinct().order_by("order", "pk")
 
     @classmethod
     def bibliography_search(cls, keywords):
@@ -106,7 +120,7 @@ class MentionSearchView(LoginRequiredMixin, View):
             bib_query = bib_query & Q(author_title__icontains=kw)
 
         results = qs.filter(bib_query)
-        return results.distinct()
+        return results.distinct().order_by("author_surnames", "year", "pk")
 
     @classmethod
     def work_search(cls, keywords):
@@ -123,7 +137,7 @@ class MentionSearchView(LoginRequiredMixin, View):
             work_query = work_query & Q(author_title__icontains=kw)
 
         results = qs.filter(work_query)
-        return results.distinct()
+        return results.distinct().order_by("name", "pk")
 
     @classmethod
     def fragment_search(cls, keywords):
@@ -152,7 +166,7 @@ class MentionSearchView(LoginRequiredMixin, View):
 
         results = qs.filter(ant_query, order_query)
 
-        return results.distinct()
+        return results.distinct().order_by("pk")
 
     @classmethod
     def unlinked_fragment_search(cls, keywords):
@@ -164,7 +178,22 @@ class MentionSearchView(LoginRequiredMixin, View):
             order_query = Q()
 
         results = qs.filter(order_query)
-        return results.distinct()
+        return results.distinct().order_by("pk")
+
+    def get_page_number(self):
+        try:
+            return max(int(self.request.GET.get("page", 1)), 1)
+        except ValueError:
+            return 1
+
+    def get_results(self):
+        # apply the limit in the database rather than fetching everything
+        start = (self.get_page_number() - 1) * self.paginate_by
+        results = list(self.get_queryset()[start : start + self.paginate_by])
+        if results:
+            lookups = self.DISPLAY_PREFETCHES.get(results[0].__class__, [])
+            prefetch_related_objects(results, *lookups)
+        return results
 
     def get(self, request, *args, **kwargs):
         ajax_data = []
@@ -173,19 +202,18 @@ class MentionSearchView(LoginRequiredMixin, View):
         model_name_cache = {}
 
         # return just the name, pk and type for display
-        for o in self.get_queryset():
+        for o in self.get_results():
             model_name = model_name_cache.get(o.__class__, None)
             if not model_name:
                 model_name = next(k for k, value in dd.items() if value == o.__class__)
                 model_name_cache[o.__class__] = model_name
-            citation = (
-                o.mention_citation() if hasattr(o, "mention_citation") else str(o)
-            )
+            value = str(o)
+            citation = o.mention_citation() if hasattr(o, "mention_citation") else value
             ajax_data.append(
                 {
                     "id": o.pk,
                     "target": model_name,
-                    "value": str(o),
+                    "value": value,
                     "citation": citation,
                 }
             )
@@ -29,6 +29,13 @@ class DateOrderMixin:
         return context
 
 
+class PrefetchLocksMixin:
+    # fetch the locks of all the listed objects in one query so that their
+    # lock icons don't need a query each
+    def get_queryset(self):
+        return super().get_queryset().prefetch_related(self.model.lock_prefetch())
+
+
 class CheckLockMixin:
     check_lock_object = None
 
@@ -62,13 +69,14 @@ class CanLockMixin:
                     days = int(request.POST.get("days"))
                     lock_until = timezone.now() + timedelta(days=days)
 
-                if viewing.is_locked():
+                # fails if someone else has the lock, even if they got it
+                # while this request was being handled
+                if not viewing.lock(request.user, lock_until):
                     from django.shortcuts import render
 
                     return render(
                         request, "research/user_has_no_lock.html", {"object": viewing}
                     )
-                viewing.lock(request.user, lock_until)
                 return redirect(request.path)
 
             elif "unlock" in request.POST:
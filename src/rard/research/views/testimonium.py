@@ -25,10 +25,12 @@ from rard.research.views.mixins import (
     CanLockMixin,
     CheckLockMixin,
     GetWorkLinkRequestDataMixin,
+    PrefetchLocksMixin,
     TextObjectFieldUpdateMixin,
     TextObjectFieldViewMixin,
 )
 from rard.utils.convertors import convert_testimonium_to_unlinked_fragment
+from rard.utils.reorder import reindex_queue
 from rard.utils.shared_functions import reassign_to_unknown
 
 
@@ -45,7 +47,9 @@ class TestimoniumCreateView(PermissionRequiredMixin, HistoricalBaseCreateView):
         return context
 
 
-class TestimoniumListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+class TestimoniumListView(
+    PrefetchLocksMixin, LoginRequiredMixin, PermissionRequiredMixin, ListView
+):
     paginate_by = 10
     model = Testimonium
     permission_required = ("research.view_testimonium",)
@@ -257,8 +261,10 @@ class TestimoniumUpdateWorkLinkView(
         )
 
     def post(self, request, *args, **kwargs):
-        super().post(request, *args, **kwargs)
-        self.object.save()
+        # reindex once for both saves
+        with reindex_queue.batch():
+            super().post(request, *args, **kwargs)
+            self.object.save()
         context = self.get_context_data()
 
         return render(request, "research/partials/linked_work.html", context)
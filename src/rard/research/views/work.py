@@ -17,12 +17,15 @@ from rard.research.models import Book, TextObjectField, Work
 from rard.research.views.mixins import (
     CanLockMixin,
     CheckLockMixin,
+    PrefetchLocksMixin,
     TextObjectFieldUpdateMixin,
     TextObjectFieldViewMixin,
 )
 
 
-class WorkListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+class WorkListView(
+    PrefetchLocksMixin, LoginRequiredMixin, PermissionRequiredMixin, ListView
+):
     paginate_by = 10
     model = Work
     permission_required = ("research.view_work",)
@@ -120,7 +123,7 @@ class WorkUpdateIntroductionView(TextObjectFieldUpdateMixin, WorkUpdateView):
         # does not exist
         work = self.get_object()
         if work.introduction is None:
-            work.introduction = TextObjectField.objects.create(content="")
+            work.introduction = TextObjectField.objects.create(content="", owner=work)
             work.save()
 
     def dispatch(self, request, *args, **kwargs):
@@ -236,7 +239,7 @@ class BookUpdateIntroductionView(TextObjectFieldUpdateMixin, BookUpdateView):
         # does not exist
         book = self.get_object()
         if book.introduction is None:
-            book.introduction = TextObjectField.objects.create(content="")
+            book.introduction = TextObjectField.objects.create(content="", owner=book)
             book.save()
 
     def dispatch(self, request, *args, **kwargs):
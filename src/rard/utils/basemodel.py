@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 import bs4
 from django.apps import apps
 from django.conf import settings
@@ -5,8 +7,8 @@ from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelatio
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.shortcuts import get_current_site
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.mail import send_mail
-from django.db import models, transaction
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import IntegrityError, models, transaction
 from django.db.models.fields import TextField
 from django.template.loader import render_to_string
 from django.utils import timezone
@@ -14,6 +16,43 @@ from django.utils.safestring import mark_safe
 from model_utils.models import TimeStampedModel
 
 from rard.research.templatetags.entity_escape import entity_escape
+from rard.utils.reorder import reindex_queue
+
+
+def get_mentioned_objects(links):
+    """Fetch the objects referred to by a list of mention spans in bulk, one
+    query per model, and return them as a dictionary keyed by model then pk.
+    Links that cannot be resolved are left out and so are reported as bad
+    links by the callers."""
+    pks_by_model = {}
+    for link in links:
+        model_name = link.attrs.get("data-target", None)
+        pkstr = link.attrs.get("data-id", None)
+        if not (model_name and pkstr):
+            continue
+        try:
+            model = apps.get_model(app_label="research", model_name=model_name)
+            pks_by_model.setdefault(model, set()).add(int(pkstr))
+        except (LookupError, ValueError):
+            pass
+    return {
+        model: model.objects.in_bulk(list(pks)) for model, pks in pks_by_model.items()
+    }
+
+
+def get_original_text_ordinals(links):
+    """For apparatus criticus mentions shown in a parent's commentary, find
+    the ordinal of each referenced original text in one go"""
+    from rard.research.models import OriginalText
+
+    pks = set()
+    for link in links:
+        if link.attrs.get("data-parent", None):
+            try:
+                pks.add(int(link.attrs.get("data-original-text", None)))
+            except (TypeError, ValueError):
+                pass
+    return OriginalText.get_ordinals(pks)
 
 
 class DynamicTextField(TextField):
@@ -67,8 +106,6 @@ class DynamicTextField(TextField):
                         self.save()
 
             def update_editable_mentions(self, save=True):
-                from rard.research.models import OriginalText
-
                 # before editing we would like to check that
                 # the text in aech of the mentions
                 # is up to date
@@ -76,6 +113,10 @@ class DynamicTextField(TextField):
                 soup = bs4.BeautifulSoup(value, features="html.parser")
                 links = soup.find_all("span", class_="mention")
 
+                # resolve everything mentioned up front rather than per link
+                mentioned = get_mentioned_objects(links)
+                ordinals = get_original_text_ordinals(links)
+
                 for link in links:
                     # print("got link %s" % link)
                     item_to_replace = link.find("span", contenteditable="false")
@@ -95,7 +136,7 @@ class DynamicTextField(TextField):
                             model = apps.get_model(
                                 app_label="research", model_name=model_name
                             )
-                            linked = model.objects.get(pk=int(pkstr))
+                            linked = mentioned[model][int(pkstr)]
 
                             if char == "@":
                                 if hasattr(linked, "mention_citation"):
@@ -121,12 +162,7 @@ class DynamicTextField(TextField):
                                 link_text = ""
 
                                 if parent_pk:
-                                    original_text = OriginalText.objects.get(
-                                        pk=int(original_text_pk)
-                                    )
-                                    link_text = (
-                                        original_text.ordinal_with_respect_to_parent_object()  # noqa: E501
-                                    )
+                                    link_text = ordinals[int(original_text_pk)]
 
                                 # in any case show the app crit link index
                                 link_text += str(linked.order + 1)
@@ -162,12 +198,14 @@ class DynamicTextField(TextField):
             def render_dynamic_content(self):
                 # render the mentions as links or as app crit when viewing
                 # the object on a web page
-                from rard.research.models import OriginalText
-
                 value = getattr(self, field_name)
                 soup = bs4.BeautifulSoup(value, features="html.parser")
                 links = soup.find_all("span", class_="mention")
 
+                # resolve everything mentioned up front rather than per link
+                mentioned = get_mentioned_objects(links)
+                ordinals = get_original_text_ordinals(links)
+
                 for link in links:
                     model_name = link.attrs.get("data-target", None)
                     pkstr = link.attrs.get("data-id", None)
@@ -179,7 +217,7 @@ class DynamicTextField(TextField):
                             model = apps.get_model(
                                 app_label="research", model_name=model_name
                             )
-                            linked = model.objects.get(pk=int(pkstr))
+                            linked = mentioned[model][int(pkstr)]
                             # is it something we can link to?
                             if getattr(linked, "get_absolute_url", False):
                                 if hasattr(linked, "mention_citation"):
@@ -211,12 +249,7 @@ class DynamicTextField(TextField):
                                 display_str = ""
 
                                 if parent_pk:
-                                    original_text = OriginalText.objects.get(
-                                        pk=int(original_text_pk)
-                                    )
-                                    display_str = (
-                                        original_text.ordinal_with_respect_to_parent_object()  # noqa: E501
-                                    )  # noqa
+                                    display_str = ordinals[int(original_text_pk)]
 
                                 # in any case show the app crit link index
                                 display_str += str(linked.order + 1)
@@ -345,6 +378,13 @@ class DynamicTextField(TextField):
 class ObjectLock(models.Model):
     class Meta:
         app_label = "research"
+        constraints = [
+            # an object can only be locked once, so that concurrent
+            # attempts to lock it cannot all succeed
+            models.UniqueConstraint(
+                fields=["content_type", "object_id"], name="unique_object_lock"
+            )
+        ]
 
     locked_at = models.DateTimeField(null=True, editable=False)
     locked_by = models.ForeignKey(
@@ -360,6 +400,125 @@ class ObjectLock(models.Model):
 
     content_object = GenericForeignKey()
 
+    def has_expired(self):
+        return self.locked_until is not None and self.locked_until < timezone.now()
+
+    @classmethod
+    def get_current_locks(cls, keys):
+        """Returns the unexpired locks on the objects given as (content type
+        id, object id) pairs, fetched in one query and keyed by pair"""
+        query = models.Q()
+        for content_type_id, object_id in keys:
+            query |= models.Q(content_type_id=content_type_id, object_id=object_id)
+        if not query:
+            return {}
+        return {
+            (lock.content_type_id, lock.object_id): lock
+            for lock in cls.objects.filter(query).select_related("locked_by")
+            if not lock.has_expired()
+        }
+
+    @classmethod
+    def resolve_objects(cls, locks):
+        """Sets the locked object of each of the locks, fetching them with
+        one query per model rather than one per lock"""
+        object_ids = {}
+        for lock in locks:
+            object_ids.setdefault(lock.content_type_id, set()).add(lock.object_id)
+        objects = {}
+        for content_type_id, ids in object_ids.items():
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            for pk, obj in model._base_manager.in_bulk(ids).items():
+                objects[(content_type_id, pk)] = obj
+        for lock in locks:
+            obj = objects.get((lock.content_type_id, lock.object_id))
+            if obj is not None:
+                lock.content_object = obj
+
+    @staticmethod
+    def queue_digest(subject, html_email_template, user, locks):
+        # one email to the user about several locked items
+        current_site = get_current_site(None)
+        context = {
+            "user": user,
+            "locks": locks,
+            "site_name": current_site.name,
+            "domain": current_site.domain,
+        }
+        content = render_to_string(html_email_template, context)
+        OutboxEmail.queue(
+            subject,
+            "",
+            settings.DEFAULT_FROM_EMAIL,
+            [user.email],
+            html_message=content,
+        )
+
+    @classmethod
+    def sweep_expired(cls, locks=None):
+        """Deletes all the locks (or those of the given queryset) that have
+        expired in one statement, and emails each user who requested any of
+        the locked items once with a list of the items now available.
+        Returns the number of locks deleted"""
+        if locks is None:
+            locks = cls.objects.all()
+        with transaction.atomic():
+            expired = list(
+                locks.filter(locked_until__lt=timezone.now())
+                .select_related("locked_by")
+                .prefetch_related("objectlockrequest_set__from_user")
+                .order_by("pk")
+            )
+            if not expired:
+                return 0
+            cls.resolve_objects(expired)
+
+            requested = {}
+            for lock in expired:
+                for lock_request in lock.objectlockrequest_set.all():
+                    user_locks = requested.setdefault(lock_request.from_user, {})
+                    user_locks[lock.pk] = lock
+            for user, user_locks in requested.items():
+                cls.queue_digest(
+                    "Items you requested have become available",
+                    "research/emails/items_unlocked_digest.html",
+                    user,
+                    list(user_locks.values()),
+                )
+
+            cls.objects.filter(pk__in=[lock.pk for lock in expired]).delete()
+        return len(expired)
+
+    @classmethod
+    def warn_long_locks(cls, days):
+        """Emails each user who has held indefinite locks for more than the
+        given number of days once with a list of them. Returns the number
+        of users emailed"""
+        limit = timezone.now() - timedelta(days=days)
+        locks = list(
+            cls.objects.filter(
+                locked_until__isnull=True,
+                locked_at__lt=limit,
+                locked_by__isnull=False,
+            )
+            .select_related("locked_by")
+            .order_by("locked_at")
+        )
+        cls.resolve_objects(locks)
+
+        locks_by_user = {}
+        for lock in locks:
+            locks_by_user.setdefault(lock.locked_by, []).append(lock)
+        with transaction.atomic():
+            for user, user_locks in locks_by_user.items():
+                cls.queue_digest(
+                    "You have had items locked for a while",
+                    "research/emails/long_locks_digest.html",
+                    user,
+                    user_locks,
+                )
+        return len(locks_by_user)
+
 
 class ObjectLockRequest(TimeStampedModel, models.Model):
     class Meta:
@@ -371,7 +530,132 @@ class ObjectLockRequest(TimeStampedModel, models.Model):
     from_user = models.ForeignKey("users.User", on_delete=models.CASCADE)
 
 
-class BaseModel(TimeStampedModel, models.Model):
+class OutboxEmail(TimeStampedModel, models.Model):
+    """An email waiting to be sent. Emails are written here in the same
+    transaction as the change they are about and delivered in batches by
+    the send_outbox_emails command, so a slow or failing mail server
+    neither holds up nor rolls back the request that sends them"""
+
+    class Meta:
+        app_label = "research"
+        indexes = [
+            models.Index(fields=["sent_at", "send_after"], name="outbox_email_due_idx")
+        ]
+
+    subject = models.CharField(max_length=256)
+    message = models.TextField(blank=True, default="")
+    html_message = models.TextField(blank=True, default="")
+    from_email = models.CharField(max_length=256)
+    recipients = models.JSONField(default=list)
+
+    # failed emails are retried later, with the delay doubling each time
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+    send_after = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, default=None)
+
+    max_attempts = 6
+    retry_delay = timedelta(minutes=1)
+
+    @classmethod
+    def queue(cls, subject, message, from_email, recipient_list, html_message=None):
+        # takes the same arguments as django's send_mail
+        return cls.objects.create(
+            subject=subject,
+            message=message,
+            html_message=html_message or "",
+            from_email=from_email,
+            recipients=list(recipient_list),
+        )
+
+    def as_message(self, connection=None):
+        message = EmailMultiAlternatives(
+            self.subject,
+            self.message,
+            self.from_email,
+            self.recipients,
+            connection=connection,
+        )
+        if self.html_message:
+            message.attach_alternative(self.html_message, "text/html")
+        return message
+
+    @classmethod
+    def send_pending(cls, batch_size=100):
+        """Send a batch of the emails that are due over one connection and
+        return the number sent. Rows being sent by another worker are
+        skipped rather than waited for"""
+        now = timezone.now()
+        with transaction.atomic():
+            emails = list(
+                cls.objects.select_for_update(skip_locked=True)
+                .filter(
+                    sent_at__isnull=True,
+                    attempts__lt=cls.max_attempts,
+                    send_after__lte=now,
+                )
+                .order_by("pk")[:batch_size]
+            )
+            if not emails:
+                return 0
+            sent = 0
+            with get_connection() as connection:
+                for email in emails:
+                    email.attempts += 1
+                    try:
+                        email.as_message(connection).send()
+                    except Exception as err:
+                        email.last_error = str(err)
+                        email.send_after = now + cls.retry_delay * 2 ** (
+                            email.attempts - 1
+                        )
+                    else:
+                        email.sent_at = timezone.now()
+                        sent += 1
+            cls.objects.bulk_update(
+                emails, ["attempts", "last_error", "send_after", "sent_at"]
+            )
+        return sent
+
+
+class TrackedFieldsMixin(object):
+    """Remembers the values of the fields named in `tracked_fields` when an
+    object is loaded from or saved to the database, so that save() and
+    signal handlers can tell whether anything they depend on has changed
+    and skip their work if not"""
+
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: getattr(instance, name)
+            for name in cls.tracked_fields
+            if name in field_names
+        }
+        return instance
+
+    def changed_fields(self):
+        """Returns the tracked fields that have been changed since the
+        object was loaded or last saved, mapped to their previous values.
+        Fields whose previous values are unknown, e.g. on new objects, are
+        reported with a value of None"""
+        loaded = getattr(self, "_loaded_values", {})
+        return {
+            name: loaded.get(name)
+            for name in self.tracked_fields
+            if name not in loaded or loaded[name] != getattr(self, name)
+        }
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_values = {
+            name: getattr(self, name) for name in self.tracked_fields
+        }
+
+
+class BaseModel(TrackedFieldsMixin, TimeStampedModel, models.Model):
     # defines a base model with any required
     # additional common functionality
     class Meta:
@@ -384,16 +668,67 @@ class LockableModel(models.Model):
 
     object_locks = GenericRelation(ObjectLock)
 
+    @classmethod
+    def lock_prefetch(cls, prefix=""):
+        """A prefetch of the locks of the objects in a queryset, so that lock
+        state can be shown for a list of objects without a query each"""
+        return models.Prefetch(
+            "%sobject_locks" % prefix,
+            queryset=ObjectLock.objects.select_related("locked_by").order_by("pk"),
+        )
+
     def get_object_lock(self):
-        return self.object_locks.first()
+        # a lock that has expired is ignored until it is removed by the
+        # check_expired_locks command or by unlocking or locking the object
+        object_lock = self.get_lock_record()
+        if object_lock is not None and object_lock.has_expired():
+            return None
+        return object_lock
+
+    def get_lock_record(self):
+        # the lock is looked up once per instance, or taken from the
+        # prefetched locks, and cached as the lock properties and template
+        # filters all ask for it. It may have expired
+        if not hasattr(self, "_object_lock"):
+            prefetched = getattr(self, "_prefetched_objects_cache", {})
+            if "object_locks" in prefetched:
+                locks = list(prefetched["object_locks"])
+                self._object_lock = locks[0] if locks else None
+            else:
+                self._object_lock = self.object_locks.select_related(
+                    "locked_by"
+                ).first()
+        return self._object_lock
+
+    def clear_lock_cache(self):
+        self.__dict__.pop("_object_lock", None)
+        getattr(self, "_prefetched_objects_cache", {}).pop("object_locks", None)
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.clear_lock_cache()
 
     def lock(self, user, lock_until=None):
-        ObjectLock.objects.create(
-            locked_at=timezone.now(),
-            locked_by=user,
-            content_object=self,
-            locked_until=lock_until,
-        )
+        """Lock the object for the user and return whether that succeeded.
+        The lock is a single insert guarded by a unique constraint, so if
+        several users try to lock the object at once only one of them gets
+        it"""
+        self.clear_lock_cache()
+        # an expired lock that has not been swept yet is replaced, after
+        # telling anyone who requested the object that it is available
+        ObjectLock.sweep_expired(self.object_locks.all())
+        try:
+            with transaction.atomic():
+                self._object_lock = ObjectLock.objects.create(
+                    locked_at=timezone.now(),
+                    locked_by=user,
+                    content_object=self,
+                    locked_until=lock_until,
+                )
+        except IntegrityError:
+            self.clear_lock_cache()
+            return False
+        return True
 
     def break_lock(self, broken_by_user):
         if not broken_by_user.can_break_locks:
@@ -401,6 +736,10 @@ class LockableModel(models.Model):
 
         # someone with permission to do so has broken the lock
         object_lock = self.get_object_lock()
+        if object_lock is None:
+            # nothing to break, though an expired lock may need removing
+            self.unlock()
+            return
 
         # prepare email to lock owner
         html_email_template = "research/emails/item_lock_broken.html"
@@ -413,104 +752,58 @@ class LockableModel(models.Model):
             "domain": current_site.domain,
         }
         content = render_to_string(html_email_template, context)
-        email_data = [
-            (
+
+        with transaction.atomic():
+            # break lock
+            self.unlock()
+
+            # email the lock owner
+            OutboxEmail.queue(
                 "The item you were editing has been made available",
                 "",
                 settings.DEFAULT_FROM_EMAIL,
                 [object_lock.locked_by.email],
-            ),
-            {"html_message": content, "fail_silently": False},
-        ]
-
-        # break lock
-        self.unlock()
-
-        # send email to lock owner
-        send_mail(*email_data[0], **email_data[1])
-
-    def send_long_lock_email(self):
-        # where a user has had a lock for a long time, we send them
-        # an email to tell them to hurry or ask if they still need it
-        object_lock = self.get_object_lock()
-
-        # prepare email to lock owner
-        html_email_template = "research/emails/long_lock_warning.html"
-        current_site = get_current_site(None)
-        context = {
-            "user": object_lock.locked_by,
-            "lock": object_lock,
-            "site_name": current_site.name,
-            "domain": current_site.domain,
-        }
-        content = render_to_string(html_email_template, context)
-
-        send_mail(
-            "You have had an item locked for a while",
-            "",
-            settings.DEFAULT_FROM_EMAIL,
-            [object_lock.locked_by.email],
-            html_message=content,
-            fail_silently=False,
-        )
+                html_message=content,
+            )
 
     def unlock(self):
-        object_lock = self.get_object_lock()
+        # expired locks are removed too, with the same notifications
+        object_lock = self.get_lock_record()
 
         if not object_lock:
             return
 
-        # collect data emails using info before we delete it
-        # and if deletion works okay then send the mails after
-        # (we don't have access to the info once we delete it)
-        email_data_list = []
-
-        # notify anyone with a lock request of the event
-        for lock_request in object_lock.objectlockrequest_set.all():
-            html_email_template = "research/emails/item_unlocked.html"
+        with transaction.atomic():
+            # notify anyone with a lock request of the event. The emails
+            # are only sent if the lock is deleted
             current_site = get_current_site(None)
-            context = {
-                "user": object_lock.locked_by,
-                "from_user": lock_request.from_user,
-                "lock": object_lock,
-                "site_name": current_site.name,
-                "domain": current_site.domain,
-            }
-            content = render_to_string(html_email_template, context)
-            email_data = [
-                (
+            for lock_request in object_lock.objectlockrequest_set.select_related(
+                "from_user"
+            ):
+                html_email_template = "research/emails/item_unlocked.html"
+                context = {
+                    "user": object_lock.locked_by,
+                    "from_user": lock_request.from_user,
+                    "lock": object_lock,
+                    "site_name": current_site.name,
+                    "domain": current_site.domain,
+                }
+                content = render_to_string(html_email_template, context)
+                OutboxEmail.queue(
                     "The item you requested has become available",
                     "",
                     settings.DEFAULT_FROM_EMAIL,
                     [lock_request.from_user.email],
-                ),
-                {"html_message": content, "fail_silently": False},
-            ]
-            email_data_list.append(email_data)
+                    html_message=content,
+                )
 
-        # delete any lock records
-        self.object_locks.all().delete()
-
-        # send the mails we prepared
-        for args, kwargs in email_data_list:
-            send_mail(*args, **kwargs)
-
-    def check_lock_expired(self):
-        object_lock = self.get_object_lock()
-        if not object_lock:
-            return
-
-        if object_lock.locked_until and object_lock.locked_until < timezone.now():
-            # unlock silently
-            # self.object_locks.all().delete()
-
-            # or unlock noisily (sends emails)
-            self.unlock()
+            # delete any lock records
+            self.object_locks.all().delete()
+        self.clear_lock_cache()
+        self._object_lock = None
 
     def is_locked(self):
-        # until cron job sorted, inspect expired locks in a lazy manner
-        self.check_lock_expired()
-        return self.object_locks.exists()
+        return self.get_object_lock() is not None
 
     @property
     def locked_by(self):
@@ -534,8 +827,11 @@ class LockableModel(models.Model):
             return None
 
     def request_lock(self, from_user):
-        self.get_object_lock().objectlockrequest_set.create(from_user=from_user)
         object_lock = self.get_object_lock()
+        if object_lock is None:
+            # the object is available so there is nothing to request
+            return
+        object_lock.objectlockrequest_set.create(from_user=from_user)
 
         # notify lock owner of the request
         html_email_template = "research/emails/request_lock.html"
@@ -548,13 +844,12 @@ class LockableModel(models.Model):
             "domain": current_site.domain,
         }
         content = render_to_string(html_email_template, context)
-        send_mail(
+        OutboxEmail.queue(
             "Request to edit record",
             "",
             settings.DEFAULT_FROM_EMAIL,
-            [self.get_object_lock().locked_by.email],
+            [object_lock.locked_by.email],
             html_message=content,
-            fail_silently=False,
         )
 
 
@@ -579,7 +874,7 @@ class DatedModel(models.Model):
         return self.date_range
 
 
-class OrderableModel(models.Model):
+class OrderableModel(TrackedFieldsMixin, models.Model):
     class Meta:
         ordering = ["order"]
         abstract = True
@@ -588,6 +883,10 @@ class OrderableModel(models.Model):
 
     order_index_start = 0
 
+    # so that signal handlers can tell whether a save has changed the
+    # position of the object
+    tracked_fields = ("order",)
+
     def related_queryset(self):
         # by default sort according to all objects of this class
         # and this can be overidden in the subclasses in case
@@ -602,8 +901,9 @@ class OrderableModel(models.Model):
 
     def swap(self, replacement):
         self.order, replacement.order = replacement.order, self.order
-        self.save()
-        replacement.save()
+        with reindex_queue.batch():
+            self.save()
+            replacement.save()
 
     def move_to(self, pos):
         # move to a particular index in the set
@@ -626,7 +926,8 @@ class OrderableModel(models.Model):
             )
             reindex_start_pos = self.order_index_start
 
-        with transaction.atomic():
+        # saving may trigger reindexing of related objects. Do it only once
+        with transaction.atomic(), reindex_queue.batch():
             for count, obj in enumerate(to_reorder):
                 obj.order = count + reindex_start_pos
                 obj.save()
@@ -0,0 +1,92 @@
+import csv
+import json
+from itertools import islice
+
+from django.contrib.contenttypes.models import ContentType
+
+from rard.research.models import ConcordanceModel
+
+EXPORT_FIELDS = [
+    "edition",
+    "identifier",
+    "content_type",
+    "reference",
+    "concordance",
+    "frrant",
+    "frrant_url",
+]
+
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv",
+    "tsv": "text/tab-separated-values",
+    "json": "application/json",
+}
+
+
+def get_export_queryset(edition=None, antiquarian=None):
+    queryset = ConcordanceModel.objects.all()
+    if edition is not None:
+        queryset = queryset.filter(identifier__edition=edition)
+    if antiquarian is not None:
+        queryset = queryset.for_antiquarian(antiquarian)
+    return ConcordanceModel.get_ordered_queryset(
+        queryset.select_related("identifier__edition", "original_text")
+    )
+
+
+def concordance_rows(queryset, chunk_size=500):
+    """Yields a dictionary of EXPORT_FIELDS for each concordance, reading
+    them from the database in chunks. The fragments etc. that own the
+    original texts are fetched for each chunk at once"""
+    concordances = queryset.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(concordances, chunk_size))
+        if not chunk:
+            return
+        owner_ids = {}
+        for concordance in chunk:
+            text = concordance.original_text
+            if text is not None:
+                owner_ids.setdefault(text.content_type_id, set()).add(text.object_id)
+        owners = {}
+        for content_type_id, ids in owner_ids.items():
+            model = ContentType.objects.get_for_id(content_type_id).model_class()
+            for pk, owner in model.objects.in_bulk(ids).items():
+                owners[(content_type_id, pk)] = owner
+
+        for concordance in chunk:
+            text = concordance.original_text
+            owner = text and owners.get((text.content_type_id, text.object_id))
+            identifier = concordance.identifier
+            yield {
+                "edition": identifier.edition.name if identifier else "",
+                "identifier": identifier.value if identifier else "",
+                "content_type": concordance.get_content_type_display(),
+                "reference": concordance.reference,
+                "concordance": str(concordance),
+                "frrant": str(owner) if owner else "",
+                "frrant_url": owner.get_absolute_url() if owner else "",
+            }
+
+
+class Echo:
+    # a file-like object that gives back what is written to it, so that csv
+    # rows can be streamed rather than written to a buffer
+    def write(self, value):
+        return value
+
+
+def export_lines(rows, export_format):
+    """Yields the rows as lines of csv, tsv or a json array"""
+    if export_format == "json":
+        yield "[\n"
+        for index, row in enumerate(rows):
+            yield ("" if index == 0 else ",\n") + json.dumps(row, ensure_ascii=False)
+        yield "\n]\n"
+        return
+
+    delimiter = "\t" if export_format == "tsv" else ","
+    writer = csv.writer(Echo(), delimiter=delimiter)
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([row[field] for field in EXPORT_FIELDS])
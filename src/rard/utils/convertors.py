@@ -1,4 +1,4 @@
-from rard.research.models import AnonymousFragment, Fragment
+from rard.research.models import AnonymousFragment, Fragment, OriginalText
 from rard.research.models.base import FragmentLink
 from rard.research.models.fragment import reindex_anonymous_fragments
 from rard.research.models.testimonium import Testimonium
@@ -63,11 +63,14 @@ def transfer_data_between_fragments(source, destination):
     destination.images.set(source.images.all())
     # source is no longer the owner after this:
     destination.original_texts.set(source.original_texts.all())
+    OriginalText.reindex_owner_of(destination)
     # Need to remove commentary's original relationship with source or
     # it will be deleted when we delete the source
     commentary = source.commentary
     destination.commentary = commentary
     source.commentary = None
+    if commentary:
+        commentary.set_owner(destination)
 
 
 def transfer_mentions(original, new):
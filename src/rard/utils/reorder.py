@@ -0,0 +1,137 @@
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from functools import partial
+
+from django.db import connection, transaction
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+
+def reorder_queryset(queryset, field, order_by, start=0):
+    """Set `field` on every object in the queryset to its position when
+    sorted by `order_by`, counting from `start`, in a single UPDATE
+    statement:
+
+        UPDATE table SET field = ranked.position - 1
+        FROM (SELECT id, ROW_NUMBER() OVER (ORDER BY ...) AS position ...)
+
+    Only rows whose value actually changes are written. As this bypasses
+    save(), no model signals are sent for the updated rows.
+
+    `order_by` is a list of field names or expressions. Field names cannot
+    be prefixed with '-' so use F("name").desc() for descending order. The
+    current value of `field` and then the pk are used as tie-breakers so
+    that equal rows keep their relative positions."""
+    model = queryset.model
+    ranked = (
+        queryset.annotate(
+            new_position=Window(
+                expression=RowNumber(),
+                order_by=[*order_by, F(field).asc(nulls_last=True), F("pk").asc()],
+            )
+        )
+        .order_by()
+        .values("pk", "new_position")
+    )
+    sql, params = ranked.query.sql_with_params()
+
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    column = quote(model._meta.get_field(field).column)
+    pk = quote(model._meta.pk.column)
+    offset = int(start) - 1
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET {column} = ranked.new_position + {offset} "
+            f"FROM ({sql}) AS ranked "
+            f"WHERE {table}.{pk} = ranked.{pk} "
+            f"AND {table}.{column} IS DISTINCT FROM ranked.new_position + {offset}",
+            params,
+        )
+        return cursor.rowcount
+
+
+class ReindexQueue(threading.local):
+    """Coalesces the reindexing of link order that cascades from a change.
+
+    A single edit can trigger the same reindex many times over, through
+    several signal handlers. Handlers instead schedule the reindex they
+    need, and while a batch is open each distinct reindex is recorded once
+    and run when the outermost batch exits. Reindexes run in stage order
+    (books, then works, then antiquarians, then unattached links, then the
+    display names built from the link order) as each stage depends on the
+    order computed by the previous one; any reindexes scheduled while
+    flushing are added to the queue.
+
+    The queue is flushed at the end of the outermost batch, within the
+    transaction making the changes, rather than when it commits: views
+    then render the new order in the same request, and reindexes are
+    discarded along with any changes rolled back. Changes made by separate
+    saves are coalesced by making them within one batch.
+
+    `runs` counts the reindexes performed for each stage, for use in tests.
+    """
+
+    STAGES = ("book", "work", "antiquarian", "unattached", "display_name")
+
+    def __init__(self):
+        self.depth = 0
+        self.pending = {}
+        self.pending_items = {}
+        self.runs = Counter()
+
+    @contextmanager
+    def batch(self):
+        self.depth += 1
+        try:
+            yield
+        except BaseException:
+            if self.depth == 1:
+                # the changes are being rolled back
+                self.pending.clear()
+                self.pending_items.clear()
+            raise
+        finally:
+            self.depth -= 1
+        if self.depth == 0:
+            self.flush()
+
+    def schedule(self, stage, key, func):
+        with self.batch():
+            # if already pending, move to the back as the latest request
+            self.pending.pop((stage, key), None)
+            self.pending[(stage, key)] = func
+
+    def schedule_items(self, stage, key, func, items):
+        """As schedule, but `func` is called with the set of all the items
+        scheduled under the same stage and key, so that they can be dealt
+        with together"""
+        with self.batch():
+            self.pending_items.setdefault((stage, key), set()).update(items)
+            self.schedule(stage, key, partial(self.run_items, (stage, key), func))
+
+    def run_items(self, pending_key, func):
+        items = self.pending_items.pop(pending_key, set())
+        if items:
+            func(items)
+
+    def flush(self):
+        if not self.pending:
+            return
+        self.depth += 1
+        try:
+            with transaction.atomic():
+                while self.pending:
+                    next_key = min(self.pending, key=lambda k: self.STAGES.index(k[0]))
+                    func = self.pending.pop(next_key)
+                    self.runs[next_key[0]] += 1
+                    func()
+        finally:
+            self.pending.clear()
+            self.pending_items.clear()
+            self.depth -= 1
+
+
+reindex_queue = ReindexQueue()
@@ -23,3 +23,11 @@ def make_plain_text(content):
     no_lone_numbers = re.sub(r"\s\d{1,2}\s", " ", no_punctuation)  # mentions
     no_excess_space = re.sub(r" +", " ", no_lone_numbers)
     return no_excess_space
+
+
+def natural_sort_key(value):
+    """The numbers in a reference such as 00001.00024.01230 or 130.3c as a
+    list of integers, e.g. [1, 24, 1230] or [130, 3], which sorts naturally"""
+    if value is None:
+        return None
+    return [int(number) for number in re.findall(r"\d+", value)]